@@ -1,18 +1,153 @@
+import os
 import re
+import unicodedata
+from collections import deque
+
+GAZETTEER_PATH = os.path.join(os.path.dirname(os.path.abspath(__file__)), 'cities.tsv')
+
+NON_WORD = re.compile(r"[^a-z0-9]+")
+
+# fallback for cities missing from the gazetteer: take at most three words
+# after "in" / "for" and stop at the usual filler words
+FALLBACK_PATTERNS = [
+    re.compile(r'\b(?:weather|forecast|temperature|raining|snowing|sunny|cold|hot|warm)\b.*?\bin\s+([a-z][a-z\s\-]*)'),
+    re.compile(r'\bforecast\s+for\s+([a-z][a-z\s\-]*)'),
+    re.compile(r'\bin\s+([a-z][a-z\s\-]*)$')
+]
+STOP_WORDS = {
+    'today', 'tonight', 'tomorrow', 'now', 'right', 'please', 'currently', 'this', 'the', 'at',
+    'weekend', 'week', 'morning', 'evening', 'afternoon', 'like', 'outside', 'there', 'and',
+    'for', 'on', 'is', 'it', 'rn', 'pls', 'plz', 'thanks', 'thank', 'you', 'city', 'area'
+}
+
+
+def normalize(text):
+    # "Brașov" -> "brasov", "São Paulo" -> "sao paulo", punctuation -> spaces
+    text = unicodedata.normalize('NFKD', text)
+    text = ''.join(ch for ch in text if not unicodedata.combining(ch))
+    return NON_WORD.sub(' ', text.lower()).split()
+
+
+class CityGazetteer:
+    # Aho-Corasick automaton over word tokens: every known name and alias is
+    # found in one left-to-right pass over the message
+
+    def __init__(self):
+        self.goto = [{}]
+        self.fail = [0]
+        self.output = [None]
+        self.names = {}
+
+    @classmethod
+    def from_file(cls, path):
+        gazetteer = cls()
+        with open(path, 'r', encoding='utf-8') as f:
+            f.readline()  # header
+            for line in f:
+                line = line.rstrip('\r\n')
+                if not line:
+                    continue
+                city_id, name, aliases = (line.split('\t') + ['', ''])[:3]
+                gazetteer.add(city_id, name, [a for a in aliases.split(';') if a])
+        gazetteer.build()
+        return gazetteer
+
+    def add(self, city_id, name, aliases=()):
+        query_name = city_id.split(',')[0]
+        # "Brașov" keeps its diacritics, but "Roma" is shown as "Rome"
+        self.names[city_id] = name if normalize(name) == normalize(query_name) else query_name
+        for variant in [query_name, name, *aliases]:
+            tokens = normalize(variant)
+            if tokens:
+                self._insert(tokens, city_id)
+
+    def _insert(self, tokens, city_id):
+        node = 0
+        for token in tokens:
+            next_node = self.goto[node].get(token)
+            if next_node is None:
+                next_node = len(self.goto)
+                self.goto[node][token] = next_node
+                self.goto.append({})
+                self.fail.append(0)
+                self.output.append(None)
+            node = next_node
+        if self.output[node] is None or self.output[node][1] < len(tokens):
+            self.output[node] = (city_id, len(tokens))
+
+    def build(self):
+        queue = deque(self.goto[0].values())
+        while queue:
+            node = queue.popleft()
+            for token, child in self.goto[node].items():
+                queue.append(child)
+                state = self.fail[node]
+                while state and token not in self.goto[state]:
+                    state = self.fail[state]
+                self.fail[child] = self.goto[state].get(token, 0)
+                # keep the longest name ending here, e.g. "new york" over "york"
+                inherited = self.output[self.fail[child]]
+                if self.output[child] is None:
+                    self.output[child] = inherited
+
+    def find_all(self, tokens):
+        matches = []
+        node = 0
+        for end, token in enumerate(tokens):
+            while node and token not in self.goto[node]:
+                node = self.fail[node]
+            node = self.goto[node].get(token, 0)
+            if self.output[node] is not None:
+                city_id, length = self.output[node]
+                matches.append((end - length + 1, length, city_id))
+        return matches
+
+    def match(self, text):
+        matches = self.find_all(normalize(text))
+        if not matches:
+            return None
+        # longest name wins, then the earliest one
+        start, length, city_id = max(matches, key=lambda m: (m[1], -m[0]))
+        return city_id
+
+    def display_name(self, city_id):
+        return self.names.get(city_id, city_id.split(',')[0])
+
+
+def load_gazetteer(path=GAZETTEER_PATH):
+    if not os.path.exists(path):
+        print(f"Warning: city gazetteer not found at {path}, using pattern matching only")
+        return None
+    return CityGazetteer.from_file(path)
+
+
+gazetteer = load_gazetteer()
+
+
+def extract_city_fallback(text):
+    text = ' '.join(normalize(text))
+    for pattern in FALLBACK_PATTERNS:
+        match = pattern.search(text)
+        if match:
+            words = []
+            for word in match.group(1).split():
+                if word in STOP_WORDS or len(words) == 3:
+                    break
+                words.append(word)
+            if words:
+                return ' '.join(words).title()
+    return None
+
 
 def extract_city(text):
-    text = text.lower()
-    
-    match = re.search(r'(weather?:\s+forecast)?\s+in\s+([a-zA-Z\s]+)', text)
-    if match:
-        return match.group(2).strip()
-    
-    match = re.search(r'in\s+([a-zA-Z\s]+)$', text)
-    if match and "weather" in text:
-        return match.group(1).strip()
-    
-    match = re.search(r'forecast\s+for\s+([a-zA-Z\s]+)', text)
-    if match:
-        return match.group(1).strip()
-    
-    return None
\ No newline at end of file
+    if gazetteer is not None:
+        city_id = gazetteer.match(text)
+        if city_id:
+            return city_id
+    return extract_city_fallback(text)
+
+
+def city_display_name(city):
+    if gazetteer is not None:
+        return gazetteer.display_name(city)
+    return city.split(',')[0]
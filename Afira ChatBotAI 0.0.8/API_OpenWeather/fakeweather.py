@@ -0,0 +1,112 @@
+import argparse
+import json
+import random
+import threading
+import time
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from urllib.parse import urlparse, parse_qs
+
+# Local stand-in for the OpenWeather current-weather API, for tests and
+# benchmarks. Point the server at it with
+#   OPENWEATHER_URL=http://127.0.0.1:8089/data/2.5/weather
+
+
+class FakeWeatherHandler(BaseHTTPRequestHandler):
+    protocol_version = 'HTTP/1.1'
+
+    def do_GET(self):
+        server = self.server
+        url = urlparse(self.path)
+        city = parse_qs(url.query).get('q', [''])[0]
+
+        with server.stats_lock:
+            server.requests_served += 1
+
+        delay = server.latency + random.uniform(0, server.jitter)
+        if delay > 0:
+            time.sleep(delay)
+
+        if url.path != '/data/2.5/weather':
+            return self.send_json(404, {'cod': '404', 'message': 'not found'})
+        if server.error_rate and random.random() < server.error_rate:
+            return self.send_json(500, {'cod': 500, 'message': 'internal error'})
+
+        name = city.split(',')[0].strip()
+        if not name or name.lower() in server.unknown_cities:
+            return self.send_json(404, {'cod': '404', 'message': 'city not found'})
+
+        # deterministic per city so repeated runs are comparable
+        rng = random.Random(name.lower())
+        temp = round(rng.uniform(-5, 32), 2)
+        self.send_json(200, {
+            'cod': 200,
+            'name': name.title(),
+            'main': {
+                'temp': temp,
+                'feels_like': round(temp - rng.uniform(0, 3), 2),
+                'humidity': rng.randint(20, 95)
+            },
+            'weather': [{'description': rng.choice(['clear sky', 'few clouds', 'light rain', 'overcast clouds', 'mist'])}],
+            'wind': {'speed': round(rng.uniform(0, 12), 1)}
+        })
+
+    def send_json(self, status, payload):
+        body = json.dumps(payload).encode('utf-8')
+        self.send_response(status)
+        self.send_header('Content-Type', 'application/json')
+        self.send_header('Content-Length', str(len(body)))
+        self.end_headers()
+        try:
+            self.wfile.write(body)
+        except (BrokenPipeError, ConnectionResetError):
+            # the client gave up (timeout test); nothing to report
+            pass
+
+    def log_message(self, format, *args):
+        if self.server.verbose:
+            super().log_message(format, *args)
+
+
+def make_server(host='127.0.0.1', port=8089, latency=0.0, jitter=0.0, error_rate=0.0,
+                unknown_cities=('nowhere',), verbose=False):
+    server = ThreadingHTTPServer((host, port), FakeWeatherHandler)
+    server.daemon_threads = True
+    server.latency = latency
+    server.jitter = jitter
+    server.error_rate = error_rate
+    server.unknown_cities = {city.lower() for city in unknown_cities}
+    server.verbose = verbose
+    server.requests_served = 0
+    server.stats_lock = threading.Lock()
+    return server
+
+
+def start_in_background(**kwargs):
+    server = make_server(**kwargs)
+    thread = threading.Thread(target=server.serve_forever, name='fake-weather', daemon=True)
+    thread.start()
+    return server
+
+
+def main():
+    parser = argparse.ArgumentParser(description='Local stand-in for the OpenWeather API')
+    parser.add_argument('--host', default='127.0.0.1')
+    parser.add_argument('--port', type=int, default=8089)
+    parser.add_argument('--latency', type=float, default=0.0, help='Base response delay in seconds')
+    parser.add_argument('--jitter', type=float, default=0.0, help='Extra random delay in seconds')
+    parser.add_argument('--error-rate', type=float, default=0.0, help='Fraction of requests answered with HTTP 500')
+    parser.add_argument('--verbose', action='store_true')
+    args = parser.parse_args()
+
+    server = make_server(args.host, args.port, args.latency, args.jitter, args.error_rate, verbose=args.verbose)
+    print(f"Fake OpenWeather listening on http://{args.host}:{args.port}/data/2.5/weather")
+    try:
+        server.serve_forever()
+    except KeyboardInterrupt:
+        pass
+    finally:
+        server.server_close()
+
+
+if __name__ == '__main__':
+    main()
@@ -1,25 +1,41 @@
-import requests
+import os
+import threading
 
-OPENWEATHER_API_KEY = "YOUR_API_CODE"
+from weatherclient import WeatherClient
+from weathercache import WeatherCache
 
-def get_weather(city):
-    url = f"http://api.openweathermap.org/data/2.5/weather?q={city}&appid={OPENWEATHER_API_KEY}&units=metric"
-    
-    try:
-        r = requests.get(url)
-        data = r.json()
-        
-        if data.get("cod") != 200:
-            return None
-        
-        return {
-            "city": data["name"],
-            "temp": data["main"]["temp"],
-            "feels": data["main"]["feels_like"],
-            "desc": data["weather"][0]["description"],
-            "humidity": data["main"]["humidity"],
-            "wind": data["wind"]["speed"]
-        }
+OPENWEATHER_API_KEY = os.environ.get('OPENWEATHER_API_KEY', "YOUR_API_CODE")
+
+WEATHER_CACHE_TTL = float(os.environ.get('WEATHER_CACHE_TTL', 600))
+
+_client = None
+_cache = None
+_client_pid = None
+_client_lock = threading.Lock()
+
+
+def get_client():
+    global _client, _cache, _client_pid
     
-    except Exception:
-        return None
\ No newline at end of file
+    # sessions and thread pools don't survive a fork, so each worker builds its own
+    if _client is None or _client_pid != os.getpid():
+        with _client_lock:
+            if _client is None or _client_pid != os.getpid():
+                _client = WeatherClient(OPENWEATHER_API_KEY)
+                _cache = WeatherCache(_client, ttl=WEATHER_CACHE_TTL, stale_ttl=3 * WEATHER_CACHE_TTL)
+                _client_pid = os.getpid()
+    return _client
+
+
+def get_cache():
+    get_client()
+    return _cache
+
+
+def fetch_weather(city):
+    return get_cache().get_weather(city)
+
+
+def get_weather(city):
+    weather, error = fetch_weather(city)
+    return weather
\ No newline at end of file
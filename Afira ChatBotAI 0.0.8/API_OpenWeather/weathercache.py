@@ -0,0 +1,120 @@
+import threading
+import time
+from collections import OrderedDict
+from concurrent.futures import TimeoutError as FutureTimeoutError
+
+from weatherclient import WEATHER_UNAVAILABLE
+
+
+class CachedWeather:
+    __slots__ = ('weather', 'error', 'fetched_at')
+
+    def __init__(self, weather, error, fetched_at):
+        self.weather = weather
+        self.error = error
+        self.fetched_at = fetched_at
+
+
+class WeatherCache:
+    def __init__(self, client, ttl=600.0, stale_ttl=1800.0, not_found_ttl=300.0, max_entries=1024):
+        self.client = client
+        self.ttl = ttl
+        # past ttl but within stale_ttl an entry is still served while one refresh runs
+        self.stale_ttl = stale_ttl
+        self.not_found_ttl = not_found_ttl
+        self.max_entries = max_entries
+        self._entries = OrderedDict()
+        self._inflight = {}
+        # re-entrant: add_done_callback runs _store inline if the fetch already finished
+        self._lock = threading.RLock()
+        self.hits = 0
+        self.stale_hits = 0
+        self.misses = 0
+        self.coalesced = 0
+        self.upstream_calls = 0
+        self.evictions = 0
+
+    @staticmethod
+    def normalize(city):
+        return ' '.join(city.lower().split())
+
+    def get_weather(self, city):
+        key = self.normalize(city)
+        if not key:
+            return self.client.get_weather(city)
+
+        with self._lock:
+            now = time.monotonic()
+            entry = self._entries.get(key)
+            if entry is not None:
+                age = now - entry.fetched_at
+                if age < (self.ttl if entry.error is None else self.not_found_ttl):
+                    self._entries.move_to_end(key)
+                    self.hits += 1
+                    return entry.weather, entry.error
+                if entry.error is None and age < self.stale_ttl:
+                    self._entries.move_to_end(key)
+                    self.stale_hits += 1
+                    if key not in self._inflight:
+                        self._start_fetch(key, city)
+                    return entry.weather, entry.error
+
+            future = self._inflight.get(key)
+            if future is not None:
+                self.coalesced += 1
+            else:
+                self.misses += 1
+                future = self._start_fetch(key, city)
+                if future is None:
+                    return None, WEATHER_UNAVAILABLE
+
+        try:
+            return future.result(timeout=self.client.deadline)
+        except FutureTimeoutError:
+            return None, WEATHER_UNAVAILABLE
+
+    def _start_fetch(self, key, city):
+        # called with the lock held
+        future = self.client.submit(city)
+        if future is None:
+            return None
+        self.upstream_calls += 1
+        self._inflight[key] = future
+        future.add_done_callback(lambda f: self._store(key, f))
+        return future
+
+    def _store(self, key, future):
+        try:
+            weather, error = future.result()
+        except Exception:
+            weather, error = None, WEATHER_UNAVAILABLE
+
+        with self._lock:
+            self._inflight.pop(key, None)
+            # upstream trouble is never cached; a stale entry beats no entry
+            if error == WEATHER_UNAVAILABLE:
+                return
+            self._entries[key] = CachedWeather(weather, error, time.monotonic())
+            self._entries.move_to_end(key)
+            while len(self._entries) > self.max_entries:
+                self._entries.popitem(last=False)
+                self.evictions += 1
+
+    def clear(self):
+        with self._lock:
+            self._entries.clear()
+
+    def stats(self):
+        with self._lock:
+            lookups = self.hits + self.stale_hits + self.misses + self.coalesced
+            return {
+                'size': len(self._entries),
+                'max_entries': self.max_entries,
+                'hits': self.hits,
+                'stale_hits': self.stale_hits,
+                'misses': self.misses,
+                'coalesced': self.coalesced,
+                'upstream_calls': self.upstream_calls,
+                'evictions': self.evictions,
+                'hit_ratio': (self.hits + self.stale_hits) / lookups if lookups else 0.0
+            }
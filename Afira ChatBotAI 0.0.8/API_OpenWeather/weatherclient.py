@@ -0,0 +1,130 @@
+import os
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor, TimeoutError as FutureTimeoutError
+
+import requests
+from requests.adapters import HTTPAdapter
+
+OPENWEATHER_URL = os.environ.get('OPENWEATHER_URL', 'http://api.openweathermap.org/data/2.5/weather')
+
+WEATHER_NOT_FOUND = 'not_found'
+WEATHER_UNAVAILABLE = 'unavailable'
+
+
+class CircuitBreaker:
+    CLOSED = 'closed'
+    OPEN = 'open'
+    HALF_OPEN = 'half_open'
+
+    def __init__(self, failure_threshold=5, reset_timeout=30.0):
+        self.failure_threshold = failure_threshold
+        self.reset_timeout = reset_timeout
+        self.state = self.CLOSED
+        self.failures = 0
+        self.opened_at = 0.0
+        self._lock = threading.Lock()
+
+    def allow(self):
+        with self._lock:
+            if self.state == self.CLOSED:
+                return True
+            if self.state == self.OPEN and time.monotonic() - self.opened_at >= self.reset_timeout:
+                # let a single probe through; everyone else keeps failing fast
+                self.state = self.HALF_OPEN
+                return True
+            return False
+
+    def record_success(self):
+        with self._lock:
+            self.state = self.CLOSED
+            self.failures = 0
+
+    def record_failure(self):
+        with self._lock:
+            self.failures += 1
+            if self.state == self.HALF_OPEN or self.failures >= self.failure_threshold:
+                self.state = self.OPEN
+                self.opened_at = time.monotonic()
+
+    def status(self):
+        with self._lock:
+            return {'state': self.state, 'failures': self.failures}
+
+
+class WeatherClient:
+    def __init__(self, api_key, base_url=OPENWEATHER_URL, connect_timeout=2.0, read_timeout=3.0,
+                 pool_size=10, max_workers=8, failure_threshold=5, reset_timeout=30.0):
+        self.api_key = api_key
+        self.base_url = base_url
+        self.timeout = (connect_timeout, read_timeout)
+        # overall budget for a lookup, on top of what requests enforces per socket op
+        self.deadline = connect_timeout + read_timeout
+        self.breaker = CircuitBreaker(failure_threshold, reset_timeout)
+
+        self.session = requests.Session()
+        adapter = HTTPAdapter(pool_connections=1, pool_maxsize=pool_size, max_retries=0)
+        self.session.mount('http://', adapter)
+        self.session.mount('https://', adapter)
+
+        self.executor = ThreadPoolExecutor(max_workers=max_workers, thread_name_prefix='weather')
+
+    def _request(self, city):
+        params = {'q': city, 'appid': self.api_key, 'units': 'metric'}
+        try:
+            r = self.session.get(self.base_url, params=params, timeout=self.timeout)
+            data = r.json()
+        except Exception:
+            # anything unexpected still has to reach the breaker, or a
+            # half-open probe would never report back and it stays shut
+            self.breaker.record_failure()
+            return None, WEATHER_UNAVAILABLE
+        if not isinstance(data, dict):
+            self.breaker.record_failure()
+            return None, WEATHER_UNAVAILABLE
+
+        cod = str(data.get('cod'))
+        if cod == '404':
+            self.breaker.record_success()
+            return None, WEATHER_NOT_FOUND
+        if cod != '200':
+            self.breaker.record_failure()
+            return None, WEATHER_UNAVAILABLE
+
+        self.breaker.record_success()
+        try:
+            return {
+                "city": data["name"],
+                "temp": data["main"]["temp"],
+                "feels": data["main"]["feels_like"],
+                "desc": data["weather"][0]["description"],
+                "humidity": data["main"]["humidity"],
+                "wind": data["wind"]["speed"]
+            }, None
+        except (KeyError, IndexError, TypeError):
+            return None, WEATHER_NOT_FOUND
+
+    def submit(self, city):
+        if not self.breaker.allow():
+            return None
+        return self.executor.submit(self._request, city)
+
+    def get_weather(self, city):
+        future = self.submit(city)
+        if future is None:
+            return None, WEATHER_UNAVAILABLE
+        return self.wait(future)
+
+    def wait(self, future):
+        try:
+            return future.result(timeout=self.deadline)
+        except FutureTimeoutError:
+            self.breaker.record_failure()
+            return None, WEATHER_UNAVAILABLE
+
+    def status(self):
+        return {'circuit': self.breaker.status(), 'base_url': self.base_url}
+
+    def close(self):
+        self.executor.shutdown(wait=False, cancel_futures=True)
+        self.session.close()
@@ -0,0 +1,373 @@
+import argparse
+import json
+import os
+import random
+import signal
+import subprocess
+import sys
+import threading
+import time
+import uuid
+from collections import defaultdict
+from datetime import datetime, timezone
+
+import requests
+
+# HTTP load benchmark for the chat server. Replays the chatbotdata.json
+# patterns and the scripted heart / asthma dialogs from scenarios.json
+# against /predict, with a local fake OpenWeather behind the weather intent.
+#
+#   python Benchmarks/loadbench.py run --url http://127.0.0.1:5000 --concurrency 16 --duration 60 --out v008.json
+#   python Benchmarks/loadbench.py compare v007.json v008.json
+#
+# The server must send its weather lookups to the fake, e.g. start it with
+#   OPENWEATHER_URL=http://127.0.0.1:8089/data/2.5/weather
+# or let the benchmark start it with --launch.
+
+BENCH_DIR = os.path.dirname(os.path.abspath(__file__))
+APP_DIR = os.path.dirname(BENCH_DIR)
+sys.path.append(os.path.join(APP_DIR, 'API_OpenWeather'))
+
+from fakeweather import start_in_background
+
+DEFAULT_PATTERNS = os.path.join(APP_DIR, 'chatbotdata.json')
+DEFAULT_SCENARIOS = os.path.join(BENCH_DIR, 'scenarios.json')
+
+
+def percentile(sorted_values, pct):
+    if not sorted_values:
+        return 0.0
+    rank = max(0, min(len(sorted_values) - 1, int(round(pct / 100.0 * len(sorted_values) + 0.5)) - 1))
+    return sorted_values[rank]
+
+
+def latency_summary(latencies):
+    values = sorted(latencies)
+    return {
+        'p50': round(percentile(values, 50) * 1000, 3),
+        'p95': round(percentile(values, 95) * 1000, 3),
+        'p99': round(percentile(values, 99) * 1000, 3),
+        'mean': round(sum(values) / len(values) * 1000, 3) if values else 0.0,
+        'max': round(values[-1] * 1000, 3) if values else 0.0
+    }
+
+
+class Workload:
+    # hands out scenarios to the worker threads: the patterns are replayed in
+    # a shuffled cycle and the dialogs are mixed in by weight
+    def __init__(self, patterns, scenarios, mix, seed=0):
+        self.rng = random.Random(seed)
+        self.patterns = patterns
+        self.order = []
+        self.fillers = scenarios.get('fillers', {})
+        self.default_filler = scenarios.get('default_filler', 'this')
+        self.dialogs = scenarios.get('dialogs', {})
+        self.kinds = [kind for kind, weight in mix.items() if weight > 0]
+        self.weights = [mix[kind] for kind in self.kinds]
+        self._lock = threading.Lock()
+
+    def fill(self, intent, pattern):
+        while '*' in pattern:
+            pattern = pattern.replace('*', self.rng.choice(self.fillers.get(intent, [self.default_filler])), 1)
+        return pattern
+
+    def next(self):
+        with self._lock:
+            kind = self.rng.choices(self.kinds, self.weights)[0]
+            if kind == 'patterns':
+                if not self.order:
+                    self.order = list(range(len(self.patterns)))
+                    self.rng.shuffle(self.order)
+                intent, pattern = self.patterns[self.order.pop()]
+                return 'pattern', intent, [self.fill(intent, pattern)]
+            return 'dialog', f'dialog:{kind}', list(self.dialogs[kind])
+
+
+class Recorder:
+    def __init__(self):
+        self._lock = threading.Lock()
+        self.latencies = defaultdict(list)
+        self.errors = defaultdict(int)
+        self.mismatches = defaultdict(int)
+        self.dialogs_started = defaultdict(int)
+        self.dialogs_completed = defaultdict(int)
+        self.enabled = False
+
+    def record(self, label, latency, error=False, mismatch=False):
+        if not self.enabled:
+            return
+        with self._lock:
+            self.latencies[label].append(latency)
+            if error:
+                self.errors[label] += 1
+            if mismatch:
+                self.mismatches[label] += 1
+
+    def dialog(self, label, completed):
+        if not self.enabled:
+            return
+        with self._lock:
+            self.dialogs_started[label] += 1
+            if completed:
+                self.dialogs_completed[label] += 1
+
+
+def send(session, url, message, user_id, timeout):
+    started = time.perf_counter()
+    try:
+        r = session.post(url, json={'message': message, 'user_id': user_id}, timeout=timeout)
+        elapsed = time.perf_counter() - started
+        if r.status_code != 200:
+            return elapsed, None
+        data = r.json()
+        return elapsed, None if 'error' in data and 'response' not in data else data
+    except (requests.RequestException, ValueError):
+        return time.perf_counter() - started, None
+
+
+def worker(url, workload, recorder, stop, timeout):
+    session = requests.Session()
+    predict_url = url.rstrip('/') + '/predict'
+    while not stop.is_set():
+        kind, label, messages = workload.next()
+        user_id = f'bench-{uuid.uuid4().hex[:12]}'
+        completed = True
+        for message in messages:
+            if stop.is_set():
+                completed = False
+                break
+            latency, data = send(session, predict_url, message, user_id, timeout)
+            if data is None:
+                recorder.record(label, latency, error=True)
+                completed = False
+                break
+            mismatch = kind == 'pattern' and data.get('intent') != label
+            recorder.record(label, latency, mismatch=mismatch)
+        if kind == 'dialog':
+            recorder.dialog(label, completed and data.get('collecting_data') is False)
+    session.close()
+
+
+def wait_for_server(url, timeout=60.0):
+    deadline = time.monotonic() + timeout
+    while time.monotonic() < deadline:
+        try:
+            # any HTTP answer means the server is up; older versions have no /health
+            requests.get(url, timeout=1.0)
+            return True
+        except requests.RequestException:
+            time.sleep(0.25)
+    return False
+
+
+def fetch_health(url):
+    try:
+        r = requests.get(url.rstrip('/') + '/health', timeout=2.0)
+        return r.json() if r.status_code == 200 else None
+    except (requests.RequestException, ValueError):
+        return None
+
+
+def load_patterns(path):
+    with open(path, 'r', encoding='utf-8') as f:
+        data = json.load(f)
+    return [(intent['name'], pattern) for intent in data['intents'] for pattern in intent['patterns']]
+
+
+def parse_mix(text, default):
+    if not text:
+        return dict(default)
+    mix = {}
+    for part in text.split(','):
+        kind, weight = part.split('=')
+        mix[kind.strip()] = float(weight)
+    return mix
+
+
+def run(args):
+    with open(args.scenarios, 'r', encoding='utf-8') as f:
+        scenarios = json.load(f)
+    mix = parse_mix(args.mix, scenarios.get('mix', {'patterns': 1}))
+    unknown = [kind for kind in mix if kind != 'patterns' and kind not in scenarios.get('dialogs', {})]
+    if unknown:
+        raise SystemExit(f"Unknown workload kinds in --mix: {', '.join(unknown)}")
+
+    weather = None
+    if not args.no_fake_weather:
+        weather = start_in_background(port=args.weather_port, latency=args.weather_latency,
+                                      jitter=args.weather_jitter, error_rate=args.weather_error_rate)
+        print(f"Fake OpenWeather on port {args.weather_port} "
+              f"(latency {args.weather_latency * 1000:.0f} ms, jitter {args.weather_jitter * 1000:.0f} ms)")
+
+    server = None
+    if args.launch:
+        env = dict(os.environ)
+        env['OPENWEATHER_URL'] = f'http://127.0.0.1:{args.weather_port}/data/2.5/weather'
+        # own process group, so the shell and everything it started stop together
+        server = subprocess.Popen(args.launch, shell=True, cwd=args.app_dir, env=env, start_new_session=True,
+                                  stdout=subprocess.DEVNULL, stderr=subprocess.DEVNULL)
+        print(f"Launched server: {args.launch}")
+
+    try:
+        if not wait_for_server(args.url, args.startup_timeout):
+            raise SystemExit(f"No server answering at {args.url}")
+
+        workload = Workload(load_patterns(args.patterns), scenarios, mix, seed=args.seed)
+        recorder = Recorder()
+        stop = threading.Event()
+        threads = [
+            threading.Thread(target=worker, args=(args.url, workload, recorder, stop, args.timeout), daemon=True)
+            for _ in range(args.concurrency)
+        ]
+        for thread in threads:
+            thread.start()
+
+        if args.warmup > 0:
+            print(f"Warming up for {args.warmup:.0f}s...")
+            time.sleep(args.warmup)
+        recorder.enabled = True
+        upstream_before = weather.requests_served if weather else 0
+        started = time.perf_counter()
+        print(f"Measuring for {args.duration:.0f}s with {args.concurrency} clients...")
+        time.sleep(args.duration)
+        recorder.enabled = False
+        elapsed = time.perf_counter() - started
+        stop.set()
+        for thread in threads:
+            thread.join(timeout=args.timeout + 1)
+
+        health = fetch_health(args.url)
+    finally:
+        if server is not None:
+            os.killpg(server.pid, signal.SIGTERM)
+            server.wait(timeout=30)
+        if weather is not None:
+            weather.shutdown()
+
+    intents = {}
+    all_latencies = []
+    for label in sorted(recorder.latencies):
+        latencies = recorder.latencies[label]
+        all_latencies.extend(latencies)
+        intents[label] = {
+            'requests': len(latencies),
+            'errors': recorder.errors[label],
+            'mismatches': recorder.mismatches[label],
+            'throughput_rps': round(len(latencies) / elapsed, 2),
+            'latency_ms': latency_summary(latencies)
+        }
+
+    total = len(all_latencies)
+    results = {
+        'label': args.label,
+        'url': args.url,
+        'started_at': datetime.now(timezone.utc).isoformat(timespec='seconds'),
+        'config': {
+            'concurrency': args.concurrency,
+            'duration_s': args.duration,
+            'warmup_s': args.warmup,
+            'mix': mix,
+            'seed': args.seed,
+            'weather_latency_s': None if weather is None else args.weather_latency,
+            'weather_jitter_s': None if weather is None else args.weather_jitter,
+            'weather_error_rate': None if weather is None else args.weather_error_rate
+        },
+        'server': health,
+        'overall': {
+            'requests': total,
+            'errors': sum(recorder.errors.values()),
+            'throughput_rps': round(total / elapsed, 2),
+            'latency_ms': latency_summary(all_latencies)
+        },
+        'intents': intents,
+        'dialogs': {
+            label: {'started': recorder.dialogs_started[label], 'completed': recorder.dialogs_completed[label]}
+            for label in sorted(recorder.dialogs_started)
+        },
+        'weather_upstream_requests': None if weather is None else weather.requests_served - upstream_before
+    }
+
+    print_results(results)
+    if args.out:
+        with open(args.out, 'w', encoding='utf-8') as f:
+            json.dump(results, f, indent=2)
+        print(f"Results written to {args.out}")
+    return results
+
+
+def print_results(results):
+    overall = results['overall']
+    print(f"\n{results['label'] or results['url']}: {overall['requests']} requests, "
+          f"{overall['throughput_rps']} req/s, {overall['errors']} errors")
+    print(f"{'intent':<24}{'req':>8}{'err':>6}{'p50 ms':>10}{'p95 ms':>10}{'p99 ms':>10}")
+    rows = list(results['intents'].items()) + [('overall', overall)]
+    for label, stats in rows:
+        latency = stats['latency_ms']
+        print(f"{label:<24}{stats['requests']:>8}{stats['errors']:>6}"
+              f"{latency['p50']:>10.2f}{latency['p95']:>10.2f}{latency['p99']:>10.2f}")
+
+
+def compare(args):
+    with open(args.baseline, 'r', encoding='utf-8') as f:
+        base = json.load(f)
+    with open(args.candidate, 'r', encoding='utf-8') as f:
+        cand = json.load(f)
+
+    def change(old, new):
+        return f"{(new - old) / old * 100:+.1f}%" if old else 'n/a'
+
+    print(f"baseline:  {base['label'] or base['url']} ({base['started_at']})")
+    print(f"candidate: {cand['label'] or cand['url']} ({cand['started_at']})")
+    print(f"{'intent':<24}{'rps':>18}{'p50 ms':>18}{'p99 ms':>18}{'errors':>10}")
+    labels = sorted(set(base['intents']) | set(cand['intents'])) + ['overall']
+    for label in labels:
+        old = base['overall'] if label == 'overall' else base['intents'].get(label)
+        new = cand['overall'] if label == 'overall' else cand['intents'].get(label)
+        if old is None or new is None:
+            print(f"{label:<24}{'only in ' + ('candidate' if old is None else 'baseline'):>18}")
+            continue
+        print(f"{label:<24}"
+              f"{new['throughput_rps']:>10.1f} {change(old['throughput_rps'], new['throughput_rps']):>7}"
+              f"{new['latency_ms']['p50']:>10.2f} {change(old['latency_ms']['p50'], new['latency_ms']['p50']):>7}"
+              f"{new['latency_ms']['p99']:>10.2f} {change(old['latency_ms']['p99'], new['latency_ms']['p99']):>7}"
+              f"{old['errors']:>5}->{new['errors']:<4}")
+
+
+def main():
+    parser = argparse.ArgumentParser(description='Afira chat server load benchmark')
+    subparsers = parser.add_subparsers(dest='command', required=True)
+
+    run_parser = subparsers.add_parser('run', help='Run the benchmark against a server')
+    run_parser.add_argument('--url', default='http://127.0.0.1:5000')
+    run_parser.add_argument('--label', default='', help='Name for this run, e.g. 0.0.8')
+    run_parser.add_argument('--concurrency', type=int, default=8)
+    run_parser.add_argument('--duration', type=float, default=30.0, help='Measured seconds')
+    run_parser.add_argument('--warmup', type=float, default=5.0, help='Unmeasured seconds before measuring')
+    run_parser.add_argument('--timeout', type=float, default=10.0, help='Per-request timeout')
+    run_parser.add_argument('--mix', default=None, help='Workload weights, e.g. patterns=90,heart=5,asthma=5')
+    run_parser.add_argument('--seed', type=int, default=0)
+    run_parser.add_argument('--patterns', default=DEFAULT_PATTERNS)
+    run_parser.add_argument('--scenarios', default=DEFAULT_SCENARIOS)
+    run_parser.add_argument('--weather-port', type=int, default=8089)
+    run_parser.add_argument('--weather-latency', type=float, default=0.2, help='Fake OpenWeather delay in seconds')
+    run_parser.add_argument('--weather-jitter', type=float, default=0.1)
+    run_parser.add_argument('--weather-error-rate', type=float, default=0.0)
+    run_parser.add_argument('--no-fake-weather', action='store_true')
+    run_parser.add_argument('--launch', default=None, help='Command that starts the server, e.g. "python -m gunicorn -c gunicorn.conf.py"')
+    run_parser.add_argument('--app-dir', default=APP_DIR, help='Working directory for --launch')
+    run_parser.add_argument('--startup-timeout', type=float, default=60.0)
+    run_parser.add_argument('--out', default=None, help='JSON file for the results')
+
+    compare_parser = subparsers.add_parser('compare', help='Compare two result files')
+    compare_parser.add_argument('baseline')
+    compare_parser.add_argument('candidate')
+
+    args = parser.parse_args()
+    if args.command == 'run':
+        run(args)
+    else:
+        compare(args)
+
+
+if __name__ == '__main__':
+    main()
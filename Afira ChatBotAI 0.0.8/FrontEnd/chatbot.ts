@@ -4,22 +4,33 @@ export interface Message {
 }
 
 const API_URL = 'http://localhost:5000';
+const SOCKET_URL = API_URL.replace(/^http/, 'ws');
 
 let isServerReady = false;
 let userId: string | null = null;
 
-function getUserId(): string {
+// one WebSocket per user for the whole conversation; everything falls back
+// to the HTTP API when the server has no /ws or the socket can't be opened
+let socketSupported = false;
+let socketReady: Promise<WebSocket | null> | null = null;
+let pendingTurn: { resolve: (text: string) => void; onIntro: (text: string) => void } | null = null;
+
+// the server issues the user id: the first message goes without one and
+// every reply says which id the conversation continues under
+function getUserId(): string | null {
     if (!userId) {
         userId = localStorage.getItem('afira_user_id');
-        if (!userId) {
-            userId = 'user_' + Math.random().toString(36).substring(2, 15) + 
-                     Math.random().toString(36).substring(2, 15);
-            localStorage.setItem('afira_user_id', userId);
-        }
     }
     return userId;
 }
 
+function rememberUserId(id: string | undefined): void {
+    if (id && id !== userId) {
+        userId = id;
+        localStorage.setItem('afira_user_id', id);
+    }
+}
+
 export async function checkServerHealth(): Promise<boolean> {
     try {
         const response = await fetch(`${API_URL}/health`, {
@@ -27,6 +38,7 @@ export async function checkServerHealth(): Promise<boolean> {
         });
         const data = await response.json();
         isServerReady = data.status === 'ok' && data.model_loaded;
+        socketSupported = data.subsystems?.websocket === 'available';
         return isServerReady;
     } catch (error) {
         console.error('Server health check failed:', error);
@@ -77,22 +89,79 @@ export async function processUserMessage(message: string): Promise<string> {
         }
         
         const data = await response.json();
+        rememberUserId(data.user_id);
+        logReply(data);
         
-        if (data.confidence) {
-            console.log(`Intent: ${data.intent} (${(data.confidence * 100).toFixed(1)}%)`);
-        } else {
-            console.log(`Intent: ${data.intent}`);
-        }
+        return data.response;
+        
+    } catch (error) {
+        console.error('Prediction error:', error);
+        return "Sorry, I couldn't process your message. Please check if the server is running.";
+    }
+}
+
+// Like processUserMessage, but for slow intents (weather) the server sends
+// the intro as soon as the message is classified and onIntro gets it, so it
+// can be shown while the rest is on its way. Goes over the WebSocket when
+// there is one, then /predict_stream, then /predict.
+export async function processUserMessageStream(message: string, onIntro: (text: string) => void): Promise<string> {
+    if (!isServerReady) {
+        return "Server is not ready. Please make sure the Flask API is running on port 5000.";
+    }
+    
+    const socket = await openSocket();
+    if (socket) {
+        return sendOverSocket(socket, message, onIntro);
+    }
+    
+    try {
+        const response = await fetch(`${API_URL}/predict_stream`, {
+            method: 'POST',
+            headers: {
+                'Content-Type': 'application/json',
+            },
+            body: JSON.stringify({ 
+                message: message,
+                user_id: getUserId()
+            }),
+        });
         
-        if (data.collecting_data === true) {
-            console.log(`Collecting data: ${data.progress || 'in progress'}`);
+        if (!response.ok || !response.body) {
+            return processUserMessage(message);
         }
         
-        if (data.prediction) {
-            console.log(`Prediction completed:`, data.prediction);
+        const reader = response.body.getReader();
+        const decoder = new TextDecoder();
+        let buffer = '';
+        
+        while (true) {
+            const { done, value } = await reader.read();
+            if (done) {
+                break;
+            }
+            buffer += decoder.decode(value, { stream: true });
+            
+            // events are separated by a blank line
+            let boundary = buffer.indexOf('\n\n');
+            while (boundary !== -1) {
+                const event = parseEvent(buffer.slice(0, boundary));
+                buffer = buffer.slice(boundary + 2);
+                boundary = buffer.indexOf('\n\n');
+                
+                if (event.name === 'intent') {
+                    console.log(`Intent: ${event.data.intent} (${(event.data.confidence * 100).toFixed(1)}%), waiting for the rest`);
+                    onIntro(event.data.response);
+                } else if (event.name === 'result') {
+                    rememberUserId(event.data.user_id);
+                    logReply(event.data);
+                    return event.data.response;
+                } else if (event.name === 'error') {
+                    throw new Error(event.data.error);
+                }
+            }
         }
         
-        return data.response;
+        throw new Error('Stream ended without a result');
         
     } catch (error) {
         console.error('Prediction error:', error);
@@ -100,6 +169,100 @@ export async function processUserMessage(message: string): Promise<string> {
     }
 }
 
+function openSocket(): Promise<WebSocket | null> {
+    if (!socketSupported || typeof WebSocket === 'undefined') {
+        return Promise.resolve(null);
+    }
+    if (socketReady) {
+        return socketReady;
+    }
+    
+    socketReady = new Promise((resolve) => {
+        const currentId = getUserId();
+        const query = currentId ? `?user_id=${encodeURIComponent(currentId)}` : '';
+        const socket = new WebSocket(`${SOCKET_URL}/ws${query}`);
+        let opened = false;
+        
+        socket.onmessage = (event) => {
+            const frame = JSON.parse(event.data);
+            
+            if (frame.event === 'ready') {
+                opened = true;
+                rememberUserId(frame.data.user_id);
+                console.log('Conversation socket open');
+                resolve(socket);
+            } else if (frame.event === 'intent') {
+                console.log(`Intent: ${frame.data.intent} (${(frame.data.confidence * 100).toFixed(1)}%), waiting for the rest`);
+                pendingTurn?.onIntro(frame.data.response);
+            } else if (frame.event === 'result') {
+                logReply(frame.data);
+                finishTurn(frame.data.response);
+            } else if (frame.event === 'error') {
+                console.error('Prediction error:', frame.data.error);
+                finishTurn("Sorry, I couldn't process your message. Please try again.");
+            }
+        };
+        
+        socket.onclose = () => {
+            socketReady = null;
+            if (!opened) {
+                // no usable socket on this server; stay on HTTP
+                socketSupported = false;
+                resolve(null);
+                return;
+            }
+            // the message may or may not have been handled, so it is not resent
+            finishTurn("The connection was lost. Please send your message again.");
+        };
+    });
+    
+    return socketReady;
+}
+
+function sendOverSocket(socket: WebSocket, message: string, onIntro: (text: string) => void): Promise<string> {
+    return new Promise((resolve) => {
+        pendingTurn = { resolve, onIntro };
+        socket.send(JSON.stringify({ message: message }));
+    });
+}
+
+function finishTurn(text: string): void {
+    const turn = pendingTurn;
+    pendingTurn = null;
+    turn?.resolve(text);
+}
+
+function parseEvent(block: string): { name: string; data: any } {
+    let name = 'message';
+    const dataLines: string[] = [];
+    
+    for (const line of block.split('\n')) {
+        if (line.startsWith('event:')) {
+            name = line.slice(6).trim();
+        } else if (line.startsWith('data:')) {
+            dataLines.push(line.slice(5).trim());
+        }
+    }
+    
+    return { name, data: dataLines.length ? JSON.parse(dataLines.join('\n')) : null };
+}
+
+function logReply(data: any): void {
+    if (data.confidence) {
+        console.log(`Intent: ${data.intent} (${(data.confidence * 100).toFixed(1)}%)`);
+    } else {
+        console.log(`Intent: ${data.intent}`);
+    }
+    
+    if (data.collecting_data === true) {
+        console.log(`Collecting data: ${data.progress || 'in progress'}`);
+    }
+    
+    if (data.prediction) {
+        console.log(`Prediction completed:`, data.prediction);
+    }
+}
+
 export async function resetConversation(): Promise<void> {
     console.log("Resetting conversation and session...");
     
@@ -123,6 +286,6 @@ export async function resetConversation(): Promise<void> {
     }
 }
 
-export function getCurrentUserId(): string {
+export function getCurrentUserId(): string | null {
     return getUserId();
 }
\ No newline at end of file
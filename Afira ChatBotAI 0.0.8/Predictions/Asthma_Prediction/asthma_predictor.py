@@ -1,33 +1,54 @@
 import pickle
 import numpy as np
-import pandas as pd
 import os
-from catboost import CatBoostClassifier
+
+from tree_model import ObliviousTreeModel
+
+def to_float_array(values):
+    try:
+        return np.asarray(values, dtype=np.float64)
+    except (TypeError, ValueError):
+        def to_float(value):
+            try:
+                return float(value)
+            except (TypeError, ValueError):
+                return np.nan
+        return np.array([to_float(value) for value in values], dtype=np.float64)
+
 
 class AsthmaPredictor:
     def __init__(self, model_dir=None):
         self.model = None
+        self.model_format = None
         self.model_dir = model_dir if model_dir else os.getcwd()
         self.fields = [
-            {'name': 'Age', 'question': 'What is your age?', 'type': 'numeric'},
-            {'name': 'Gender', 'question': 'What is your gender? (Male/Female)', 'type': 'categorical'},
-            {'name': 'BMI', 'question': 'What is your Body Mass Index (BMI)?', 'type': 'numeric'},
-            {'name': 'Smoking_Status', 'question': 'Smoking status? (Never/Former/Current)', 'type': 'categorical'},
+            {'name': 'Age', 'question': 'What is your age?', 'type': 'numeric', 'min': 0, 'max': 120},
+            {'name': 'Gender', 'question': 'What is your gender? (Male/Female)', 'type': 'categorical', 'options': ['Male', 'Female', 'Other']},
+            {'name': 'BMI', 'question': 'What is your Body Mass Index (BMI)?', 'type': 'numeric', 'min': 10, 'max': 80},
+            {'name': 'Smoking_Status', 'question': 'Smoking status? (Never/Former/Current)', 'type': 'categorical', 'options': ['Never', 'Former', 'Current']},
             {'name': 'Family_History', 'question': 'Do you have a family history of asthma? (0=No, 1=Yes)', 'type': 'binary'},
-            {'name': 'Allergies', 'question': 'Do you have allergies? (None/Dust/Pollen/Pet/Multiple)', 'type': 'categorical'},
-            {'name': 'Air_Pollution_Level', 'question': 'What is the air pollution level in your area? (Low/Moderate/High)', 'type': 'categorical'},
-            {'name': 'Physical_Activity_Level', 'question': 'What is your level of physical activity? (Sedentary/Moderate/Active)', 'type': 'categorical'},
-            {'name': 'Occupation_Type', 'question': 'What type of occupation do you have? (Indoor/Outdoor)', 'type': 'categorical'},
-            {'name': 'Comorbidities', 'question': 'Do you have any comorbidities? (None/Diabetes/Hypertension/Both)', 'type': 'categorical'},
-            {'name': 'Medication_Adherence', 'question': 'What is your medication adherence level? (value between 0 and 1)', 'type': 'numeric'},
-            {'name': 'Number_of_ER_Visits', 'question': 'How many emergency room visits have you had in the past year?', 'type': 'numeric'},
-            {'name': 'Peak_Expiratory_Flow', 'question': 'Peak Expiratory Flow (PEF) - value in L/min?', 'type': 'numeric'},
-            {'name': 'FeNO_Level', 'question': 'What is your FeNO level (Fractional Exhaled Nitric Oxide)?', 'type': 'numeric'}
+            {'name': 'Allergies', 'question': 'Do you have allergies? (None/Dust/Pollen/Pet/Multiple)', 'type': 'categorical', 'options': ['None', 'Dust', 'Pollen', 'Pets', 'Multiple']},
+            {'name': 'Air_Pollution_Level', 'question': 'What is the air pollution level in your area? (Low/Moderate/High)', 'type': 'categorical', 'options': ['Low', 'Moderate', 'High']},
+            {'name': 'Physical_Activity_Level', 'question': 'What is your level of physical activity? (Sedentary/Moderate/Active)', 'type': 'categorical', 'options': ['Sedentary', 'Moderate', 'Active']},
+            {'name': 'Occupation_Type', 'question': 'What type of occupation do you have? (Indoor/Outdoor)', 'type': 'categorical', 'options': ['Indoor', 'Outdoor']},
+            {'name': 'Comorbidities', 'question': 'Do you have any comorbidities? (None/Diabetes/Hypertension/Both)', 'type': 'categorical', 'options': ['None', 'Diabetes', 'Hypertension', 'Both']},
+            {'name': 'Medication_Adherence', 'question': 'What is your medication adherence level? (value between 0 and 1)', 'type': 'numeric', 'min': 0, 'max': 1},
+            {'name': 'Number_of_ER_Visits', 'question': 'How many emergency room visits have you had in the past year?', 'type': 'numeric', 'min': 0, 'max': 100, 'integer': True},
+            {'name': 'Peak_Expiratory_Flow', 'question': 'Peak Expiratory Flow (PEF) - value in L/min?', 'type': 'numeric', 'min': 50, 'max': 1000},
+            {'name': 'FeNO_Level', 'question': 'What is your FeNO level (Fractional Exhaled Nitric Oxide)?', 'type': 'numeric', 'min': 0, 'max': 300}
         ]
         self.load_model()
         
     def load_model(self):
         try:
+            # the NumPy export (tree_model.py export) needs neither catboost nor pandas
+            tree_model_path = os.path.join(self.model_dir, 'asthma_model.npz')
+            if os.path.exists(tree_model_path):
+                self.model = ObliviousTreeModel.load(tree_model_path)
+                self.model_format = 'numpy'
+                print(f"Asthma prediction model loaded from {tree_model_path}")
+                return True
+            
             model_path = os.path.join(self.model_dir, 'asthma_prediction.pkl')
             print(f"Looking for model at: {model_path}")
             
@@ -37,6 +58,7 @@ class AsthmaPredictor:
             
             with open(model_path, 'rb') as f:
                 self.model = pickle.load(f)
+            self.model_format = 'catboost'
             
             print(f"Asthma prediction model loaded successfully!")
             return True
@@ -110,6 +132,14 @@ class AsthmaPredictor:
             return None, "Asthma prediction model not loaded!"
         
         try:
+            if self.model_format == 'numpy':
+                probability = self.model.predict_proba_records([user_data])[0]
+                return probability, None
+            
+            # pandas is only needed once an assessment is actually scored;
+            # catboost itself is pulled in by unpickling the model
+            import pandas as pd
+            
             feature_order = [field['name'] for field in self.fields]
             features_dict = {name: [user_data.get(name, 0)] for name in feature_order}
             
@@ -122,6 +152,56 @@ class AsthmaPredictor:
         except Exception as e:
             return None, f"Error making prediction: {str(e)}"
         
+    def score_many(self, features):
+        # features: a DataFrame-like with the field names as columns; returns
+        # one probability per row
+        if self.model is None:
+            raise RuntimeError("Asthma prediction model not loaded!")
+        
+        if self.model_format == 'numpy':
+            return self.score_columns(features)
+        
+        import pandas as pd
+        
+        feature_order = [field['name'] for field in self.fields]
+        df = features if hasattr(features, 'columns') else pd.DataFrame(features)
+        df = df.reindex(columns=feature_order)
+        
+        # a missing value scores as 0, the same as a missing key in make_prediction
+        for field in self.fields:
+            name = field['name']
+            if field['type'] == 'categorical':
+                df[name] = df[name].where(df[name].notna(), '0').astype(str)
+            else:
+                df[name] = pd.to_numeric(df[name], errors='coerce').fillna(0)
+        
+        return self.model.predict_proba(df)[:, 1]
+        
+    def records_to_matrix(self, records):
+        # validated records as columns, which both score_many paths take
+        return {field['name']: [record[field['name']] for record in records] for field in self.fields}
+    
+    def score_columns(self, features):
+        # score_many for the NumPy model, with the same missing-value rules
+        if isinstance(features, list):
+            features = {field['name']: [record.get(field['name']) for record in features] for field in self.fields}
+        names = features.columns if hasattr(features, 'columns') else features.keys()
+        n_rows = len(features) if hasattr(features, 'columns') else len(next(iter(features.values())))
+        
+        columns = {}
+        for field in self.fields:
+            name = field['name']
+            if name not in names:
+                columns[name] = np.zeros(n_rows)
+            elif field['type'] == 'categorical':
+                # None / NaN become the '0' of a missing key ('None' is a real category)
+                values = np.asarray(features[name], dtype=object)
+                columns[name] = ['0' if value is None or value != value else value for value in values]
+            else:
+                columns[name] = np.nan_to_num(to_float_array(features[name]), nan=0.0)
+        
+        return self.model.predict_proba(columns, n_rows)
+        
     def format_prediction_response(self, probability):
         risk_percentage = probability * 100
         
@@ -0,0 +1,348 @@
+import argparse
+import ast
+import json
+import os
+import tempfile
+from itertools import product
+
+import numpy as np
+
+# Plain-NumPy copy of the CatBoost asthma model. The exporter needs catboost
+# (and the training CSV, for CatBoost's category hashes); the evaluator only
+# needs numpy:
+#   python tree_model.py export     -> asthma_model.npz
+#   python tree_model.py verify     -> compare against asthma_prediction.pkl
+#
+# Categorical values are mapped to small integer codes (0 = unseen) and every
+# CTR split is precomputed into a lookup table over those codes, so scoring
+# never hashes strings or touches CatBoost's counter tables.
+
+MODEL_DIR = os.path.dirname(os.path.abspath(__file__))
+DEFAULT_MODEL_PATH = os.path.join(MODEL_DIR, 'asthma_model.npz')
+DEFAULT_PICKLE_PATH = os.path.join(MODEL_DIR, 'asthma_prediction.pkl')
+DEFAULT_DATASET_PATH = os.path.join(MODEL_DIR, 'synthetic_asthma_dataset.csv')
+
+FORMAT_VERSION = 1
+
+SPLIT_FLOAT = 0
+SPLIT_TABLE = 1
+
+HASH_MASK = 0xFFFFFFFFFFFFFFFF
+HASH_MULT = 0x4906BA494954CB65
+
+
+def calc_hash(a, b):
+    # CatBoost's hash for combining categorical values into a CTR key
+    return (HASH_MULT * ((a + HASH_MULT * b) & HASH_MASK)) & HASH_MASK
+
+
+class ObliviousTreeModel:
+    def __init__(self, arrays):
+        self.feature_names = [str(name) for name in arrays['feature_names']]
+        self.float_features = [str(name) for name in arrays['float_features']]
+        self.cat_features = [str(name) for name in arrays['cat_features']]
+
+        # category string -> code, per categorical feature
+        vocab = arrays['cat_vocab']
+        offsets = arrays['cat_vocab_offsets']
+        self.cat_codes = [
+            {str(value): code + 1 for code, value in enumerate(vocab[offsets[i]:offsets[i + 1]])}
+            for i in range(len(self.cat_features))
+        ]
+
+        self.projections = arrays['projections']
+        self.projection_strides = arrays['projection_strides']
+
+        self.split_kind = arrays['split_kind']
+        self.split_float_feature = arrays['split_float_feature']
+        self.split_border = arrays['split_border']
+        self.split_projection = arrays['split_projection']
+        self.split_table_offset = arrays['split_table_offset']
+        self.cat_tables = arrays['cat_tables']
+
+        self.float_splits = np.flatnonzero(self.split_kind == SPLIT_FLOAT)
+        self.table_splits = np.flatnonzero(self.split_kind == SPLIT_TABLE)
+
+        self.tree_splits = arrays['tree_splits']
+        self.tree_depth = arrays['tree_depth']
+        self.leaf_offsets = np.concatenate([[0], np.cumsum(1 << self.tree_depth)[:-1]]).astype(np.int64)
+        # leaf index of every tree as one matmul: split bit k of tree t adds 2**k to column t
+        self.leaf_weights = np.zeros((len(self.tree_splits), len(self.tree_depth)), dtype=np.float32)
+        start = 0
+        for tree, depth in enumerate(self.tree_depth):
+            self.leaf_weights[start:start + depth, tree] = 1 << np.arange(depth)
+            start += depth
+        self.leaf_values = arrays['leaf_values']
+        self.scale, self.bias = (float(v) for v in arrays['scale_bias'])
+
+    @classmethod
+    def load(cls, path=DEFAULT_MODEL_PATH):
+        with np.load(path, allow_pickle=False) as data:
+            arrays = {name: data[name] for name in data.files}
+        if int(arrays['format_version']) != FORMAT_VERSION:
+            raise ValueError(f"Unsupported tree model format {int(arrays['format_version'])} in {path}")
+        return cls(arrays)
+
+    def encode(self, columns, n_rows):
+        # CatBoost compares float32 values against float32 borders
+        floats = np.zeros((n_rows, len(self.float_features)), dtype=np.float32)
+        for i, name in enumerate(self.float_features):
+            floats[:, i] = np.asarray(columns[name], dtype=np.float64)
+
+        codes = np.zeros((n_rows, len(self.cat_features)), dtype=np.int64)
+        for i, name in enumerate(self.cat_features):
+            lookup = self.cat_codes[i]
+            # str() only for values that miss, e.g. the 0 make_prediction uses for a missing answer
+            codes[:, i] = [lookup.get(value) or lookup.get(str(value), 0) for value in np.asarray(columns[name], dtype=object)]
+        return floats, codes
+
+    def raw_scores(self, floats, codes):
+        n_rows = len(floats)
+        bits = np.zeros((n_rows, len(self.split_kind)), dtype=np.float32)
+
+        float_splits = self.float_splits
+        bits[:, float_splits] = floats[:, self.split_float_feature[float_splits]] > self.split_border[float_splits]
+
+        if len(self.table_splits):
+            # a projection code is the mixed-radix number of its features' category codes
+            projection_codes = (codes[:, self.projections] * self.projection_strides).sum(axis=2)
+            table_splits = self.table_splits
+            index = self.split_table_offset[table_splits] + projection_codes[:, self.split_projection[table_splits]]
+            bits[:, table_splits] = self.cat_tables[index]
+
+        leaf_index = (bits[:, self.tree_splits] @ self.leaf_weights).astype(np.int64)
+        raw = self.leaf_values[self.leaf_offsets + leaf_index].sum(axis=1)
+        return raw * self.scale + self.bias
+
+    def predict_proba(self, columns, n_rows=None):
+        # columns: DataFrame or {feature name: sequence of values}
+        if n_rows is None:
+            n_rows = len(columns[self.feature_names[0]])
+        floats, codes = self.encode(columns, n_rows)
+        return 1.0 / (1.0 + np.exp(-self.raw_scores(floats, codes)))
+
+    def predict_proba_records(self, records):
+        columns = {name: [record.get(name, 0) for record in records] for name in self.feature_names}
+        return self.predict_proba(columns, len(records))
+
+
+def read_training_frame(dataset_path):
+    import pandas as pd
+
+    # same preparation as AsthmaPred.ipynb
+    df = pd.read_csv(dataset_path)
+    df = df.drop(columns=['Asthma_Control_Level', 'Patient_ID'], errors='ignore')
+    df['Allergies'] = df['Allergies'].fillna('None')
+    df['Comorbidities'] = df['Comorbidities'].fillna('None')
+    target = df.pop('Has_Asthma')
+    return df, target
+
+
+def category_hashes(model, pool):
+    # catboost does not expose its string hashes; its Python export writes
+    # them out as a literal dict
+    handle, path = tempfile.mkstemp(suffix='.py')
+    os.close(handle)
+    try:
+        model.save_model(path, format='python', pool=pool)
+        with open(path, 'r', encoding='utf-8') as f:
+            tree = ast.parse(f.read())
+    finally:
+        os.remove(path)
+
+    for node in tree.body:
+        if isinstance(node, ast.Assign) and getattr(node.targets[0], 'id', None) == 'cat_features_hashes':
+            return ast.literal_eval(node.value)
+    raise ValueError('cat_features_hashes not found in the CatBoost Python export')
+
+
+def ctr_value(ctr, table, bucket):
+    # float32 like CatBoost's own CTR calculation
+    prior_num = np.float32(ctr['prior_numerator'])
+    prior_denom = np.float32(ctr['prior_denomerator'])
+    shift = np.float32(ctr['shift'])
+    scale = np.float32(ctr['scale'])
+
+    if bucket is None:
+        good, total = np.float32(0), np.float32(0)
+    else:
+        ctr_type = ctr['ctr_type']
+        target = ctr.get('target_border_idx', 0)
+        if ctr_type in ('Counter', 'FeatureFreq'):
+            good, total = bucket[0], table['counter_denominator']
+        elif ctr_type in ('BinarizedTargetMeanValue', 'FloatTargetMeanValue'):
+            good, total = bucket[0], bucket[1]
+        elif ctr_type == 'Buckets':
+            good, total = bucket[target], sum(bucket)
+        else:
+            good, total = sum(bucket[target + 1:]), sum(bucket)
+        good, total = np.float32(good), np.float32(total)
+
+    return ((good + prior_num) / (total + prior_denom) + shift) * scale
+
+
+def export_catboost(model, X, y, out_path=DEFAULT_MODEL_PATH):
+    from catboost import Pool
+
+    cat_indices = model.get_cat_feature_indices()
+    pool = Pool(X[model.feature_names_], y, cat_features=cat_indices)
+    hashes = category_hashes(model, pool)
+
+    handle, json_path = tempfile.mkstemp(suffix='.json')
+    os.close(handle)
+    try:
+        model.save_model(json_path, format='json')
+        with open(json_path, 'r', encoding='utf-8') as f:
+            spec = json.load(f)
+    finally:
+        os.remove(json_path)
+
+    info = spec['features_info']
+    float_info = info.get('float_features', [])
+    cat_info = info.get('categorical_features', [])
+    float_features = [f['feature_id'] for f in float_info]
+    cat_features = [f['feature_id'] for f in cat_info]
+
+    vocab = [sorted(str(v) for v in X[name].dropna().unique()) for name in cat_features]
+    cat_hashes = [[hashes[value] for value in values] for values in vocab]
+
+    projections = []
+    splits = []  # (kind, float feature, border, projection, table)
+
+    # split candidates in CatBoost's order: float borders, one-hot values, CTR borders
+    for i, feature in enumerate(float_info):
+        for border in feature.get('borders') or []:
+            splits.append((SPLIT_FLOAT, i, border, -1, None))
+
+    for i, feature in enumerate(cat_info):
+        for value in feature.get('values') or []:
+            table = np.array([0] + [int(h == value) for h in cat_hashes[i]], dtype=np.uint8)
+            projections.append([i])
+            splits.append((SPLIT_TABLE, -1, 0.0, len(projections) - 1, table))
+
+    for ctr in info.get('ctrs', []):
+        elements = ctr['elements']
+        if any(e['combination_element'] != 'cat_feature_value' for e in elements):
+            raise ValueError(f"CTR {ctr['identifier']} combines binarized features; only categorical projections are supported")
+        projection = [e['cat_feature_index'] for e in elements]
+        table = spec['ctr_data'][ctr['identifier']]
+        hash_map = table['hash_map']
+        stride = table['hash_stride']
+        buckets = {int(hash_map[i]): [float(v) for v in hash_map[i + 1:i + stride]] for i in range(0, len(hash_map), stride)}
+
+        # one CTR value per combination of codes; any unseen category (code 0)
+        # misses CatBoost's table as well and falls back to the prior
+        values = []
+        for combination in product(*[range(len(vocab[i]) + 1) for i in reversed(projection)]):
+            combination = combination[::-1]
+            if 0 in combination:
+                values.append(ctr_value(ctr, table, None))
+                continue
+            key = 0
+            for feature, code in zip(projection, combination):
+                key = calc_hash(key, cat_hashes[feature][code - 1])
+            values.append(ctr_value(ctr, table, buckets.get(key)))
+        values = np.array(values, dtype=np.float32)
+
+        projections.append(projection)
+        for border in ctr['borders']:
+            splits.append((SPLIT_TABLE, -1, border, len(projections) - 1, (values > np.float32(border)).astype(np.uint8)))
+
+    trees = spec['oblivious_trees']
+    tree_splits = [split['split_index'] for tree in trees for split in tree['splits']]
+    tree_depth = [len(tree['splits']) for tree in trees]
+    leaf_values = np.concatenate([np.asarray(tree['leaf_values'], dtype=np.float64) for tree in trees])
+    scale, bias = spec.get('scale_and_bias', [1, [0]])
+    bias = bias[0] if isinstance(bias, list) else bias
+
+    width = max((len(p) for p in projections), default=1)
+    projection_array = np.zeros((len(projections), width), dtype=np.int64)
+    stride_array = np.zeros((len(projections), width), dtype=np.int64)
+    for row, projection in enumerate(projections):
+        stride = 1
+        for col, feature in enumerate(projection):
+            projection_array[row, col] = feature
+            stride_array[row, col] = stride
+            stride *= len(vocab[feature]) + 1
+
+    tables = [s[4] for s in splits if s[4] is not None]
+    table_offsets = np.cumsum([0] + [len(t) for t in tables])[:-1]
+    split_table_offset = np.zeros(len(splits), dtype=np.int64)
+    table_splits = [i for i, s in enumerate(splits) if s[4] is not None]
+    split_table_offset[table_splits] = table_offsets
+
+    arrays = {
+        'format_version': np.array(FORMAT_VERSION),
+        'feature_names': np.array(model.feature_names_),
+        'float_features': np.array(float_features),
+        'cat_features': np.array(cat_features),
+        'cat_vocab': np.array([value for values in vocab for value in values]),
+        'cat_vocab_offsets': np.cumsum([0] + [len(values) for values in vocab]).astype(np.int64),
+        'projections': projection_array,
+        'projection_strides': stride_array,
+        'split_kind': np.array([s[0] for s in splits], dtype=np.uint8),
+        'split_float_feature': np.array([max(s[1], 0) for s in splits], dtype=np.int64),
+        'split_border': np.array([s[2] for s in splits], dtype=np.float32),
+        'split_projection': np.array([max(s[3], 0) for s in splits], dtype=np.int64),
+        'split_table_offset': split_table_offset,
+        'cat_tables': np.concatenate(tables) if tables else np.zeros(0, dtype=np.uint8),
+        'tree_splits': np.array(tree_splits, dtype=np.int64),
+        'tree_depth': np.array(tree_depth, dtype=np.int64),
+        'leaf_values': leaf_values,
+        'scale_bias': np.array([scale, bias], dtype=np.float64)
+    }
+    np.savez_compressed(out_path, **arrays)
+    return arrays
+
+
+def load_catboost(pickle_path=DEFAULT_PICKLE_PATH):
+    import pickle
+    with open(pickle_path, 'rb') as f:
+        return pickle.load(f)
+
+
+def verify(model_path=DEFAULT_MODEL_PATH, pickle_path=DEFAULT_PICKLE_PATH, dataset_path=DEFAULT_DATASET_PATH):
+    X, _ = read_training_frame(dataset_path)
+    catboost_model = load_catboost(pickle_path)
+    tree_model = ObliviousTreeModel.load(model_path)
+
+    X = X[catboost_model.feature_names_]
+    expected = catboost_model.predict_proba(X)[:, 1]
+    batch = tree_model.predict_proba(X)
+    single = np.array([tree_model.predict_proba_records([row])[0] for row in X.head(200).to_dict('records')])
+    return {
+        'rows': len(X),
+        'max_abs_diff': float(np.abs(batch - expected).max()),
+        'single_row_max_abs_diff': float(np.abs(single - expected[:len(single)]).max())
+    }
+
+
+def main():
+    parser = argparse.ArgumentParser(description='Export the CatBoost asthma model to plain NumPy arrays')
+    subparsers = parser.add_subparsers(dest='command', required=True)
+
+    export_parser = subparsers.add_parser('export', help='Write the NumPy model next to the pickle')
+    export_parser.add_argument('--model', default=DEFAULT_PICKLE_PATH)
+    export_parser.add_argument('--dataset', default=DEFAULT_DATASET_PATH, help='Training CSV (for the category hashes)')
+    export_parser.add_argument('--out', default=DEFAULT_MODEL_PATH)
+
+    verify_parser = subparsers.add_parser('verify', help='Compare the NumPy model with the CatBoost one')
+    verify_parser.add_argument('--model', default=DEFAULT_PICKLE_PATH)
+    verify_parser.add_argument('--dataset', default=DEFAULT_DATASET_PATH)
+    verify_parser.add_argument('--tree-model', default=DEFAULT_MODEL_PATH)
+
+    args = parser.parse_args()
+
+    if args.command == 'export':
+        X, y = read_training_frame(args.dataset)
+        arrays = export_catboost(load_catboost(args.model), X, y, args.out)
+        print(f"Tree model written to {args.out} ({len(arrays['tree_depth'])} trees, "
+              f"{len(arrays['split_kind'])} splits, {os.path.getsize(args.out)} bytes)")
+    elif args.command == 'verify':
+        report = verify(args.tree_model, args.model, args.dataset)
+        print(f"{report['rows']} rows: max |p - catboost| = {report['max_abs_diff']:.3g} "
+              f"(single rows: {report['single_row_max_abs_diff']:.3g})")
+
+
+if __name__ == '__main__':
+    main()
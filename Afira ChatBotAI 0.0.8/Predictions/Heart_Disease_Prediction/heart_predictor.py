@@ -6,24 +6,29 @@ class HeartDiseasePredictor:
     def __init__(self, model_dir=None):
         self.theta = None
         self.scaler = None
+        self.weights = None
+        self.bias = None
         self.model_dir = model_dir if model_dir else os.getcwd()
         self.fields = [
             {'name': 'male', 'question': 'Are you male? (yes/no)', 'type': 'binary'},
-            {'name': 'age', 'question': 'What is your age?', 'type': 'numeric'},
-            {'name': 'education', 'question': 'Education level (1-4, where 1=some high school, 4=college)', 'type': 'numeric'},
+            {'name': 'age', 'question': 'What is your age?', 'type': 'numeric', 'min': 1, 'max': 120},
+            {'name': 'education', 'question': 'Education level (1-4, where 1=some high school, 4=college)', 'type': 'numeric', 'min': 1, 'max': 4, 'integer': True},
             {'name': 'currentSmoker', 'question': 'Are you currently a smoker? (yes/no)', 'type': 'binary'},
-            {'name': 'cigsPerDay', 'question': 'How many cigarettes per day?', 'type': 'numeric'},
+            {'name': 'cigsPerDay', 'question': 'How many cigarettes per day?', 'type': 'numeric', 'min': 0, 'max': 100},
             {'name': 'BPMeds', 'question': 'Are you on blood pressure medication? (yes/no)', 'type': 'binary'},
             {'name': 'prevalentStroke', 'question': 'Have you had a stroke? (yes/no)', 'type': 'binary'},
             {'name': 'prevalentHyp', 'question': 'Do you have hypertension? (yes/no)', 'type': 'binary'},
             {'name': 'diabetes', 'question': 'Do you have diabetes? (yes/no)', 'type': 'binary'},
-            {'name': 'totChol', 'question': 'What is your total cholesterol level (mg/dL)?', 'type': 'numeric'},
-            {'name': 'sysBP', 'question': 'What is your systolic blood pressure?', 'type': 'numeric'},
-            {'name': 'diaBP', 'question': 'What is your diastolic blood pressure?', 'type': 'numeric'},
-            {'name': 'BMI', 'question': 'What is your BMI (Body Mass Index)?', 'type': 'numeric'},
-            {'name': 'heartRate', 'question': 'What is your heart rate (bpm)?', 'type': 'numeric'},
-            {'name': 'glucose', 'question': 'What is your glucose level (mg/dL)?', 'type': 'numeric'}
+            {'name': 'totChol', 'question': 'What is your total cholesterol level (mg/dL)?', 'type': 'numeric', 'min': 50, 'max': 1000},
+            {'name': 'sysBP', 'question': 'What is your systolic blood pressure?', 'type': 'numeric', 'min': 50, 'max': 300},
+            {'name': 'diaBP', 'question': 'What is your diastolic blood pressure?', 'type': 'numeric', 'min': 30, 'max': 200},
+            {'name': 'BMI', 'question': 'What is your BMI (Body Mass Index)?', 'type': 'numeric', 'min': 10, 'max': 80},
+            {'name': 'heartRate', 'question': 'What is your heart rate (bpm)?', 'type': 'numeric', 'min': 20, 'max': 250},
+            {'name': 'glucose', 'question': 'What is your glucose level (mg/dL)?', 'type': 'numeric', 'min': 20, 'max': 700}
         ]
+        self.feature_names = [field['name'] for field in self.fields]
+        # columns the scaler was fitted on: age, cigsPerDay, totChol, sysBP, diaBP, BMI, heartRate, glucose
+        self.numerical_indices = [1, 4, 9, 10, 11, 12, 13, 14]
         self.load_models()
         
     def load_models(self):
@@ -47,6 +52,8 @@ class HeartDiseasePredictor:
             with open(scaler_path, 'rb') as f:
                 self.scaler = pickle.load(f)
             
+            self.fold_scaler()
+            
             print(f"Heart disease prediction models loaded successfully!")
             print(f"Theta shape: {self.theta.shape}")
             print(f"Scaler type: {type(self.scaler).__name__}")
@@ -89,40 +96,47 @@ class HeartDiseasePredictor:
         
         return None
     
+    def fold_scaler(self):
+        # theta . [1, (x - mean) / scale] == bias + weights . x, so the scaler
+        # is applied once here instead of on every request
+        theta = np.asarray(self.theta, dtype=np.float64).ravel()
+        weights = theta[1:].copy()
+        
+        columns = self.numerical_indices
+        mean = getattr(self.scaler, 'mean_', None)
+        scale = getattr(self.scaler, 'scale_', None)
+        mean = np.zeros(len(columns)) if mean is None else np.asarray(mean, dtype=np.float64)
+        scale = np.ones(len(columns)) if scale is None else np.asarray(scale, dtype=np.float64)
+        
+        weights[columns] = theta[1:][columns] / scale
+        self.weights = weights
+        self.bias = theta[0] - np.dot(weights[columns], mean)
+    
+    def score_many(self, features):
+        # features: an (N, 15) array in self.fields order, or a DataFrame-like
+        # with those column names; returns N probabilities
+        if self.weights is None:
+            raise RuntimeError("Heart disease prediction model not loaded")
+        
+        if hasattr(features, 'columns'):
+            features = features[self.feature_names]
+        X = np.asarray(features, dtype=np.float64)
+        if X.ndim == 1:
+            X = X.reshape(1, -1)
+        if X.ndim != 2 or X.shape[1] != len(self.feature_names):
+            raise ValueError(f"Expected an (N, {len(self.feature_names)}) feature matrix, got shape {X.shape}")
+        
+        return self.sigmoid(X @ self.weights + self.bias)
+    
+    def records_to_matrix(self, records):
+        return np.array([[record[name] for name in self.feature_names] for record in records], dtype=np.float64)
+    
     def make_prediction(self, user_data):
-        if self.theta is None or self.scaler is None:
+        if self.weights is None:
             return None, "Heart disease prediction model not loaded"
         
         try:
-            features = [
-                user_data['male'],
-                user_data['age'],
-                user_data['education'],
-                user_data['currentSmoker'],
-                user_data['cigsPerDay'],
-                user_data['BPMeds'],
-                user_data['prevalentStroke'],
-                user_data['prevalentHyp'],
-                user_data['diabetes'],
-                user_data['totChol'],
-                user_data['sysBP'],
-                user_data['diaBP'],
-                user_data['BMI'],
-                user_data['heartRate'],
-                user_data['glucose']
-            ]
-            
-            numerical_indices = [1, 4, 9, 10, 11, 12, 13, 14]
-            features_array = np.array(features).reshape(1, -1)
-            
-            features_to_scale = features_array[:, numerical_indices]
-            features_scaled = self.scaler.transform(features_to_scale)
-            features_array[:, numerical_indices] = features_scaled
-            
-            features_with_bias = np.hstack([np.ones((1, 1)), features_array])
-            
-            probability = self.sigmoid(features_with_bias.dot(self.theta))[0][0]
-            
+            probability = self.score_many(self.records_to_matrix([user_data]))[0]
             return probability, None
             
         except Exception as e:
@@ -0,0 +1,181 @@
+import argparse
+import contextlib
+import importlib
+import io
+import os
+import sys
+import time
+from collections import deque
+from concurrent.futures import ProcessPoolExecutor
+
+import numpy as np
+import pandas as pd
+
+# Score a CSV with the heart or asthma model outside the chat dialog, e.g.
+#   python Predictions/bulk_score.py heart Predictions/Heart_Disease_Prediction/framingham.csv heart_scores.csv
+# The file is read in chunks and scored by a process pool; at most
+# --max-inflight chunks are held in memory at any time and results are
+# appended to the output in input order.
+
+PREDICTIONS_DIR = os.path.dirname(os.path.abspath(__file__))
+
+MODELS = {
+    'heart': ('Heart_Disease_Prediction', 'heart_predictor', 'HeartDiseasePredictor'),
+    'asthma': ('Asthma_Prediction', 'asthma_predictor', 'AsthmaPredictor')
+}
+
+# "None" is a real Allergies / Comorbidities category, so it must not be read as missing
+NA_VALUES = ['', 'NA', 'N/A', 'NaN', 'nan', 'null', 'NULL', '#N/A']
+
+_model_name = None
+_predictor = None
+
+
+def load_predictor(model_name, quiet=True):
+    folder, module_name, class_name = MODELS[model_name]
+    model_dir = os.path.join(PREDICTIONS_DIR, folder)
+    if model_dir not in sys.path:
+        sys.path.append(model_dir)
+
+    # the predictors report every path they look at; one line per worker is plenty
+    output = io.StringIO()
+    with contextlib.redirect_stdout(output if quiet else sys.stdout):
+        predictor = getattr(importlib.import_module(module_name), class_name)(model_dir)
+    if not predictor.is_model_loaded():
+        raise RuntimeError(f"{class_name} could not load its model from {model_dir}:\n{output.getvalue()}")
+    return predictor
+
+
+def init_worker(model_name):
+    global _model_name, _predictor
+    _model_name = model_name
+    _predictor = load_predictor(model_name)
+
+
+def score_heart(predictor, chunk):
+    features = chunk.reindex(columns=predictor.feature_names).apply(pd.to_numeric, errors='coerce')
+    X = features.to_numpy(dtype=np.float64)
+
+    # the serving path cannot score a heart record with a field missing,
+    # so those rows get an error instead of a probability
+    missing = np.isnan(X)
+    incomplete = missing.any(axis=1)
+    probabilities = predictor.score_many(np.where(missing, 0.0, X))
+    probabilities[incomplete] = np.nan
+
+    errors = np.full(len(X), '', dtype=object)
+    names = np.array(predictor.feature_names)
+    for i in np.flatnonzero(incomplete):
+        errors[i] = 'missing: ' + ' '.join(names[missing[i]])
+    return probabilities, errors
+
+
+def score_asthma(predictor, chunk):
+    # missing values score as 0, like a missing key in make_prediction
+    probabilities = predictor.score_many(chunk)
+    return probabilities, np.full(len(chunk), '', dtype=object)
+
+
+SCORERS = {
+    'heart': score_heart,
+    'asthma': score_asthma
+}
+
+
+def score_chunk(chunk, keep_columns):
+    probabilities, errors = SCORERS[_model_name](_predictor, chunk)
+
+    result = pd.DataFrame({'row': chunk.index})
+    for column in keep_columns:
+        result[column] = chunk[column].to_numpy()
+    result['probability'] = probabilities
+    result['error'] = errors
+    return result
+
+
+def score_file(model_name, input_path, output_path, chunksize=50000, workers=None, max_inflight=None, keep_columns=()):
+    if workers is None:
+        workers = os.cpu_count() or 1
+    max_inflight = max_inflight or max(2, 2 * workers)
+
+    predictor = load_predictor(model_name, quiet=False)
+    wanted = {field['name'] for field in predictor.fields} | set(keep_columns)
+
+    reader = pd.read_csv(
+        input_path,
+        chunksize=chunksize,
+        usecols=lambda column: column in wanted,
+        keep_default_na=False,
+        na_values=NA_VALUES
+    )
+
+    if workers > 0:
+        pool = ProcessPoolExecutor(max_workers=workers, initializer=init_worker, initargs=(model_name,))
+    else:
+        pool = None
+        init_worker(model_name)
+
+    rows = 0
+    scored = 0
+    started = time.perf_counter()
+
+    def write(result, header):
+        nonlocal rows, scored
+        result.to_csv(out, header=header, index=False)
+        out.flush()
+        rows += len(result)
+        scored += int(result['probability'].notna().sum())
+        elapsed = time.perf_counter() - started
+        print(f"{rows} rows ({rows / elapsed:,.0f} rows/s)", file=sys.stderr)
+
+    try:
+        with open(output_path, 'w', newline='', encoding='utf-8') as out:
+            pending = deque()
+            header = True
+            for chunk in reader:
+                if pool is None:
+                    write(score_chunk(chunk, keep_columns), header)
+                    header = False
+                    continue
+
+                pending.append(pool.submit(score_chunk, chunk, keep_columns))
+                # back-pressure: never read further ahead than max_inflight chunks
+                while len(pending) >= max_inflight:
+                    write(pending.popleft().result(), header)
+                    header = False
+
+            while pending:
+                write(pending.popleft().result(), header)
+                header = False
+    finally:
+        if pool is not None:
+            pool.shutdown(cancel_futures=True)
+
+    elapsed = time.perf_counter() - started
+    return {
+        'rows': rows,
+        'scored': scored,
+        'errors': rows - scored,
+        'seconds': elapsed,
+        'rows_per_second': rows / elapsed if elapsed else 0.0
+    }
+
+
+def main():
+    parser = argparse.ArgumentParser(description='Score a CSV with the Afira heart or asthma model')
+    parser.add_argument('model', choices=sorted(MODELS))
+    parser.add_argument('input', help='CSV with the model fields as columns')
+    parser.add_argument('output', help='CSV to write: row, kept columns, probability, error')
+    parser.add_argument('--chunksize', type=int, default=50000, help='Rows per chunk')
+    parser.add_argument('--workers', type=int, default=None, help='Scoring processes (0 scores in this process)')
+    parser.add_argument('--max-inflight', type=int, default=None, help='Chunks read ahead of the writer (default 2 x workers)')
+    parser.add_argument('--keep', action='append', default=[], help='Input column to copy to the output, e.g. Patient_ID')
+    args = parser.parse_args()
+
+    summary = score_file(args.model, args.input, args.output, args.chunksize, args.workers, args.max_inflight, args.keep)
+    print(f"Scored {summary['scored']} of {summary['rows']} rows in {summary['seconds']:.2f}s "
+          f"({summary['rows_per_second']:,.0f} rows/s), {summary['errors']} with errors")
+
+
+if __name__ == '__main__':
+    main()
@@ -1,123 +1,260 @@
-from flask import Flask, request, jsonify
+from flask import Flask, Blueprint, Response, g, request, jsonify
 from flask_cors import CORS
+try:
+    from flask_sock import Sock
+except ImportError:
+    # the WebSocket channel is optional; without flask-sock only the HTTP API is served
+    Sock = None
 import pickle
-import numpy as np
 import json
-import random
+import hmac
+import hashlib
+import secrets
 from datetime import datetime
-from collections import Counter
 import uuid
+import time
 import sys
 import os
 
-api_folder = r"D:\\AfiraChatBotAI\\API_OpenWeather"
+BASE_DIR = os.path.dirname(os.path.abspath(__file__))
+
+api_folder = os.path.join(BASE_DIR, 'API_OpenWeather')
 sys.path.append(api_folder)
-from extractcity import extract_city
-from getweather import get_weather
+from extractcity import extract_city, city_display_name
+from getweather import fetch_weather, get_client as get_weather_client, get_cache as get_weather_cache
+from weatherclient import WEATHER_UNAVAILABLE
 
-heart_dis_pred_folder = r"D:\\AfiraChatBotAI\\Afira ChatBotAI 0.0.8\\Predictions\\Heart_Disease_Prediction"
+heart_dis_pred_folder = os.path.join(BASE_DIR, 'Predictions', 'Heart_Disease_Prediction')
 sys.path.append(heart_dis_pred_folder)
-from heart_predictor import HeartDiseasePredictor
 
-asthma_dis_pred_folder = r"D:\AfiraChatBotAI\\Afira ChatBotAI 0.0.8\\Predictions\\Asthma_Prediction"
+asthma_dis_pred_folder = os.path.join(BASE_DIR, 'Predictions', 'Asthma_Prediction')
 sys.path.append(asthma_dis_pred_folder)
-from asthma_predictor import AsthmaPredictor
 
-app = Flask(__name__)
-CORS(app)
+from intent_engine import IntentEngine, tokenize
+from intent_registry import IntentRegistry
+from classification_cache import ClassificationCache
+from model_bundle import load_bundle, DEFAULT_BUNDLE_DIR, VARIANTS
+from lazy_predictor import LazyPredictor
+from record_validation import validate_record
+from session_store import SessionStore, SharedSessionStore
+from metrics import Metrics
+from conversation_log import ConversationLog
+from model_state import ModelState, ModelManager, smoke_test, load_smoke_cases
+
+bp = Blueprint('afira', __name__)
+
+# the health predictors (and catboost/pandas behind the asthma model) load on
+# the first heart/asthma conversation or in the background once the server is up
+heart_pred = LazyPredictor('Heart disease predictor', 'heart_predictor', 'HeartDiseasePredictor', heart_dis_pred_folder,
+                           on_load=lambda predictor: instrument_predictor(predictor, 'heart'))
+asthma_pred = LazyPredictor('Asthma predictor', 'asthma_predictor', 'AsthmaPredictor', asthma_dis_pred_folder,
+                            on_load=lambda predictor: instrument_predictor(predictor, 'asthma'))
+
+ASSESSMENT_PREDICTORS = {
+    'heart': heart_pred,
+    'asthma': asthma_pred
+}
+
+MAX_BATCH_SIZE = 1000
+MAX_USER_ID_LENGTH = 128
+SESSION_TTL_SECONDS = 1800
+MAX_SESSIONS = 10000
+CLASSIFICATION_CACHE_SIZE = 4096
+MODEL_BUNDLE_DIR = os.path.join(BASE_DIR, DEFAULT_BUNDLE_DIR)
+# names the bundle version every worker should serve; written by /admin/reload
+MODEL_POINTER_PATH = os.environ.get('AFIRA_MODEL_POINTER', os.path.join(BASE_DIR, 'intent_model.current.json'))
+SMOKE_TESTS_PATH = os.path.join(BASE_DIR, 'smoke_tests.json')
+MIN_SMOKE_ACCURACY = 0.9
+# precision the intent weights are served in: float64 (as trained), float32
+# or int8; 'python intent_training.py --parity' shows what each one changes
+INTENT_MODEL_VARIANT = os.environ.get('AFIRA_INTENT_MODEL_VARIANT', 'float64')
+if INTENT_MODEL_VARIANT not in VARIANTS:
+    print(f"Warning: unknown AFIRA_INTENT_MODEL_VARIANT '{INTENT_MODEL_VARIANT}', serving float64")
+    INTENT_MODEL_VARIANT = 'float64'
+# admin endpoints are off unless a token is configured
+ADMIN_TOKEN = os.environ.get('AFIRA_ADMIN_TOKEN')
+PRELOAD_PREDICTORS = True
+# shared by all gunicorn workers (gunicorn.conf.py sets it); unset means this process only
+METRICS_DIR = os.environ.get('AFIRA_METRICS_DIR')
+# classified messages for retraining; an empty directory turns the log off
+CONVERSATION_LOG_DIR = os.environ.get('AFIRA_CONVERSATION_LOG_DIR', os.path.join(BASE_DIR, 'conversation_logs'))
+CONVERSATION_LOG_SAMPLE_RATE = float(os.environ.get('AFIRA_CONVERSATION_LOG_SAMPLE_RATE', 1.0))
+# dialog state shared by all gunicorn workers (gunicorn.conf.py sets it);
+# unset keeps it in this process's memory
+SESSION_DB = os.environ.get('AFIRA_SESSION_DB')
+# signs the user ids this server hands out (gunicorn.conf.py shares one
+# across workers); unset means a new one per process
+SESSION_SECRET = (os.environ.get('AFIRA_SESSION_SECRET') or secrets.token_hex(32)).encode('utf-8')
+
+if SESSION_DB:
+    user_sessions = SharedSessionStore(SESSION_DB, ttl=SESSION_TTL_SECONDS, max_sessions=MAX_SESSIONS)
+else:
+    user_sessions = SessionStore(ttl=SESSION_TTL_SECONDS, max_sessions=MAX_SESSIONS)
+conversation_log = ConversationLog(CONVERSATION_LOG_DIR, sample_rate=CONVERSATION_LOG_SAMPLE_RATE)
+
+### metrics ###
+metrics = Metrics(METRICS_DIR)
+metrics.histogram('afira_request_seconds', 'Request latency per endpoint')
+metrics.counter('afira_requests_total', 'Requests per endpoint and HTTP status')
+metrics.histogram('afira_stage_seconds', 'Time spent in each stage of handling a message')
+metrics.counter('afira_intent_total', 'Classified messages per intent')
+metrics.counter('afira_intent_confidence_total', 'Classified messages per confidence bucket')
+metrics.counter('afira_session_context_total', 'Messages per dialog context they arrived in')
+metrics.counter('afira_errors_total', 'Errors per type')
+metrics.counter('afira_conversation_log_total', 'Conversation log records per outcome')
+metrics.counter('afira_model_reloads_total', 'Model reloads and rollbacks per result')
 
-model = None
-label_encoder = None
-vocab = None
-word2idx = None
-idf = None
-intents_data = None
+CONFIDENCE_BUCKETS = ('0.0-0.2', '0.2-0.4', '0.4-0.6', '0.6-0.8', '0.8-1.0')
+STAGE_LABELS = {}
 
-heart_pred = HeartDiseasePredictor(model_dir=heart_dis_pred_folder)
-asthma_pred = AsthmaPredictor(model_dir=asthma_dis_pred_folder)
 
-user_sessions = {}
+def stage_timer(stage):
+    labels = STAGE_LABELS.get(stage)
+    if labels is None:
+        labels = STAGE_LABELS[stage] = (('stage', stage),)
+    return metrics.timer('afira_stage_seconds', labels)
+
+
+def count_error(error_type):
+    metrics.inc('afira_errors_total', (('type', error_type),))
+
+
+def instrument_predictor(predictor, model_name):
+    # the predictors call make_prediction from inside their own dialog code,
+    # so the timing wraps the instance method itself
+    for method_name in ('make_prediction', 'score_many'):
+        method = getattr(predictor, method_name, None)
+        if method is None:
+            continue
+        stage = f'{model_name}_{method_name}'
+        
+        def timed(*args, method=method, stage=stage):
+            with stage_timer(stage):
+                return method(*args)
+        
+        setattr(predictor, method_name, timed)
 
-def tokenize(text):
-    return text.lower().split()
+def load_pickled_engine():
+    model = pickle.load(open(os.path.join(BASE_DIR, 'nlp_model_lr.pkl'), 'rb'))
+    print("Model loaded")
+    
+    label_encoder = pickle.load(open(os.path.join(BASE_DIR, 'label_encoder.pkl'), 'rb'))
+    print("Label encoder loaded")
+    
+    word2idx = pickle.load(open(os.path.join(BASE_DIR, 'word2idx.pkl'), 'rb'))
+    print(f"Word2idx loaded ({len(word2idx)} words)")
+    
+    idf = pickle.load(open(os.path.join(BASE_DIR, 'idf.pkl'), 'rb'))
+    print("IDF loaded")
+    
+    return IntentEngine.from_sklearn(model, label_encoder, word2idx, idf, INTENT_MODEL_VARIANT)
 
 
-def compute_tf(document):
-    tokens = tokenize(document)
-    tf_counter = Counter(tokens)
-    total_count = len(tokens)
-    tf_vector = np.zeros(len(vocab))
+def build_model_state(bundle_dir):
+    if os.path.exists(os.path.join(bundle_dir, 'manifest.json')):
+        print(f"Loading model bundle from {bundle_dir}...")
+        bundle = load_bundle(bundle_dir)
+        engine = IntentEngine.from_bundle(bundle, INTENT_MODEL_VARIANT)
+        version = bundle.version
+        print(f"Model bundle {bundle.version} loaded ({len(bundle.vocab)} words, {engine.variant}, memory-mapped)")
+        parity = bundle.manifest.get('metadata', {}).get('variants', {}).get(engine.variant)
+        if parity is not None and engine.variant != 'float64':
+            print(f"{engine.variant} agreed with float64 on {parity['agreement']:.2%} of held-out patterns at training time")
+    elif bundle_dir == MODEL_BUNDLE_DIR:
+        print("Model bundle not found, loading models from notebook pickles...")
+        print("Run 'python model_bundle.py export' to build the bundle")
+        engine = load_pickled_engine()
+        version = 'pickles'
+        print(f"Intent engine ready ({engine.n_classes} classes, idf folded into weights)")
+    else:
+        raise FileNotFoundError(os.path.join(bundle_dir, 'manifest.json'))
+    
+    # a bundle may ship the chatbotdata.json it was trained on
+    intents_path = os.path.join(bundle_dir, 'chatbotdata.json')
+    if not os.path.exists(intents_path):
+        intents_path = os.path.join(BASE_DIR, 'chatbotdata.json')
+    with open(intents_path, 'r', encoding='utf-8') as f:
+        intents_data = json.load(f)
+    print(f"Intents data loaded ({len(intents_data['intents'])} intents)")
+    
+    registry = IntentRegistry(intents_data, engine.class_names)
+    print(f"Intent registry built ({len(registry)} intents)")
     
-    for token, count in tf_counter.items():
-        if token in word2idx:
-            tf_vector[word2idx[token]] = count / total_count
-    return tf_vector
+    # every version gets its own cache, so no classification outlives its model
+    cache = ClassificationCache(max_entries=CLASSIFICATION_CACHE_SIZE)
+    patterns = [p for intent in intents_data['intents'] for p in intent['patterns']]
+    warmed = cache.warm(patterns, engine.classify_batch)
+    print(f"Classification cache warmed ({warmed} patterns)")
+    
+    return ModelState(engine, intents_data, registry, cache, version, bundle_dir)
+
+
+def validate_model_state(state):
+    return smoke_test(state, load_smoke_cases(SMOKE_TESTS_PATH), INTENT_HANDLERS, MIN_SMOKE_ACCURACY)
 
 
-def text_to_tfidf(text):
-    tf_vector = compute_tf(text)
-    tfidf_vector = tf_vector * idf
-    return tfidf_vector.reshape(1, -1)
+model_manager = ModelManager(build_model_state, validate_model_state, MODEL_POINTER_PATH)
 
 
 def load_models():
-    global model, label_encoder, vocab, word2idx, idf, intents_data
-    
     try:
-        print("Loading models from notebook...")
-        
-        model = pickle.load(open('nlp_model_lr.pkl', 'rb'))
-        print("Model loaded")
-        
-        label_encoder = pickle.load(open('label_encoder.pkl', 'rb'))
-        print("Label encoder loaded")
+        # a deployed version outlives restarts
+        try:
+            pointer = model_manager.read_pointer()
+        except (OSError, ValueError, KeyError) as e:
+            print(f"Warning: ignoring unreadable model pointer {MODEL_POINTER_PATH}: {e}")
+            pointer = None
         
-        vocab = pickle.load(open('vocab.pkl', 'rb'))
-        print(f"Vocabulary loaded ({len(vocab)} words)")
-        
-        word2idx = pickle.load(open('word2idx.pkl', 'rb'))
-        print("Word2idx loaded")
-        
-        idf = pickle.load(open('idf.pkl', 'rb'))
-        print("IDF loaded")
-        
-        with open('chatbotdata.json', 'r', encoding='utf-8') as f:
-            intents_data = json.load(f)
-        print(f"Intents data loaded ({len(intents_data['intents'])} intents)")
+        if pointer is not None:
+            state, error = model_manager.reload(pointer['bundle_dir'], publish=False,
+                                                expected_version=pointer['version'])
+            if state is not None:
+                print("\nAll models loaded successfully!")
+                return True
+            print(f"Falling back to {MODEL_BUNDLE_DIR}")
         
+        model_manager.activate(build_model_state(MODEL_BUNDLE_DIR))
         print("\nAll models loaded successfully!")
         return True
         
     except FileNotFoundError as e:
         print(f"File not found: {e}")
-        print("Make sure all .pkl files are in the same directory as app.py")
+        print("Make sure the model bundle or all .pkl files are in the same directory as app.py")
         return False
     except Exception as e:
         print(f"Error loading models: {e}")
         return False
 
-def handle_prediction_intent(user_message, user_id):
+def store_session(user_id, result):
+    with stage_timer('session'):
+        return store_session_data(user_id, result)
+
+
+def store_session_data(user_id, result):
+    session_data = result.get('session_data')
+    if session_data:
+        state = user_sessions.set(user_id, session_data)
+        # the response says where the dialog is; the health answers
+        # collected so far stay on the server
+        result['session_data'] = {key: value for key, value in state.to_dict().items() if key != 'user_data'}
+    else:
+        user_sessions.delete(user_id)
+    return result
+
+
+def handle_prediction_intent(user_message, user_id, state):
     if heart_pred.check_keywords(user_message):
-        result = heart_pred.start_conversation(user_id)
-        if result.get('session_data'):
-            user_sessions[user_id] = result['session_data']
-        return result
+        return store_session(user_id, heart_pred.start_conversation(user_id))
     
     if asthma_pred.check_keywords(user_message):
-        result = asthma_pred.start_conversation(user_id)
-        if result.get('session_data'):
-            user_sessions[user_id] = result['session_data']
-        return result
+        return store_session(user_id, asthma_pred.start_conversation(user_id))
     
-    user_sessions[user_id] = {
+    user_sessions.set(user_id, {
         'context': 'awaiting_prediction_type',
         'collecting_data': False
-    }
+    })
     
-    for intent in intents_data['intents']:
-        if intent['name'] == 'predictions':
-            response_text = random.choice(intent['responses'])
-            break
+    response_text = state.registry.respond('predictions')
     
     return {
         'intent': 'predictions',
@@ -126,26 +263,16 @@ def handle_prediction_intent(user_message, user_id):
     }
 
 
-def handle_ongoing_conversation(user_message, user_id):
-    
-    session = user_sessions[user_id]
+def handle_ongoing_conversation(user_message, user_id, session):
     context = session.get('context')
     
     if context == 'awaiting_prediction_type':
         if heart_pred.check_keywords(user_message):
-            del user_sessions[user_id]
-            result = heart_pred.start_conversation(user_id)
-            if result.get('session_data'):
-                user_sessions[user_id] = result['session_data']
-            return result
+            return store_session(user_id, heart_pred.start_conversation(user_id))
         elif asthma_pred.check_keywords(user_message):
-            del user_sessions[user_id]
-            result = asthma_pred.start_conversation(user_id)
-            if result.get('session_data'):
-                user_sessions[user_id] = result['session_data']
-            return result
+            return store_session(user_id, asthma_pred.start_conversation(user_id))
         else:
-            del user_sessions[user_id]
+            user_sessions.delete(user_id)
             return {
                 'intent': 'predictions',
                 'response': "I currently support heart disease and asthma risk prediction. Which one would you like to try?",
@@ -153,160 +280,709 @@ def handle_ongoing_conversation(user_message, user_id):
             }
     
     if context == 'heart_disease_prediction' and session.get('collecting_data'):
-        result = heart_pred.handle_conversation_step(user_message, session, user_id)
-        if result.get('session_data'):
-            user_sessions[user_id] = result['session_data']
-        else:
-            if user_id in user_sessions:
-                del user_sessions[user_id]
-        return result
+        return store_session(user_id, heart_pred.handle_conversation_step(user_message, session, user_id))
     
     if context == 'asthma_prediction' and session.get('collecting_data'):
-        result = asthma_pred.handle_conversation_step(user_message, session, user_id)
-        if result.get('session_data'):
-            user_sessions[user_id] = result['session_data']
+        return store_session(user_id, asthma_pred.handle_conversation_step(user_message, session, user_id))
+    
+    return None
+
+def handle_predictions(user_message, user_id, intent_name, confidence, state):
+    return handle_prediction_intent(user_message, user_id, state)
+
+
+def handle_ask_time(user_message, user_id, intent_name, confidence, state):
+    now = datetime.now().strftime("%H:%M:%S")
+    response_text = state.registry.respond('ask_time', {'time': now})
+    
+    return {
+        'intent': 'ask_time',
+        'confidence': confidence,
+        'response': response_text,
+        'user_id': user_id
+    }
+
+
+def handle_ask_weather(user_message, user_id, intent_name, confidence, state, intro_msg=None):
+    with stage_timer('extract_city'):
+        city = extract_city(user_message)
+    if intro_msg is None:
+        intro_msg = state.registry.respond('ask_weather')
+    
+    if city:
+        with stage_timer('get_weather'):
+            weather, error = fetch_weather(city)
+        if error:
+            count_error(f'weather_{error}')
+        
+        if weather:
+            response_text = (
+                f"{intro_msg}\n\n"
+                f"📍 Weather in **{weather['city']}**:\n"
+                f"🌡️ Temperature: {weather['temp']}°C (feels like {weather['feels']}°C)\n"
+                f"🌤️ Condition: {weather['desc']}\n"
+                f"💧 Humidity: {weather['humidity']}%\n"
+                f"💨 Wind: {weather['wind']} m/s"
+            )
+        elif error == WEATHER_UNAVAILABLE:
+            response_text = (
+                f"{intro_msg}\n\n"
+                "The weather service is unavailable right now. Please try again in a minute."
+            )
         else:
-            if user_id in user_sessions:
-                del user_sessions[user_id]
+            response_text = (
+                f"{intro_msg}\n\n"
+                f"Sorry, I couldn't find weather info for '{city_display_name(city)}'."
+            )
+    else:
+        response_text = (
+            f"{intro_msg}\n\n"
+            "Tell me a city! For example:\n"
+            "→ *weather in London*\n"
+            "→ *forecast for Paris*\n"
+            "→ *is it raining in Rome?*"
+        )
+    
+    return {
+        "intent": intent_name,
+        "confidence": confidence,
+        "response": response_text,
+        "user_id": user_id
+    }
+
+
+def handle_static_intent(user_message, user_id, intent_name, confidence, state):
+    response_text = state.registry.respond(intent_name, default="I'm not sure how to respond to that.")
+    
+    return {
+        'intent': intent_name,
+        'confidence': confidence,
+        'response': response_text,
+        'user_id': user_id
+    }
+
+
+def begin_ask_weather(user_message, user_id, intent_name, confidence, state):
+    # the intro is ready at once; the weather lookup can take seconds
+    intro_msg = state.registry.respond('ask_weather')
+    intro = {
+        'intent': intent_name,
+        'confidence': confidence,
+        'response': intro_msg,
+        'user_id': user_id
+    }
+    return intro, lambda: handle_ask_weather(user_message, user_id, intent_name, confidence, state, intro_msg)
+
+
+INTENT_HANDLERS = {
+    'predictions': handle_predictions,
+    'ask_time': handle_ask_time,
+    'ask_weather': handle_ask_weather
+}
+
+# intents with a slow part; /predict_stream sends their intro before it runs
+DEFERRED_HANDLERS = {
+    'ask_weather': begin_ask_weather
+}
+
+
+def is_valid_user_id(user_id):
+    return isinstance(user_id, str) and 0 < len(user_id) <= MAX_USER_ID_LENGTH and user_id.isprintable()
+
+
+def sign_user_id(token):
+    return hmac.new(SESSION_SECRET, token.encode('utf-8'), hashlib.sha256).hexdigest()[:32]
+
+
+def issue_user_id():
+    token = uuid.uuid4().hex
+    return f"{token}.{sign_user_id(token)}"
+
+
+def is_issued_user_id(user_id):
+    token, _, signature = user_id.rpartition('.')
+    return bool(token) and hmac.compare_digest(signature.encode('utf-8'), sign_user_id(token).encode('utf-8'))
+
+
+def session_user_id(user_id):
+    # dialogs are keyed by ids this server issued, so knowing someone's id
+    # from elsewhere doesn't reach their dialog. A missing or foreign id
+    # starts over under a new one, which the client keeps from the reply's
+    # user_id; a malformed one is returned as is and rejected by the caller.
+    if user_id is None or user_id == '' or is_valid_user_id(user_id) and not is_issued_user_id(user_id):
+        return issue_user_id()
+    return user_id
+
+
+def classify_message(user_message, state=None):
+    # a request reads the model state once and finishes on that version
+    state = state or model_manager.current
+    with stage_timer('classification_cache'):
+        classification = state.cache.get(user_message)
+    if classification is None:
+        with stage_timer('tokenize'):
+            tokens = tokenize(user_message)
+        with stage_timer('tfidf'):
+            indices, tf = state.engine.vectorize_tokens(tokens)
+        with stage_timer('classify'):
+            classification = state.engine.classify_vector(indices, tf)
+        state.cache.put(user_message, classification)
+    return classification
+
+
+def classify_messages(user_messages, state=None):
+    state = state or model_manager.current
+    classifications = [state.cache.get(msg) for msg in user_messages]
+    missing = [i for i, classification in enumerate(classifications) if classification is None]
+    
+    if missing:
+        with stage_timer('classify_batch'):
+            computed = state.engine.classify_batch([user_messages[i] for i in missing])
+        for i, classification in zip(missing, computed):
+            classifications[i] = classification
+            state.cache.put(user_messages[i], classification)
+    return classifications
+
+
+def handle_message(user_message, user_id, classification=None, state=None):
+    intro, finish = begin_message(user_message, user_id, classification, state)
+    return finish()
+
+
+def begin_message(user_message, user_id, classification=None, state=None):
+    # returns (intro, finish): intro is a partial reply that can be shown
+    # before the slow part of the intent runs, or None; finish() does the
+    # rest and returns the full reply. The model state is read once, so the
+    # reply comes from the same version that classified the message, even
+    # if a reload lands in between.
+    state = state or model_manager.current
+    started = time.perf_counter()
+    with stage_timer('session'):
+        session = user_sessions.get(user_id)
+    context = session.context if session is not None else None
+    metrics.inc('afira_session_context_total', (('context', context or 'none'),))
+    if session is not None:
+        result = handle_ongoing_conversation(user_message, user_id, session)
+        if result:
+            return None, lambda: result
+    
+    if classification is None:
+        classification = classify_message(user_message, state)
+    intent_name, confidence, top_intents = classification
+    metrics.inc('afira_intent_total', (('intent', intent_name),))
+    metrics.inc('afira_intent_confidence_total', (('bucket', CONFIDENCE_BUCKETS[min(int(confidence * 5), 4)]),))
+    
+    deferred = DEFERRED_HANDLERS.get(intent_name)
+    if deferred is not None:
+        intro, run = deferred(user_message, user_id, intent_name, confidence, state)
+    else:
+        handler = INTENT_HANDLERS.get(intent_name, handle_static_intent)
+        intro = None
+        result = handler(user_message, user_id, intent_name, confidence, state)
+        run = lambda: result
+    
+    def finish():
+        result = run()
+        # only classified messages are logged; answers inside a heart/asthma
+        # dialog are health data, not training text
+        outcome = conversation_log.log({
+            'ts': time.time(),
+            'user_id': user_id,
+            'message': user_message,
+            'intent': intent_name,
+            'confidence': confidence,
+            'top_intents': top_intents,
+            'context': context,
+            'latency_ms': (time.perf_counter() - started) * 1000
+        })
+        metrics.inc('afira_conversation_log_total', (('outcome', outcome),))
         return result
     
-    return None
+    return intro, finish
+
+
+@bp.before_request
+def start_request_timer():
+    g.request_started = time.perf_counter()
 
-@app.route('/predict', methods=['POST'])
+
+@bp.after_request
+def record_request(response):
+    # the route pattern, not the path, keeps /assess/<model_name> one series
+    endpoint = request.url_rule.rule if request.url_rule is not None else 'unmatched'
+    metrics.observe('afira_request_seconds', (('endpoint', endpoint),), time.perf_counter() - g.request_started)
+    metrics.inc('afira_requests_total', (('endpoint', endpoint), ('status', str(response.status_code))))
+    return response
+
+
+@bp.route('/predict', methods=['POST'])
 def predict():
     try:
         data = request.get_json()
-        user_message = data.get('message', '').strip()
-        user_id = data.get('user_id', str(uuid.uuid4()))
+        user_message = data.get('message', '')
+        user_id = session_user_id(data.get('user_id'))
         
+        if not isinstance(user_message, str):
+            count_error('invalid_message')
+            return jsonify({'error': 'message must be a string'}), 400
+        user_message = user_message.strip()
         if not user_message:
+            count_error('empty_message')
             return jsonify({'error': 'Empty message'}), 400
+        if not is_valid_user_id(user_id):
+            count_error('invalid_user_id')
+            return jsonify({'error': 'Invalid user_id'}), 400
+        
+        return jsonify(handle_message(user_message, user_id))
         
-        if user_id in user_sessions:
-            result = handle_ongoing_conversation(user_message, user_id)
-            if result:
-                return jsonify(result)
+    except Exception as e:
+        count_error(type(e).__name__)
+        print(f"Error in prediction: {e}")
+        return jsonify({'error': str(e)}), 500
+
+
+def sse_event(event, payload):
+    return f"event: {event}\ndata: {json.dumps(payload)}\n\n"
+
+
+@bp.route('/predict_stream', methods=['POST'])
+def predict_stream():
+    # same reply as /predict as server-sent events: 'intent' with the intro
+    # as soon as the message is classified (slow intents only), then
+    # 'result' with the full reply, or 'error'
+    try:
+        data = request.get_json()
+        user_message = data.get('message', '')
+        user_id = session_user_id(data.get('user_id'))
         
-        tfidf_vector = text_to_tfidf(user_message)
-        prediction = model.predict(tfidf_vector)[0]
-        intent_name = label_encoder.inverse_transform([prediction])[0]
-        probabilities = model.predict_proba(tfidf_vector)[0]
-        confidence = float(np.max(probabilities))
+        if not isinstance(user_message, str):
+            count_error('invalid_message')
+            return jsonify({'error': 'message must be a string'}), 400
+        user_message = user_message.strip()
+        if not user_message:
+            count_error('empty_message')
+            return jsonify({'error': 'Empty message'}), 400
+        if not is_valid_user_id(user_id):
+            count_error('invalid_user_id')
+            return jsonify({'error': 'Invalid user_id'}), 400
         
-        print(f"User: '{user_message}' -> Intent: {intent_name} ({confidence * 100:.1f}%)")
+        intro, finish = begin_message(user_message, user_id)
         
-        ### intent "predictions" ###
-        if intent_name == "predictions":
-            return jsonify(handle_prediction_intent(user_message, user_id))
+    except Exception as e:
+        count_error(type(e).__name__)
+        print(f"Error in prediction: {e}")
+        return jsonify({'error': str(e)}), 500
+    
+    def events():
+        if intro is not None:
+            yield sse_event('intent', intro)
+        try:
+            yield sse_event('result', finish())
+        except Exception as e:
+            count_error(type(e).__name__)
+            print(f"Error in streamed prediction: {e}")
+            yield sse_event('error', {'error': str(e)})
+    
+    return Response(events(), mimetype='text/event-stream', headers={
+        'Cache-Control': 'no-cache',
+        # keep nginx and similar proxies from holding the intro back
+        'X-Accel-Buffering': 'no'
+    })
+
+
+@bp.route('/predict_batch', methods=['POST'])
+def predict_batch():
+    try:
+        data = request.get_json()
+        messages = data.get('messages', [])
+        default_user_id = data.get('user_id')
+        # one id for the entries that don't bring their own, so they share a dialog
+        if default_user_id:
+            default_user_id = session_user_id(default_user_id)
         
-        ### intent"ask_time" ###
-        if intent_name == "ask_time":
-            now = datetime.now().strftime("%H:%M:%S")
-            for intent in intents_data['intents']:
-                if intent['name'] == "ask_time":
-                    template = random.choice(intent['responses'])
-                    break
-            
-            response_text = template.replace("{time}", now)
-            
-            return jsonify({
-                'intent': 'ask_time',
-                'confidence': confidence,
-                'response': response_text,
-                'user_id': user_id
-            })
+        if not isinstance(messages, list) or not messages:
+            return jsonify({'error': 'messages must be a non-empty list'}), 400
+        if len(messages) > MAX_BATCH_SIZE:
+            return jsonify({'error': f'Batch too large (max {MAX_BATCH_SIZE} messages)'}), 400
         
-        ### intent "ask_weather" ###
-        if intent_name == "ask_weather":
-            city = extract_city(user_message)
-            
-            for intent in intents_data['intents']:
-                if intent['name'] == "ask_weather":
-                    intro_msg = random.choice(intent['responses'])
-                    break
-            
-            if city:
-                weather = get_weather(city)
-                
-                if weather:
-                    response_text = (
-                        f"{intro_msg}\n\n"
-                        f"📍 Weather in **{weather['city']}**:\n"
-                        f"🌡️ Temperature: {weather['temp']}°C (feels like {weather['feels']}°C)\n"
-                        f"🌤️ Condition: {weather['desc']}\n"
-                        f"💧 Humidity: {weather['humidity']}%\n"
-                        f"💨 Wind: {weather['wind']} m/s"
-                    )
-                else:
-                    response_text = (
-                        f"{intro_msg}\n\n"
-                        f"Sorry, I couldn't find weather info for '{city}'."
-                    )
+        items = []
+        for item in messages:
+            if isinstance(item, dict):
+                user_message = item.get('message', '')
+                user_id = item.get('user_id', default_user_id)
             else:
-                response_text = (
-                    f"{intro_msg}\n\n"
-                    "Tell me a city! For example:\n"
-                    "→ *weather in London*\n"
-                    "→ *forecast for Paris*\n"
-                    "→ *is it raining in Rome?*"
-                )
-            
-            return jsonify({
-                "intent": intent_name,
-                "confidence": confidence,
-                "response": response_text,
-                "user_id": user_id
-            })
+                user_message = item
+                user_id = default_user_id
+            # null, numbers and lists are rejected rather than turned into text
+            if isinstance(user_message, str):
+                user_message = user_message.strip()
+            items.append((user_message, session_user_id(user_id)))
         
-        response_text = "I'm not sure how to respond to that."
-        for intent in intents_data['intents']:
-            if intent['name'] == intent_name:
-                response_text = random.choice(intent['responses'])
-                break
+        # cache misses go through one sparse matrix and one matmul;
+        # messages that land inside a dialog simply don't use their row
+        state = model_manager.current
+        classifications = classify_messages([msg for msg, _ in items if isinstance(msg, str) and msg], state)
+        classifications = iter(classifications)
+        
+        results = []
+        for user_message, user_id in items:
+            if not isinstance(user_message, str):
+                count_error('invalid_message')
+                results.append({'error': 'message must be a string', 'user_id': user_id})
+                continue
+            if not user_message:
+                count_error('empty_message')
+                results.append({'error': 'Empty message', 'user_id': user_id})
+                continue
+            classification = next(classifications)
+            if not is_valid_user_id(user_id):
+                count_error('invalid_user_id')
+                results.append({'error': 'Invalid user_id', 'user_id': user_id})
+                continue
+            results.append(handle_message(user_message, user_id, classification, state))
+        
+        return jsonify({'results': results, 'count': len(results)})
+        
+    except Exception as e:
+        count_error(type(e).__name__)
+        print(f"Error in batch prediction: {e}")
+        return jsonify({'error': str(e)}), 500
+
+
+def assess_record(predictor, record):
+    if not isinstance(record, dict):
+        return {'error': 'Each record must be a JSON object'}
+    
+    user_data, errors = validate_record(predictor.fields, record)
+    if errors:
+        return {'errors': errors}
+    
+    probability, error = predictor.make_prediction(user_data)
+    if error:
+        return {'error': error}
+    
+    return {
+        'probability': float(probability),
+        'risk_percentage': float(probability * 100),
+        'response': predictor.format_prediction_response(probability)
+    }
+
+
+def assess_cohort(predictor, records):
+    # validate row by row, then score every valid record in one vectorized call
+    results = [None] * len(records)
+    valid_rows = []
+    valid_records = []
+    for i, record in enumerate(records):
+        if not isinstance(record, dict):
+            results[i] = {'error': 'Each record must be a JSON object'}
+            continue
+        user_data, errors = validate_record(predictor.fields, record)
+        if errors:
+            results[i] = {'errors': errors}
+            continue
+        valid_rows.append(i)
+        valid_records.append(user_data)
+    
+    if valid_records:
+        probabilities = predictor.score_many(predictor.records_to_matrix(valid_records))
+        for i, probability in zip(valid_rows, probabilities):
+            results[i] = {
+                'probability': float(probability),
+                'risk_percentage': float(probability * 100),
+                'response': predictor.format_prediction_response(probability)
+            }
+    return results
+
+
+def get_assessment_predictor(model_name):
+    predictor = ASSESSMENT_PREDICTORS.get(model_name)
+    if predictor is None:
+        return None, (jsonify({'error': f"Unknown model '{model_name}'", 'models': sorted(ASSESSMENT_PREDICTORS)}), 404)
+    if not predictor.get().is_model_loaded():
+        return None, (jsonify({'error': f"{predictor.name} is currently unavailable"}), 503)
+    return predictor, None
+
+
+@bp.route('/assess/<model_name>', methods=['GET'])
+def assess_schema(model_name):
+    predictor, error_response = get_assessment_predictor(model_name)
+    if error_response:
+        return error_response
+    
+    return jsonify({
+        'model': model_name,
+        'fields': [
+            {key: value for key, value in field.items() if key != 'question'}
+            for field in predictor.fields
+        ]
+    })
+
+
+@bp.route('/assess/<model_name>', methods=['POST'])
+def assess(model_name):
+    try:
+        predictor, error_response = get_assessment_predictor(model_name)
+        if error_response:
+            return error_response
+        
+        result = assess_record(predictor, request.get_json())
+        result['model'] = model_name
+        if 'probability' not in result:
+            return jsonify(result), 400
+        return jsonify(result)
+        
+    except Exception as e:
+        count_error(type(e).__name__)
+        print(f"Error in assessment: {e}")
+        return jsonify({'error': str(e)}), 500
+
+
+@bp.route('/assess/<model_name>/batch', methods=['POST'])
+def assess_batch(model_name):
+    try:
+        predictor, error_response = get_assessment_predictor(model_name)
+        if error_response:
+            return error_response
+        
+        data = request.get_json()
+        records = data.get('records', []) if isinstance(data, dict) else data
+        
+        if not isinstance(records, list) or not records:
+            return jsonify({'error': 'records must be a non-empty list'}), 400
+        if len(records) > MAX_BATCH_SIZE:
+            return jsonify({'error': f'Batch too large (max {MAX_BATCH_SIZE} records)'}), 400
+        
+        # assess_cohort needs both halves of the vectorized path
+        loaded = predictor.get()
+        if hasattr(loaded, 'records_to_matrix') and hasattr(loaded, 'score_many'):
+            results = assess_cohort(predictor, records)
+        else:
+            results = [assess_record(predictor, record) for record in records]
         
         return jsonify({
-            'intent': intent_name,
-            'confidence': confidence,
-            'response': response_text,
-            'user_id': user_id
+            'model': model_name,
+            'results': results,
+            'count': len(results),
+            'scored': sum(1 for result in results if 'probability' in result)
         })
         
     except Exception as e:
-        print(f"Error in prediction: {e}")
+        count_error(type(e).__name__)
+        print(f"Error in batch assessment: {e}")
         return jsonify({'error': str(e)}), 500
 
 
-@app.route('/health', methods=['GET'])
+def preload_predictors():
+    for predictor in (heart_pred, asthma_pred):
+        if predictor.state == LazyPredictor.NOT_LOADED:
+            predictor.load_in_background()
+
+
+@bp.route('/health', methods=['GET'])
 def health_check():
+    state = model_manager.current
     return jsonify({
         'status': 'ok',
-        'model_loaded': model is not None,
-        'vocab_size': len(vocab) if vocab is not None else 0,
+        'ready': state is not None,
+        'subsystems': {
+            'intent_model': 'loaded' if state is not None else 'not_loaded',
+            'heart_predictor': heart_pred.status(),
+            'asthma_predictor': asthma_pred.status(),
+            'websocket': 'available' if sock is not None else 'not_installed'
+        },
+        'model_loaded': state is not None,
+        'model_version': state.version if state is not None else None,
+        'model_variant': state.engine.variant if state is not None else None,
+        'vocab_size': state.engine.vocab_size if state is not None else 0,
         'heart_model_loaded': heart_pred.is_model_loaded(),
-        'asthma_model_loaded': asthma_pred.is_model_loaded()
+        'asthma_model_loaded': asthma_pred.is_model_loaded(),
+        'classification_cache': state.cache.stats() if state is not None else None,
+        'sessions': user_sessions.stats(),
+        'conversation_log': conversation_log.stats(),
+        'weather': dict(get_weather_client().status(), cache=get_weather_cache().stats())
     })
 
 
-@app.route('/reset_session', methods=['POST'])
+@bp.route('/metrics', methods=['GET'])
+def metrics_endpoint():
+    return Response(metrics.render(), mimetype='text/plain; version=0.0.4')
+
+
+### websocket ###
+# One connection per user_id; each turn is a small JSON frame instead of a
+# POST with its own preflight and connection. The dialog state stays in
+# user_sessions, so a client that falls back to /predict mid-dialog picks
+# up where the socket left off.
+sock = Sock() if Sock is not None else None
+SOCKET_OPTIONS = {
+    'ping_interval': 25,
+    'max_message_size': 16 * 1024
+}
+
+
+def socket_frame(event, payload):
+    return json.dumps({'event': event, 'data': payload})
+
+
+def serve_socket(ws, user_id):
+    user_id = session_user_id(user_id)
+    if not is_valid_user_id(user_id):
+        count_error('invalid_user_id')
+        ws.send(socket_frame('error', {'error': 'Invalid user_id'}))
+        return
+    
+    session = user_sessions.get(user_id)
+    ws.send(socket_frame('ready', {'user_id': user_id, 'context': session.context if session is not None else None}))
+    
+    while True:
+        frame = ws.receive()
+        started = time.perf_counter()
+        status = '200'
+        try:
+            data = json.loads(frame)
+            if not isinstance(data, dict):
+                raise ValueError('frame must be a JSON object')
+        except ValueError as e:
+            data = None
+            status = '400'
+            ws.send(socket_frame('error', {'error': f'Invalid frame: {e}'}))
+        
+        if data is not None and data.get('reset'):
+            user_sessions.delete(user_id)
+            ws.send(socket_frame('result', {'status': 'success', 'message': 'Session reset successfully'}))
+        elif data is not None:
+            user_message = data.get('message', '')
+            if not isinstance(user_message, str):
+                count_error('invalid_message')
+                status = '400'
+                ws.send(socket_frame('error', {'error': 'message must be a string'}))
+            elif not user_message.strip():
+                count_error('empty_message')
+                status = '400'
+                ws.send(socket_frame('error', {'error': 'Empty message'}))
+            else:
+                try:
+                    intro, finish = begin_message(user_message.strip(), user_id)
+                    if intro is not None:
+                        ws.send(socket_frame('intent', intro))
+                    ws.send(socket_frame('result', finish()))
+                except Exception as e:
+                    count_error(type(e).__name__)
+                    status = '500'
+                    print(f"Error in socket prediction: {e}")
+                    ws.send(socket_frame('error', {'error': str(e)}))
+        
+        metrics.observe('afira_request_seconds', (('endpoint', '/ws'),), time.perf_counter() - started)
+        metrics.inc('afira_requests_total', (('endpoint', '/ws'), ('status', status)))
+
+
+if sock is not None:
+    # registered on flask-sock's own blueprint, so the per-request metrics
+    # hooks don't time the whole connection
+    @sock.route('/ws')
+    def chat_socket(ws):
+        serve_socket(ws, request.args.get('user_id'))
+
+
+### admin ###
+def is_admin_request():
+    token = request.headers.get('X-Admin-Token', '')
+    return bool(ADMIN_TOKEN) and hmac.compare_digest(token.encode('utf-8'), ADMIN_TOKEN.encode('utf-8'))
+
+
+@bp.route('/admin/model', methods=['GET'])
+def admin_model():
+    if not is_admin_request():
+        return jsonify({'error': 'Forbidden'}), 403
+    return jsonify(model_manager.status())
+
+
+@bp.route('/admin/reload', methods=['POST'])
+def admin_reload():
+    # loads and smoke-tests the new version on this request's thread while
+    # the other threads keep serving the current one
+    if not is_admin_request():
+        return jsonify({'error': 'Forbidden'}), 403
+    
+    data = request.get_json(silent=True) or {}
+    bundle_dir = data.get('bundle_dir') or MODEL_BUNDLE_DIR
+    if not isinstance(bundle_dir, str):
+        return jsonify({'error': 'bundle_dir must be a path'}), 400
+    # optional: refuse the directory unless it holds this version
+    expected_version = data.get('version')
+    if expected_version is not None and not isinstance(expected_version, str):
+        return jsonify({'error': 'version must be a string'}), 400
+    
+    state, error = model_manager.reload(os.path.join(BASE_DIR, bundle_dir), expected_version=expected_version)
+    metrics.inc('afira_model_reloads_total', (('result', 'reloaded' if state is not None else 'rejected'),))
+    if error:
+        return jsonify({'error': error, 'model': model_manager.current.describe()}), 422
+    return jsonify({'status': 'success', 'model': state.describe()})
+
+
+@bp.route('/admin/rollback', methods=['POST'])
+def admin_rollback():
+    if not is_admin_request():
+        return jsonify({'error': 'Forbidden'}), 403
+    
+    state, error = model_manager.rollback()
+    metrics.inc('afira_model_reloads_total', (('result', 'rolled_back' if state is not None else 'rollback_failed'),))
+    if error:
+        return jsonify({'error': error, 'model': model_manager.current.describe()}), 409
+    return jsonify({'status': 'success', 'model': state.describe()})
+
+
+@bp.route('/reset_session', methods=['POST'])
 def reset_session():
     try:
         data = request.get_json()
         user_id = data.get('user_id')
         
-        if user_id in user_sessions:
-            del user_sessions[user_id]
+        if is_valid_user_id(user_id) and is_issued_user_id(user_id) and user_sessions.delete(user_id):
             return jsonify({'status': 'success', 'message': 'Session reset successfully'})
         
         return jsonify({'status': 'success', 'message': 'No active session found'})
     except Exception as e:
         return jsonify({'error': str(e)}), 500
 
+def warm_up():
+    # touch the hot path once so the first real request doesn't pay for
+    # page faults on the mapped weights or lazy imports
+    state = model_manager.current
+    for message in ('hello', 'what time is it', 'weather in london', 'thanks, bye'):
+        classify_message(message, state)
+    state.engine.classify_batch(['hello', 'thanks'])
+
+
+def create_app(preload_predictors=False):
+    if model_manager.current is None and not load_models():
+        raise RuntimeError("Models not loaded - check the model bundle or .pkl files")
+    
+    if preload_predictors:
+        heart_pred.get()
+        asthma_pred.get()
+    
+    app = Flask(__name__)
+    CORS(app)
+    app.register_blueprint(bp)
+    if sock is not None:
+        app.config['SOCK_SERVER_OPTIONS'] = SOCKET_OPTIONS
+        sock.init_app(app)
+    return app
+
+
 if __name__ == '__main__':
     print("Starting Afira AI Flask Server...\n")
     
     if load_models():
+        app = create_app()
         print("\nServer running on http://localhost:5000")
         print("Frontend should connect to this URL\n")
+        if PRELOAD_PREDICTORS:
+            preload_predictors()
+        model_manager.start_watcher()
+        user_sessions.start_purger()
         app.run(debug=True, host='0.0.0.0', port=5000)
     else:
         print("\nFailed to start server - models not loaded")
@@ -0,0 +1,70 @@
+import threading
+from collections import OrderedDict
+
+from intent_engine import tokenize
+
+
+class ClassificationCache:
+    def __init__(self, max_entries=4096, max_key_length=256):
+        self.max_entries = max_entries
+        self.max_key_length = max_key_length
+        self._entries = OrderedDict()
+        self._lock = threading.Lock()
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+
+    @staticmethod
+    def normalize(text):
+        # the classifier only sees lower-cased whitespace tokens, so any two
+        # messages with the same normalized form get the same classification
+        return ' '.join(tokenize(text))
+
+    def get(self, text):
+        key = self.normalize(text)
+        with self._lock:
+            classification = self._entries.get(key)
+            if classification is None:
+                self.misses += 1
+                return None
+            self._entries.move_to_end(key)
+            self.hits += 1
+            return classification
+
+    def put(self, text, classification):
+        key = self.normalize(text)
+        if not key or len(key) > self.max_key_length:
+            return
+        with self._lock:
+            self._entries[key] = classification
+            self._entries.move_to_end(key)
+            while len(self._entries) > self.max_entries:
+                self._entries.popitem(last=False)
+                self.evictions += 1
+
+    def warm(self, texts, classify_batch):
+        keys = list(dict.fromkeys(self.normalize(text) for text in texts))
+        keys = [key for key in keys if key and len(key) <= self.max_key_length]
+        keys = keys[:self.max_entries]
+        for key, classification in zip(keys, classify_batch(keys)):
+            self.put(key, classification)
+        return len(keys)
+
+    def clear(self):
+        with self._lock:
+            self._entries.clear()
+            self.hits = 0
+            self.misses = 0
+            self.evictions = 0
+
+    def stats(self):
+        with self._lock:
+            lookups = self.hits + self.misses
+            return {
+                'size': len(self._entries),
+                'max_entries': self.max_entries,
+                'hits': self.hits,
+                'misses': self.misses,
+                'evictions': self.evictions,
+                'hit_ratio': self.hits / lookups if lookups else 0.0
+            }
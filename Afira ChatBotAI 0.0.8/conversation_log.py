@@ -0,0 +1,256 @@
+import argparse
+import atexit
+import glob
+import gzip
+import json
+import os
+import queue
+import random
+import sys
+import threading
+import time
+
+# Background writer for the conversation corpus used to grow chatbotdata.json.
+#
+# log() only samples and enqueues, so a request never waits on the disk.
+# A thread drains the queue in batches and appends each batch to
+# <directory>/conversations-<time>-<pid>-*.jsonl.gz as its own gzip member,
+# so a crash loses at most the batch in memory and every file stays
+# readable. Files rotate by size and age. When the queue is full records
+# are dropped and counted instead of blocking the request.
+
+
+class ConversationLog:
+    def __init__(self, directory, sample_rate=1.0, max_queue=10000, batch_size=500,
+                 flush_interval=2.0, max_file_bytes=64 * 1024 * 1024, max_file_age=3600.0):
+        self.directory = directory
+        self.sample_rate = sample_rate
+        self.max_queue = max_queue
+        self.batch_size = batch_size
+        self.flush_interval = flush_interval
+        self.max_file_bytes = max_file_bytes
+        self.max_file_age = max_file_age
+        self._reset()
+        if hasattr(os, 'register_at_fork'):
+            # the writer thread does not survive a fork; each worker starts its own
+            os.register_at_fork(after_in_child=self._reset)
+
+    def _reset(self):
+        self._queue = queue.Queue(maxsize=self.max_queue)
+        self._lock = threading.Lock()
+        self._stats_lock = threading.Lock()
+        self._thread = None
+        self._closed = False
+        self._path = None
+        self._file_bytes = 0
+        self._file_opened = 0.0
+        self.logged = 0
+        self.sampled_out = 0
+        self.dropped = 0
+        self.written = 0
+        self.write_errors = 0
+
+    @property
+    def enabled(self):
+        return bool(self.directory) and self.sample_rate > 0
+
+    def log(self, record):
+        # returns what happened to the record: 'queued', 'sampled_out',
+        # 'dropped' or 'disabled'
+        if not self.enabled or self._closed:
+            return 'disabled'
+        if self.sample_rate < 1.0 and random.random() >= self.sample_rate:
+            self._count('sampled_out')
+            return 'sampled_out'
+        if self._thread is None:
+            self._start()
+        try:
+            self._queue.put_nowait(record)
+        except queue.Full:
+            self._count('dropped')
+            return 'dropped'
+        self._count('logged')
+        return 'queued'
+
+    def _count(self, counter, value=1):
+        with self._stats_lock:
+            setattr(self, counter, getattr(self, counter) + value)
+
+    def _start(self):
+        with self._lock:
+            if self._thread is not None:
+                return
+            self._thread = threading.Thread(target=self._run, name='conversation-log', daemon=True)
+            self._thread.start()
+            # the dev server exits without a worker_exit hook
+            atexit.register(self.close)
+
+    def _run(self):
+        while True:
+            batch = self._next_batch()
+            if batch is None:
+                return
+            if batch:
+                self._write(batch)
+
+    def _next_batch(self):
+        # block for the first record, then take whatever else arrives within
+        # flush_interval, up to batch_size
+        try:
+            first = self._queue.get(timeout=self.flush_interval)
+        except queue.Empty:
+            return []
+        if first is None:
+            return None
+
+        batch = [first]
+        deadline = time.monotonic() + self.flush_interval
+        while len(batch) < self.batch_size:
+            remaining = deadline - time.monotonic()
+            try:
+                record = self._queue.get(timeout=remaining) if remaining > 0 else self._queue.get_nowait()
+            except queue.Empty:
+                break
+            if record is None:
+                self._write(batch)
+                return None
+            batch.append(record)
+        return batch
+
+    def _write(self, batch):
+        lines = ''.join(json.dumps(record, ensure_ascii=False, separators=(',', ':')) + '\n' for record in batch)
+        data = gzip.compress(lines.encode('utf-8'), compresslevel=6)
+        try:
+            path = self._current_path(len(data))
+            with open(path, 'ab') as f:
+                f.write(data)
+            self._file_bytes += len(data)
+            self._count('written', len(batch))
+        except OSError as e:
+            self._count('write_errors')
+            print(f"Warning: could not write conversation log: {e}")
+
+    def _current_path(self, incoming):
+        now = time.time()
+        if (self._path is None
+                or self._file_bytes + incoming > self.max_file_bytes
+                or now - self._file_opened > self.max_file_age):
+            os.makedirs(self.directory, exist_ok=True)
+            stamp = time.strftime('%Y%m%d-%H%M%S', time.gmtime(now))
+            self._path = os.path.join(self.directory, f'conversations-{stamp}-{os.getpid()}-{time.time_ns() % 1000000:06d}.jsonl.gz')
+            self._file_bytes = 0
+            self._file_opened = now
+        return self._path
+
+    def close(self, timeout=5.0):
+        # flush what is queued; called on worker exit
+        self._closed = True
+        if self._thread is None:
+            return
+        try:
+            self._queue.put(None, timeout=timeout)
+        except queue.Full:
+            pass
+        self._thread.join(timeout)
+
+    def stats(self):
+        with self._stats_lock:
+            return {
+                'directory': self.directory,
+                'sample_rate': self.sample_rate,
+                'queued': self._queue.qsize(),
+                'logged': self.logged,
+                'sampled_out': self.sampled_out,
+                'dropped': self.dropped,
+                'written': self.written,
+                'write_errors': self.write_errors
+            }
+
+
+def read_records(directory):
+    for path in sorted(glob.glob(os.path.join(directory, 'conversations-*.jsonl.gz'))):
+        try:
+            with gzip.open(path, 'rt', encoding='utf-8') as f:
+                for line in f:
+                    yield json.loads(line)
+        except (OSError, EOFError, ValueError) as e:
+            # a worker killed mid-write leaves a truncated last member
+            print(f"Warning: stopped reading {path}: {e}", file=sys.stderr)
+
+
+def export_candidates(directory, intents_path, min_confidence=0.9, max_per_intent=200):
+    # messages the model was sure about and that are not patterns yet, in the
+    # chatbotdata.json layout, for a person to review before merging
+    with open(intents_path, 'r', encoding='utf-8') as f:
+        intents_data = json.load(f)
+    known = {pattern.strip().lower() for intent in intents_data['intents'] for pattern in intent['patterns']}
+
+    candidates = {}
+    for record in read_records(directory):
+        intent = record.get('intent')
+        message = (record.get('message') or '').strip()
+        if not intent or not message or record.get('confidence', 0.0) < min_confidence:
+            continue
+        key = message.lower()
+        if key in known:
+            continue
+        patterns = candidates.setdefault(intent, {})
+        if key not in patterns and len(patterns) < max_per_intent:
+            patterns[key] = message
+
+    return {
+        'intents': [
+            {'name': name, 'patterns': sorted(patterns.values())}
+            for name, patterns in sorted(candidates.items())
+        ]
+    }
+
+
+def summarize(directory):
+    total = 0
+    intents = {}
+    contexts = {}
+    latencies = []
+    for record in read_records(directory):
+        total += 1
+        intents[record.get('intent')] = intents.get(record.get('intent'), 0) + 1
+        contexts[record.get('context') or 'none'] = contexts.get(record.get('context') or 'none', 0) + 1
+        latencies.append(record.get('latency_ms', 0.0))
+
+    latencies.sort()
+    return {
+        'records': total,
+        'intents': dict(sorted(intents.items(), key=lambda item: -item[1])),
+        'contexts': contexts,
+        'latency_ms_p50': latencies[len(latencies) // 2] if latencies else None,
+        'latency_ms_p99': latencies[int(len(latencies) * 0.99)] if latencies else None
+    }
+
+
+def main():
+    parser = argparse.ArgumentParser(description='Read the Afira conversation log')
+    subparsers = parser.add_subparsers(dest='command', required=True)
+
+    summary_parser = subparsers.add_parser('summary', help='Count records per intent and context')
+    summary_parser.add_argument('directory')
+
+    export_parser = subparsers.add_parser('export', help='Write new confident messages as candidate patterns')
+    export_parser.add_argument('directory')
+    export_parser.add_argument('output')
+    export_parser.add_argument('--intents', default=os.path.join(os.path.dirname(os.path.abspath(__file__)), 'chatbotdata.json'))
+    export_parser.add_argument('--min-confidence', type=float, default=0.9)
+    export_parser.add_argument('--max-per-intent', type=int, default=200)
+
+    args = parser.parse_args()
+    if args.command == 'summary':
+        print(json.dumps(summarize(args.directory), indent=2))
+    else:
+        candidates = export_candidates(args.directory, args.intents, args.min_confidence, args.max_per_intent)
+        with open(args.output, 'w', encoding='utf-8') as f:
+            json.dump(candidates, f, indent=4, ensure_ascii=False)
+        count = sum(len(intent['patterns']) for intent in candidates['intents'])
+        print(f"Wrote {count} candidate patterns for {len(candidates['intents'])} intents to {args.output}")
+
+
+if __name__ == '__main__':
+    main()
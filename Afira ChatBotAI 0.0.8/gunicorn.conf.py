@@ -0,0 +1,93 @@
+import gc
+import multiprocessing
+import os
+import secrets
+import tempfile
+
+chdir = os.path.dirname(os.path.abspath(__file__))
+wsgi_app = 'wsgi:app'
+
+bind = os.environ.get('AFIRA_BIND', '0.0.0.0:5000')
+workers = int(os.environ.get('AFIRA_WORKERS', multiprocessing.cpu_count()))
+worker_class = 'gthread'
+# an open /ws connection holds one of these threads for as long as it lasts
+threads = int(os.environ.get('AFIRA_THREADS', 4))
+
+# load models once in the master, then fork
+preload_app = True
+
+timeout = 30
+graceful_timeout = 30
+keepalive = 5
+max_requests = int(os.environ.get('AFIRA_MAX_REQUESTS', 0))
+max_requests_jitter = max_requests // 10
+
+# workers write their metrics snapshots here so /metrics can add them up;
+# read by app.py at import, so it has to be set before the app is preloaded
+os.environ.setdefault('AFIRA_METRICS_DIR', os.path.join(tempfile.gettempdir(), f'afira-metrics-{os.getpid()}'))
+# the next turn of a heart/asthma dialog can reach any worker, so the
+# dialog state lives in a file they all open rather than in one worker
+os.environ.setdefault('AFIRA_SESSION_DB', os.path.join(tempfile.gettempdir(), f'afira-sessions-{os.getpid()}.db'))
+# and every worker has to accept the user ids the others issued
+os.environ.setdefault('AFIRA_SESSION_SECRET', secrets.token_hex(32))
+
+
+def on_starting(server):
+    # a fresh server starts counting from zero
+    from metrics import clear_snapshots
+    clear_snapshots(os.environ['AFIRA_METRICS_DIR'])
+    for suffix in ('', '-wal', '-shm'):
+        path = os.environ['AFIRA_SESSION_DB'] + suffix
+        if os.path.exists(path):
+            os.remove(path)
+
+
+def when_ready(server):
+    # everything allocated while preloading is long-lived; moving it out of
+    # the GC's generations keeps collections in the workers from touching
+    # (and un-sharing) those pages
+    gc.freeze()
+    server.log.info("Afira models loaded in master, %d objects frozen", gc.get_freeze_count())
+
+
+def post_worker_init(worker):
+    # runs in each worker before it starts accepting connections
+    from app import warm_up, metrics, model_manager, user_sessions, preload_predictors
+    # a worker forked after a reload starts with the master's boot-time
+    # model; catch up with the pointer before serving or warming anything
+    try:
+        model_manager.sync_with_pointer()
+    except (OSError, ValueError, KeyError) as e:
+        worker.log.warning("Could not read model pointer: %s", e)
+    warm_up()
+    # a no-op when the master already loaded them (AFIRA_PRELOAD_PREDICTORS=1)
+    preload_predictors()
+    metrics.start_flusher()
+    # abandoned dialogs are dropped even in shards nobody writes to
+    user_sessions.start_purger()
+    # follow reloads and rollbacks made through any worker
+    model_manager.start_watcher()
+    worker.log.info("Worker %s warmed up", worker.pid)
+
+
+def worker_int(worker):
+    worker.log.info("Worker %s interrupted, finishing in-flight requests", worker.pid)
+
+
+def worker_exit(server, worker):
+    from getweather import get_client
+    from app import metrics, conversation_log
+    get_client().close()
+    conversation_log.close()
+    metrics.flush()
+    server.log.info("Worker %s exited", worker.pid)
+
+
+def child_exit(server, worker):
+    # runs in the master after worker_exit's final flush (or after a worker
+    # was killed, with its last periodic snapshot)
+    from metrics import retire_worker
+    try:
+        retire_worker(os.environ['AFIRA_METRICS_DIR'], worker.pid)
+    except OSError as e:
+        server.log.warning("Could not merge metrics of worker %s: %s", worker.pid, e)
@@ -0,0 +1,131 @@
+import numpy as np
+from collections import Counter
+from scipy.sparse import csr_matrix
+
+
+def tokenize(text):
+    return text.lower().split()
+
+
+class IntentEngine:
+    def __init__(self, weights, intercept, class_names, word2idx, scales=None, variant=None):
+        # weights is (vocab_size, n_classes) with the idf already folded in,
+        # so a message only needs its raw term frequencies.
+        # int8 weights come with one scale per class; the scores are scaled
+        # after the gather, so only the rows a message touches are widened
+        self.weights = np.ascontiguousarray(weights)
+        self.scales = None if scales is None else np.asarray(scales, dtype=np.float32)
+        self.dtype = np.dtype(np.float32) if self.scales is not None else self.weights.dtype
+        self.intercept = np.asarray(intercept, dtype=self.dtype)
+        self.class_names = [str(name) for name in class_names]
+        self.word2idx = word2idx
+        self.variant = variant or self.weights.dtype.name
+
+    @classmethod
+    def from_sklearn(cls, model, label_encoder, word2idx, idf, variant='float64'):
+        from model_bundle import intent_model_arrays, variant_arrays
+
+        arrays = intent_model_arrays(model.coef_, model.intercept_, idf)
+        weights, intercept, scales = variant_arrays(arrays, variant)
+        class_names = label_encoder.inverse_transform(model.classes_)
+        return cls(weights, intercept, class_names, word2idx, scales, variant)
+
+    @classmethod
+    def from_bundle(cls, bundle, variant='float64'):
+        from model_bundle import variant_arrays
+
+        weights, intercept, scales = variant_arrays(bundle.arrays, variant)
+        return cls(weights, intercept, bundle.class_names, bundle.word2idx, scales, variant)
+
+    @property
+    def vocab_size(self):
+        return self.weights.shape[0]
+
+    @property
+    def n_classes(self):
+        return self.weights.shape[1]
+
+    def vectorize(self, text):
+        return self.vectorize_tokens(tokenize(text))
+
+    def vectorize_tokens(self, tokens):
+        total_count = len(tokens)
+
+        indices = []
+        tf = []
+        for token, count in Counter(tokens).items():
+            idx = self.word2idx.get(token)
+            if idx is not None:
+                indices.append(idx)
+                tf.append(count / total_count)
+        return indices, tf
+
+    def scores(self, text):
+        indices, tf = self.vectorize(text)
+        return self.score_vector(indices, tf)
+
+    def score_vector(self, indices, tf):
+        scores = self.intercept.copy()
+        if indices:
+            contribution = np.asarray(tf, dtype=self.dtype) @ self.weights[indices]
+            if self.scales is not None:
+                contribution *= self.scales
+            scores += contribution
+        return scores
+
+    def vectorize_batch(self, texts):
+        indptr = [0]
+        indices = []
+        tf = []
+        for text in texts:
+            row_indices, row_tf = self.vectorize(text)
+            indices.extend(row_indices)
+            tf.extend(row_tf)
+            indptr.append(len(indices))
+        return csr_matrix(
+            (np.asarray(tf, dtype=self.dtype),
+             np.asarray(indices, dtype=np.int32),
+             np.asarray(indptr, dtype=np.int32)),
+            shape=(len(texts), self.vocab_size)
+        )
+
+    def scores_batch(self, texts):
+        tf_matrix = self.vectorize_batch(texts)
+        scores = np.asarray(tf_matrix @ self.weights, dtype=self.dtype)
+        if self.scales is not None:
+            scores *= self.scales
+        return scores + self.intercept
+
+    @staticmethod
+    def softmax(scores):
+        scores = scores - scores.max(axis=-1, keepdims=True)
+        exp_scores = np.exp(scores)
+        return exp_scores / exp_scores.sum(axis=-1, keepdims=True)
+
+    def top_intents(self, probabilities, top_k):
+        top_k = min(top_k, len(probabilities))
+        order = np.argpartition(-probabilities, top_k - 1)[:top_k]
+        order = order[np.argsort(-probabilities[order], kind='stable')]
+        return [
+            {'intent': self.class_names[i], 'confidence': float(probabilities[i])}
+            for i in order
+        ]
+
+    def classify(self, text, top_k=3):
+        indices, tf = self.vectorize(text)
+        return self.classify_vector(indices, tf, top_k)
+
+    def classify_vector(self, indices, tf, top_k=3):
+        probabilities = self.softmax(self.score_vector(indices, tf))
+        top = self.top_intents(probabilities, top_k)
+        return top[0]['intent'], top[0]['confidence'], top
+
+    def classify_batch(self, texts, top_k=3):
+        if not texts:
+            return []
+        probabilities = self.softmax(self.scores_batch(texts))
+        results = []
+        for row in probabilities:
+            top = self.top_intents(row, top_k)
+            results.append((top[0]['intent'], top[0]['confidence'], top))
+        return results
@@ -0,0 +1,68 @@
+import random
+import re
+
+PLACEHOLDER_PATTERN = re.compile(r'\{(\w+)\}')
+
+
+class ResponseTemplate:
+    __slots__ = ('text', 'parts', 'fields')
+
+    def __init__(self, text):
+        self.text = text
+        # even positions are literal text, odd positions are placeholder names
+        self.parts = PLACEHOLDER_PATTERN.split(text)
+        self.fields = self.parts[1::2]
+
+    def render(self, context=None):
+        if not self.fields:
+            return self.text
+        context = context or {}
+        rendered = list(self.parts)
+        for i in range(1, len(rendered), 2):
+            name = rendered[i]
+            rendered[i] = str(context[name]) if name in context else '{' + name + '}'
+        return ''.join(rendered)
+
+
+class IntentEntry:
+    __slots__ = ('name', 'label_index', 'templates')
+
+    def __init__(self, name, label_index, responses):
+        self.name = name
+        self.label_index = label_index
+        self.templates = [ResponseTemplate(text) for text in responses]
+
+    def respond(self, context=None):
+        if not self.templates:
+            return None
+        return random.choice(self.templates).render(context)
+
+
+class IntentRegistry:
+    def __init__(self, intents_data, class_names):
+        label_of = {name: i for i, name in enumerate(class_names)}
+
+        self.by_name = {}
+        for intent in intents_data['intents']:
+            name = intent['name']
+            self.by_name[name] = IntentEntry(name, label_of.get(name), intent.get('responses', []))
+
+        self.by_label = [self.by_name.get(name) for name in class_names]
+
+    def __len__(self):
+        return len(self.by_name)
+
+    def get(self, name):
+        return self.by_name.get(name)
+
+    def get_by_label(self, label_index):
+        if 0 <= label_index < len(self.by_label):
+            return self.by_label[label_index]
+        return None
+
+    def respond(self, name, context=None, default=None):
+        entry = self.by_name.get(name)
+        if entry is None:
+            return default
+        response = entry.respond(context)
+        return default if response is None else response
@@ -0,0 +1,629 @@
+import argparse
+import hashlib
+import json
+import os
+import pickle
+import sys
+import time
+from collections import Counter
+
+import numpy as np
+from scipy.sparse import csr_matrix, vstack
+
+from intent_engine import IntentEngine, tokenize
+from model_bundle import (BUNDLES_DIR, DEFAULT_BUNDLE_DIR, MANIFEST_NAME, VARIANTS, file_sha256, intent_model_arrays,
+                          latest_bundle, load_bundle, publish_bundle, variant_arrays)
+
+# Trains the intent model from chatbotdata.json the way the notebook does
+# (same tokenizer, tf, smoothed idf, split and LogisticRegression) and
+# writes the pickles load_models() falls back to plus the model bundle,
+# published to its own <bundles>/<version> directory. Nothing is switched
+# over: the new version goes live through /admin/reload.
+#
+#   python intent_training.py              # rebuild what changed
+#   python intent_training.py --force      # rebuild everything
+#   python intent_training.py --incremental
+#
+# --incremental updates the cached features with only the patterns that
+# were added or removed since the last run, appending new words to the
+# vocabulary and adjusting the stored document frequencies, then refits
+# the classifier starting from the previous coefficients. --force gives
+# a clean rebuild (sorted vocabulary, no leftover words) when wanted.
+# Without a stage cache (a fresh checkout, CI) --incremental starts from
+# the newest published bundle (or the shipped one) instead: its vocabulary
+# keeps its columns and its coefficients seed the fit, while the document
+# frequencies are recounted from the corpus.
+#
+# Each stage records the hash of its inputs in <cache>/state.json and is
+# skipped when they have not changed: features depend on the corpus,
+# the model on the features and training parameters, and the artifacts
+# on the model (and are rewritten if a file on disk no longer matches).
+#
+# Every run also compares the float32 and int8 serving variants with the
+# float64 model on the held-out patterns; --parity does only that for an
+# existing bundle.
+
+BASE_DIR = os.path.dirname(os.path.abspath(__file__))
+DEFAULT_CACHE_DIR = '.train_cache'
+STATE_NAME = 'state.json'
+
+DEFAULT_PARAMS = {
+    'test_size': 0.2,
+    'random_state': 42,
+    'max_iter': 500
+}
+
+PICKLE_FILES = ('nlp_model_lr.pkl', 'label_encoder.pkl', 'vocab.pkl', 'word2idx.pkl', 'idf.pkl')
+
+# a quantized variant should pick the same intent as float64 for
+# practically every held-out pattern
+MIN_VARIANT_AGREEMENT = 0.99
+
+
+class TrainingError(Exception):
+    pass
+
+
+def text_sha256(*parts):
+    digest = hashlib.sha256()
+    for part in parts:
+        digest.update(part.encode('utf-8'))
+        digest.update(b'\0')
+    return digest.hexdigest()
+
+
+### corpus and features ###
+
+def load_corpus(data_path):
+    with open(data_path, 'r', encoding='utf-8') as f:
+        data = json.load(f)
+
+    patterns = []
+    labels = []
+    for intent in data['intents']:
+        for pattern in intent['patterns']:
+            if pattern.strip():
+                patterns.append(pattern)
+                labels.append(intent['name'])
+    return patterns, labels
+
+
+def build_vocab(tokenized):
+    return sorted({token for tokens in tokenized for token in tokens})
+
+
+def term_frequencies(tokenized, word2idx):
+    # one pass over the corpus into CSR; tokens outside the vocabulary are
+    # skipped but still count towards the document length, like at serving time
+    indptr = [0]
+    indices = []
+    data = []
+    for tokens in tokenized:
+        counts = {}
+        for token in tokens:
+            idx = word2idx.get(token)
+            if idx is not None:
+                counts[idx] = counts.get(idx, 0) + 1
+        for idx in sorted(counts):
+            indices.append(idx)
+            data.append(counts[idx] / len(tokens))
+        indptr.append(len(indices))
+
+    return csr_matrix(
+        (np.array(data, dtype=np.float64), np.array(indices, dtype=np.int32), np.array(indptr, dtype=np.int64)),
+        shape=(len(tokenized), len(word2idx))
+    )
+
+
+def document_frequency(tf):
+    # every stored entry is a (document, word) pair, so counting column
+    # indices counts the documents each word appears in
+    return np.bincount(tf.indices, minlength=tf.shape[1]).astype(np.float64)
+
+
+def smoothed_idf(doc_freq, n_docs):
+    return np.log((1 + n_docs) / (1 + doc_freq)) + 1
+
+
+def build_features(data_path):
+    patterns, labels = load_corpus(data_path)
+    tokenized = [tokenize(pattern) for pattern in patterns]
+    vocab = build_vocab(tokenized)
+    word2idx = {word: i for i, word in enumerate(vocab)}
+
+    tf = term_frequencies(tokenized, word2idx)
+    doc_freq = document_frequency(tf)
+    return {
+        'patterns': patterns,
+        'labels': labels,
+        'vocab': vocab,
+        'tf': tf,
+        'doc_freq': doc_freq,
+        'n_docs': len(patterns),
+        'idf': smoothed_idf(doc_freq, len(patterns))
+    }
+
+
+def update_features(previous, patterns, labels):
+    # keep the rows of patterns that are still in the corpus, drop the rest
+    # and vectorize only what was added
+    wanted = Counter(zip(patterns, labels))
+    keep = []
+    removed = []
+    for i, pair in enumerate(zip(previous['patterns'], previous['labels'])):
+        if wanted[pair] > 0:
+            wanted[pair] -= 1
+            keep.append(i)
+        else:
+            removed.append(i)
+
+    added = []
+    for pair in zip(patterns, labels):
+        if wanted[pair] > 0:
+            wanted[pair] -= 1
+            added.append(pair)
+
+    tokenized = [tokenize(pattern) for pattern, _ in added]
+    vocab = list(previous['vocab'])
+    known = set(vocab)
+    new_words = sorted({token for tokens in tokenized for token in tokens} - known)
+    # new words go at the end so existing columns and coefficients keep their index
+    vocab.extend(new_words)
+    word2idx = {word: i for i, word in enumerate(vocab)}
+    n_words = len(vocab)
+
+    old_tf = previous['tf']
+    kept_tf = old_tf[keep]
+    kept_tf = csr_matrix((kept_tf.data, kept_tf.indices, kept_tf.indptr), shape=(len(keep), n_words))
+    added_tf = term_frequencies(tokenized, word2idx)
+    tf = vstack([kept_tf, added_tf], format='csr')
+
+    doc_freq = np.zeros(n_words, dtype=np.float64)
+    doc_freq[:len(previous['doc_freq'])] = previous['doc_freq']
+    doc_freq -= np.bincount(old_tf[removed].indices, minlength=n_words)
+    doc_freq += document_frequency(added_tf)
+
+    n_docs = len(keep) + len(added)
+    features = {
+        'patterns': [previous['patterns'][i] for i in keep] + [pattern for pattern, _ in added],
+        'labels': [previous['labels'][i] for i in keep] + [label for _, label in added],
+        'vocab': vocab,
+        'tf': tf,
+        'doc_freq': doc_freq,
+        'n_docs': n_docs,
+        'idf': smoothed_idf(doc_freq, n_docs)
+    }
+    changes = {'added': len(added), 'removed': len(removed), 'new_words': len(new_words)}
+    return features, changes
+
+
+def save_features(path, features):
+    tf = features['tf']
+    np.savez_compressed(
+        path,
+        tf_data=tf.data, tf_indices=tf.indices, tf_indptr=tf.indptr, tf_shape=np.array(tf.shape),
+        doc_freq=features['doc_freq'], idf=features['idf'],
+        patterns=np.array(features['patterns'], dtype=str),
+        labels=np.array(features['labels'], dtype=str),
+        vocab=np.array(features['vocab'], dtype=str)
+    )
+
+
+def load_features(path):
+    with np.load(path, allow_pickle=False) as f:
+        return {
+            'patterns': f['patterns'].tolist(),
+            'labels': f['labels'].tolist(),
+            'vocab': f['vocab'].tolist(),
+            'tf': csr_matrix((f['tf_data'], f['tf_indices'], f['tf_indptr']), shape=tuple(f['tf_shape'])),
+            'doc_freq': f['doc_freq'],
+            'n_docs': int(f['tf_shape'][0]),
+            'idf': f['idf']
+        }
+
+
+def current_bundle(out_dir, bundle_root):
+    # the newest published bundle, or the one shipped with the app
+    return latest_bundle(bundle_root) or os.path.join(out_dir, DEFAULT_BUNDLE_DIR)
+
+
+def seed_bundle(bundle_dir):
+    # what --incremental extends when there is no stage cache
+    if not os.path.exists(os.path.join(bundle_dir, MANIFEST_NAME)):
+        raise TrainingError(f"--incremental needs the stage cache or a model bundle in {bundle_dir}; "
+                            "run without --incremental for a full build")
+    bundle = load_bundle(bundle_dir, mmap=False)
+    if 'coef' not in bundle.arrays:
+        raise TrainingError(f"bundle {bundle.version} in {bundle_dir} has no coefficients to start from")
+    return bundle
+
+
+def bundle_features(bundle):
+    # the bundle does not list the patterns it was trained on, so every
+    # pattern counts as added and the document frequencies are recounted;
+    # only the vocabulary order carries over
+    vocab = list(bundle.vocab)
+    return {
+        'patterns': [],
+        'labels': [],
+        'vocab': vocab,
+        'tf': csr_matrix((0, len(vocab)), dtype=np.float64),
+        'doc_freq': np.zeros(len(vocab), dtype=np.float64),
+        'n_docs': 0,
+        'idf': np.ones(len(vocab), dtype=np.float64)
+    }
+
+
+### model ###
+
+def model_coefficients(model, label_encoder, vocab):
+    return {
+        'class_names': [str(name) for name in label_encoder.inverse_transform(model.classes_)],
+        'coef': model.coef_,
+        'intercept': model.intercept_,
+        'vocab': vocab
+    }
+
+
+def bundle_coefficients(bundle):
+    # a binary bundle already has one row per class
+    return {
+        'class_names': bundle.class_names,
+        'coef': np.asarray(bundle['coef']),
+        'intercept': np.asarray(bundle['intercept']),
+        'vocab': bundle.vocab
+    }
+
+
+def warm_start_coefficients(previous, class_names, vocab):
+    # lay the previous coefficients out for the new classes and vocabulary,
+    # matching words by name; new classes and new words start at zero
+    coef = np.zeros((len(class_names), len(vocab)), dtype=np.float64)
+    intercept = np.zeros(len(class_names), dtype=np.float64)
+    word2idx = {word: i for i, word in enumerate(vocab)}
+    columns = [(i, word2idx[word]) for i, word in enumerate(previous['vocab']) if word in word2idx]
+    previous_columns = np.array([i for i, _ in columns], dtype=np.int64)
+    new_columns = np.array([j for _, j in columns], dtype=np.int64)
+    previous_rows = {name: i for i, name in enumerate(previous['class_names'])}
+    for row, name in enumerate(class_names):
+        previous_row = previous_rows.get(name)
+        if previous_row is not None:
+            coef[row, new_columns] = previous['coef'][previous_row, previous_columns]
+            intercept[row] = previous['intercept'][previous_row]
+    return coef, intercept
+
+
+def fit_model(features, params, previous=None):
+    from sklearn.linear_model import LogisticRegression
+    from sklearn.metrics import accuracy_score, classification_report
+    from sklearn.model_selection import train_test_split
+    from sklearn.preprocessing import LabelEncoder
+
+    label_encoder = LabelEncoder()
+    y = label_encoder.fit_transform(features['labels'])
+    class_names = [str(name) for name in label_encoder.classes_]
+    # scaling the columns of a CSR matrix keeps it sparse
+    X = features['tf'].multiply(features['idf']).tocsr()
+
+    X_train, X_test, y_train, y_test = train_test_split(
+        X, y,
+        test_size=params['test_size'],
+        random_state=params['random_state'],
+        stratify=y
+    )
+
+    model = LogisticRegression(max_iter=params['max_iter'], random_state=params['random_state'])
+    # a binary model keeps a single coefficient row, so only multiclass warm starts
+    warm_start = (previous is not None and len(class_names) > 2
+                  and len(previous['coef']) == len(previous['class_names']))
+    if warm_start:
+        model.set_params(warm_start=True)
+        model.coef_, model.intercept_ = warm_start_coefficients(previous, class_names, features['vocab'])
+    model.fit(X_train, y_train)
+    model.set_params(warm_start=False)
+
+    y_pred = model.predict(X_test)
+    report = {
+        'accuracy': float(accuracy_score(y_test, y_pred)),
+        'train_size': int(X_train.shape[0]),
+        'test_size': int(X_test.shape[0]),
+        'iterations': int(np.max(model.n_iter_)),
+        'warm_start': warm_start,
+        'classes': classification_report(
+            y_test, y_pred, labels=np.arange(len(class_names)),
+            target_names=class_names,
+            zero_division=0, output_dict=True
+        )
+    }
+    return model, label_encoder, report
+
+
+### serving variants ###
+
+def held_out(patterns, labels, params):
+    # the patterns fit_model tests on; the split only depends on the labels
+    from sklearn.model_selection import train_test_split
+
+    rows = train_test_split(
+        np.arange(len(labels)),
+        test_size=params['test_size'],
+        random_state=params['random_state'],
+        stratify=labels
+    )[1]
+    return [patterns[i] for i in rows], [labels[i] for i in rows]
+
+
+def variant_parity(arrays, class_names, word2idx, patterns, labels, max_examples=10):
+    reference = None
+    parity = {}
+    for variant in VARIANTS:
+        weights, intercept, scales = variant_arrays(arrays, variant)
+        engine = IntentEngine(weights, intercept, class_names, word2idx, scales, variant)
+        # scored the way the variant serves, softmax included
+        probabilities = engine.softmax(engine.scores_batch(patterns)).astype(np.float64)
+        predicted = probabilities.argmax(axis=1)
+        rows = np.arange(len(patterns))
+        if reference is None:
+            reference = (predicted, probabilities[rows, predicted])
+        reference_predicted, reference_confidence = reference
+
+        # drift of the confidence in the intent float64 picked
+        drift = np.abs(probabilities[rows, reference_predicted] - reference_confidence)
+        changed = np.flatnonzero(predicted != reference_predicted)
+        parity[variant] = {
+            'weights_bytes': int(weights.nbytes + (scales.nbytes if scales is not None else 0)),
+            'agreement': float(np.mean(predicted == reference_predicted)),
+            'accuracy': float(np.mean(np.asarray(engine.class_names)[predicted] == np.asarray(labels))),
+            'confidence_drift_mean': float(drift.mean()),
+            'confidence_drift_max': float(drift.max()),
+            'disagreements': [
+                {
+                    'message': patterns[i],
+                    'float64': engine.class_names[reference_predicted[i]],
+                    variant: engine.class_names[predicted[i]]
+                }
+                for i in changed[:max_examples]
+            ]
+        }
+    return parity
+
+
+def print_parity(parity):
+    for variant, result in parity.items():
+        print(f"  {variant:8} {result['weights_bytes'] / 1024:7.1f} KiB  agreement {result['agreement']:.4f}  "
+              f"accuracy {result['accuracy']:.4f}  confidence drift mean {result['confidence_drift_mean']:.2e} "
+              f"max {result['confidence_drift_max']:.2e}")
+        if result['agreement'] < MIN_VARIANT_AGREEMENT:
+            print(f"  Warning: {variant} agrees with float64 on only {result['agreement']:.2%} of held-out patterns")
+
+
+def check_variants(features, model, label_encoder, params):
+    patterns, labels = held_out(features['patterns'], features['labels'], params)
+    arrays = intent_model_arrays(model.coef_, model.intercept_, features['idf'])
+    class_names = label_encoder.inverse_transform(model.classes_)
+    word2idx = {word: i for i, word in enumerate(features['vocab'])}
+    return variant_parity(arrays, class_names, word2idx, patterns, labels)
+
+
+def bundle_parity(bundle_dir, data_path, params):
+    # for a bundle that was not trained here, or only had the variants added
+    bundle = load_bundle(bundle_dir)
+    patterns, labels = held_out(*load_corpus(data_path), params)
+    return variant_parity(bundle.arrays, bundle.class_names, bundle.word2idx, patterns, labels)
+
+
+### artifacts ###
+
+def write_artifacts(features, model, label_encoder, out_dir, bundle_root, corpus_sha256, report):
+    vocab = features['vocab']
+    word2idx = {word: i for i, word in enumerate(vocab)}
+
+    objects = {
+        'nlp_model_lr.pkl': model,
+        'label_encoder.pkl': label_encoder,
+        'vocab.pkl': vocab,
+        'word2idx.pkl': word2idx,
+        'idf.pkl': features['idf']
+    }
+    for name, obj in objects.items():
+        path = os.path.join(out_dir, name)
+        with open(path + '.tmp', 'wb') as f:
+            pickle.dump(obj, f)
+        os.replace(path + '.tmp', path)
+
+    class_names = [str(name) for name in label_encoder.inverse_transform(model.classes_)]
+    # the document frequencies stay in the stage cache: without the pattern
+    # rows they were counted from they can't be updated, only recounted
+    arrays = intent_model_arrays(model.coef_, model.intercept_, features['idf'])
+    metadata = {
+        'source': 'incremental' if report.get('warm_start') else 'training',
+        'model': type(model).__name__,
+        'corpus_sha256': corpus_sha256,
+        'n_docs': features['n_docs'],
+        'accuracy': report['accuracy'],
+        'variants': {variant: {key: value for key, value in result.items() if key != 'disagreements'}
+                     for variant, result in report.get('variants', {}).items()},
+        'params': {key: value for key, value in model.get_params().items()
+                   if isinstance(value, (int, float, str, bool, type(None)))}
+    }
+    bundle_dir, manifest = publish_bundle(bundle_root, vocab, class_names, arrays, metadata)
+
+    outputs = {name: file_sha256(os.path.join(out_dir, name)) for name in PICKLE_FILES}
+    outputs['bundle'] = manifest['checksum']
+    outputs['bundle_dir'] = bundle_dir
+    return manifest, outputs
+
+
+def artifacts_intact(out_dir, outputs):
+    for name in PICKLE_FILES:
+        path = os.path.join(out_dir, name)
+        if not os.path.exists(path) or file_sha256(path) != outputs.get(name):
+            return False
+    manifest_path = os.path.join(outputs.get('bundle_dir', ''), MANIFEST_NAME)
+    if not os.path.exists(manifest_path):
+        return False
+    with open(manifest_path, 'r', encoding='utf-8') as f:
+        return json.load(f).get('checksum') == outputs.get('bundle')
+
+
+### pipeline ###
+
+def load_state(cache_dir):
+    path = os.path.join(cache_dir, STATE_NAME)
+    if not os.path.exists(path):
+        return {}
+    with open(path, 'r', encoding='utf-8') as f:
+        return json.load(f)
+
+
+def save_state(cache_dir, state):
+    path = os.path.join(cache_dir, STATE_NAME)
+    with open(path + '.tmp', 'w', encoding='utf-8') as f:
+        json.dump(state, f, indent=2)
+    os.replace(path + '.tmp', path)
+
+
+def train(data_path, out_dir=BASE_DIR, bundle_root=None, cache_dir=None, params=None, force=False, incremental=False):
+    params = dict(DEFAULT_PARAMS, **(params or {}))
+    bundle_root = bundle_root or os.path.join(out_dir, BUNDLES_DIR)
+    cache_dir = cache_dir or os.path.join(out_dir, DEFAULT_CACHE_DIR)
+    os.makedirs(cache_dir, exist_ok=True)
+
+    state = {} if force else load_state(cache_dir)
+    stages = {}
+
+    # features: tokenize, vocabulary, tf, document frequency, idf
+    started = time.perf_counter()
+    corpus_sha256 = file_sha256(data_path)
+    features_path = os.path.join(cache_dir, 'features.npz')
+    features_key = text_sha256('features', corpus_sha256)
+    previous_vocab = None
+    seed = None
+    if state.get('features') == features_key and os.path.exists(features_path):
+        features = load_features(features_path)
+        stages['features'] = 'cached'
+    elif incremental and state.get('features') and os.path.exists(features_path):
+        previous = load_features(features_path)
+        previous_vocab = previous['vocab']
+        features, changes = update_features(previous, *load_corpus(data_path))
+        save_features(features_path, features)
+        state['features'] = features_key
+        stages['features'] = 'updated'
+        print(f"Corpus changes: {changes['added']} patterns added, {changes['removed']} removed, "
+              f"{changes['new_words']} new words")
+    elif incremental:
+        seed = seed_bundle(current_bundle(out_dir, bundle_root))
+        features, changes = update_features(bundle_features(seed), *load_corpus(data_path))
+        save_features(features_path, features)
+        state['features'] = features_key
+        stages['features'] = 'updated'
+        n_docs = seed.manifest.get('metadata', {}).get('n_docs')
+        trained_on = f"{n_docs} patterns, " if n_docs is not None else ''
+        print(f"No stage cache, starting from bundle {seed.version} in {seed.path} "
+              f"({trained_on}{len(seed.vocab)} words): {changes['new_words']} new words")
+    else:
+        features = build_features(data_path)
+        save_features(features_path, features)
+        state['features'] = features_key
+        stages['features'] = 'built'
+    print(f"Features {stages['features']}: {features['n_docs']} patterns, "
+          f"{len(features['vocab'])} words ({time.perf_counter() - started:.2f}s)")
+
+    # model: split and LogisticRegression
+    started = time.perf_counter()
+    model_path = os.path.join(cache_dir, 'model.pkl')
+    model_key = text_sha256('model', features_key, json.dumps(params, sort_keys=True))
+    if state.get('model') == model_key and os.path.exists(model_path):
+        with open(model_path, 'rb') as f:
+            model, label_encoder, report = pickle.load(f)
+        stages['model'] = 'cached'
+    else:
+        previous = None
+        if incremental and previous_vocab is not None and os.path.exists(model_path):
+            with open(model_path, 'rb') as f:
+                previous_model, previous_encoder, _ = pickle.load(f)
+            previous = model_coefficients(previous_model, previous_encoder, previous_vocab)
+        elif incremental:
+            seed = seed or seed_bundle(current_bundle(out_dir, bundle_root))
+            previous = bundle_coefficients(seed)
+            print(f"Warm start from the coefficients of bundle {seed.version}")
+        model, label_encoder, report = fit_model(features, params, previous)
+        if incremental and not report['warm_start']:
+            print("Warning: --incremental could not warm start (binary model); the model was fitted from scratch")
+        with open(model_path, 'wb') as f:
+            pickle.dump((model, label_encoder, report), f)
+        state['model'] = model_key
+        stages['model'] = 'updated' if report['warm_start'] else 'built'
+    print(f"Model {stages['model']}: accuracy {report['accuracy']:.4f} on "
+          f"{report['test_size']} held-out patterns, {report['iterations']} iterations "
+          f"({time.perf_counter() - started:.2f}s)")
+
+    # serving variants: cheap enough to check on every run
+    report['variants'] = check_variants(features, model, label_encoder, params)
+    print(f"Serving variants on {report['test_size']} held-out patterns:")
+    print_parity(report['variants'])
+
+    # artifacts: pickles for load_models() and the bundle
+    artifacts_key = text_sha256('artifacts', model_key, os.path.abspath(out_dir), os.path.abspath(bundle_root))
+    if state.get('artifacts') == artifacts_key and artifacts_intact(out_dir, state.get('outputs', {})):
+        stages['artifacts'] = 'cached'
+    else:
+        manifest, outputs = write_artifacts(features, model, label_encoder, out_dir, bundle_root, corpus_sha256, report)
+        state['artifacts'] = artifacts_key
+        state['outputs'] = outputs
+        stages['artifacts'] = 'built'
+    version = state['outputs']['bundle'][:12]
+    bundle_dir = os.path.abspath(state['outputs']['bundle_dir'])
+    print(f"Artifacts {stages['artifacts']}: bundle {version} in {bundle_dir}")
+    if stages['artifacts'] == 'built':
+        print(f"Serve it with POST /admin/reload {{\"bundle_dir\": \"{bundle_dir}\"}}")
+
+    save_state(cache_dir, state)
+    return {'stages': stages, 'report': report, 'model_version': version, 'bundle_dir': bundle_dir}
+
+
+def main():
+    parser = argparse.ArgumentParser(description='Train the Afira intent model from chatbotdata.json')
+    parser.add_argument('--data', default=os.path.join(BASE_DIR, 'chatbotdata.json'), help='Intents file')
+    parser.add_argument('--out', default=BASE_DIR, help='Directory for the .pkl files')
+    parser.add_argument('--bundle', default=None,
+                        help=f'Directory versioned bundles are published under (default <out>/{BUNDLES_DIR})')
+    parser.add_argument('--cache', default=None, help=f'Stage cache directory (default <out>/{DEFAULT_CACHE_DIR})')
+    parser.add_argument('--test-size', type=float, default=DEFAULT_PARAMS['test_size'])
+    parser.add_argument('--random-state', type=int, default=DEFAULT_PARAMS['random_state'])
+    parser.add_argument('--max-iter', type=int, default=DEFAULT_PARAMS['max_iter'])
+    parser.add_argument('--force', action='store_true', help='Rebuild every stage')
+    parser.add_argument('--incremental', action='store_true',
+                        help='Update the cached features and warm-start the model instead of rebuilding')
+    parser.add_argument('--report', default=None, help='Write the held-out accuracy report to this JSON file')
+    parser.add_argument('--parity', nargs='?', const='', default=None, metavar='BUNDLE',
+                        help='Only compare the float32 and int8 variants of a bundle with float64 '
+                             '(default the newest published bundle)')
+    args = parser.parse_args()
+
+    params = {'test_size': args.test_size, 'random_state': args.random_state, 'max_iter': args.max_iter}
+    if args.parity is not None:
+        bundle_dir = args.parity or current_bundle(args.out, args.bundle or os.path.join(args.out, BUNDLES_DIR))
+        parity = bundle_parity(bundle_dir, args.data, params)
+        print(f"Serving variants of {bundle_dir} on the held-out patterns of {args.data}:")
+        print_parity(parity)
+        if args.report:
+            with open(args.report, 'w', encoding='utf-8') as f:
+                json.dump({'bundle': bundle_dir, 'variants': parity}, f, indent=2)
+            print(f"Report written to {args.report}")
+        return
+
+    try:
+        result = train(args.data, args.out, args.bundle, args.cache, params, args.force, args.incremental)
+    except TrainingError as e:
+        sys.exit(f"Error: {e}")
+    if all(stage == 'cached' for stage in result['stages'].values()):
+        print("Nothing to do, chatbotdata.json has not changed")
+    if args.report:
+        with open(args.report, 'w', encoding='utf-8') as f:
+            json.dump(dict(result['report'], model_version=result['model_version'], stages=result['stages']), f, indent=2)
+        print(f"Report written to {args.report}")
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,78 @@
+import importlib
+import threading
+import time
+
+
+class LazyPredictor:
+    NOT_LOADED = 'not_loaded'
+    LOADING = 'loading'
+    LOADED = 'loaded'
+    FAILED = 'failed'
+
+    def __init__(self, name, module_name, class_name, model_dir, on_load=None):
+        self.name = name
+        self.module_name = module_name
+        self.class_name = class_name
+        self.model_dir = model_dir
+        # called with the new predictor before anyone else can see it
+        self.on_load = on_load
+        self.state = self.NOT_LOADED
+        self.load_seconds = None
+        self._predictor = None
+        self._predictor_class = None
+        self._lock = threading.Lock()
+
+    def predictor_class(self):
+        if self._predictor_class is None:
+            module = importlib.import_module(self.module_name)
+            self._predictor_class = getattr(module, self.class_name)
+        return self._predictor_class
+
+    def get(self):
+        if self._predictor is not None:
+            return self._predictor
+
+        with self._lock:
+            if self._predictor is None:
+                self.state = self.LOADING
+                start = time.perf_counter()
+                try:
+                    predictor = self.predictor_class()(model_dir=self.model_dir)
+                except Exception as e:
+                    self.state = self.FAILED
+                    print(f"Error loading {self.name}: {e}")
+                    raise
+                self.load_seconds = time.perf_counter() - start
+                self.state = self.LOADED if predictor.is_model_loaded() else self.FAILED
+                if self.on_load is not None:
+                    self.on_load(predictor)
+                self._predictor = predictor
+                print(f"{self.name} ready in {self.load_seconds:.2f}s ({self.state})")
+        return self._predictor
+
+    def load_in_background(self):
+        def target():
+            try:
+                self.get()
+            except Exception:
+                pass
+
+        thread = threading.Thread(target=target, name=f"load-{self.name}", daemon=True)
+        thread.start()
+        return thread
+
+    def is_model_loaded(self):
+        return self._predictor is not None and self._predictor.is_model_loaded()
+
+    def check_keywords(self, user_message):
+        # keyword routing must not pay for the model load
+        return self.predictor_class().check_keywords(user_message)
+
+    def status(self):
+        return {
+            'state': self.state,
+            'load_seconds': round(self.load_seconds, 3) if self.load_seconds is not None else None
+        }
+
+    def __getattr__(self, attr):
+        return getattr(self.get(), attr)
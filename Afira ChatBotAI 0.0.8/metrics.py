@@ -0,0 +1,270 @@
+import bisect
+import json
+import os
+import threading
+import time
+
+STAGE_BUCKETS = (
+    0.00005, 0.0001, 0.00025, 0.0005, 0.001, 0.0025, 0.005,
+    0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0
+)
+
+# totals of workers that have exited, kept in one file instead of one each
+EXITED_SNAPSHOT = 'exited.json'
+# how long a merged worker id is remembered after its file is removed
+MERGED_ID_TTL = 300.0
+
+
+class Timer:
+    __slots__ = ('metrics', 'name', 'labels', 'started')
+
+    def __init__(self, metrics, name, labels):
+        self.metrics = metrics
+        self.name = name
+        self.labels = labels
+
+    def __enter__(self):
+        self.started = time.perf_counter()
+        return self
+
+    def __exit__(self, exc_type, exc, tb):
+        self.metrics.observe(self.name, self.labels, time.perf_counter() - self.started)
+        return False
+
+
+class Metrics:
+    # Counters and histograms for the Prometheus /metrics endpoint.
+    #
+    # Under gunicorn every worker counts on its own. With a directory set,
+    # each worker writes its totals to <directory>/<pid>-<start>.json and
+    # collect() adds up all the files, so the endpoint reports the whole
+    # server whichever worker answers. When a worker exits, the master adds
+    # its file into exited.json and removes it (retire_worker): its requests
+    # still happened and counters must not go backwards, but the number of
+    # files stays at one per live worker.
+
+    def __init__(self, directory=None):
+        self.directory = directory
+        self.definitions = {}
+        self._reset()
+        if hasattr(os, 'register_at_fork'):
+            # a forked worker starts from zero instead of inheriting the master's counts
+            os.register_at_fork(after_in_child=self._reset)
+
+    def _reset(self):
+        self._lock = threading.Lock()
+        self.counters = {}
+        self.histograms = {}
+        self.worker_id = f'{os.getpid()}-{time.time_ns()}'
+        self._flusher = None
+
+    def counter(self, name, help_text):
+        self.definitions[name] = ('counter', help_text, None)
+
+    def histogram(self, name, help_text, buckets=STAGE_BUCKETS):
+        self.definitions[name] = ('histogram', help_text, tuple(buckets))
+
+    def inc(self, name, labels=(), value=1):
+        key = (name, labels)
+        with self._lock:
+            self.counters[key] = self.counters.get(key, 0) + value
+
+    def observe(self, name, labels, value):
+        buckets = self.definitions[name][2]
+        index = bisect.bisect_left(buckets, value)
+        key = (name, labels)
+        with self._lock:
+            histogram = self.histograms.get(key)
+            if histogram is None:
+                histogram = self.histograms[key] = [[0] * (len(buckets) + 1), 0.0, 0]
+            histogram[0][index] += 1
+            histogram[1] += value
+            histogram[2] += 1
+
+    def timer(self, name, labels=()):
+        return Timer(self, name, labels)
+
+    def snapshot(self):
+        with self._lock:
+            return {
+                'counters': [[name, labels, value] for (name, labels), value in self.counters.items()],
+                'histograms': [
+                    [name, labels, list(counts), total, count]
+                    for (name, labels), (counts, total, count) in self.histograms.items()
+                ]
+            }
+
+    def flush(self):
+        if not self.directory:
+            return
+        os.makedirs(self.directory, exist_ok=True)
+        path = os.path.join(self.directory, f'{self.worker_id}.json')
+        tmp_path = path + '.tmp'
+        with open(tmp_path, 'w', encoding='utf-8') as f:
+            json.dump(self.snapshot(), f)
+        os.replace(tmp_path, path)
+
+    def start_flusher(self, interval=5.0):
+        if not self.directory or self._flusher is not None:
+            return
+
+        def run():
+            while True:
+                time.sleep(interval)
+                try:
+                    self.flush()
+                except OSError as e:
+                    print(f"Warning: could not write metrics snapshot: {e}")
+
+        self._flusher = threading.Thread(target=run, name='metrics-flush', daemon=True)
+        self._flusher.start()
+
+    def collect(self):
+        snapshots = [self.snapshot()]
+        if self.directory and os.path.isdir(self.directory):
+            own_file = f'{self.worker_id}.json'
+            workers = {}
+            for filename in os.listdir(self.directory):
+                if not filename.endswith('.json') or filename in (own_file, EXITED_SNAPSHOT):
+                    continue
+                snapshot = read_snapshot(os.path.join(self.directory, filename))
+                if snapshot is not None:
+                    workers[filename[:-len('.json')]] = snapshot
+
+            # read last: a worker file that is gone by now is in here, and
+            # one that is in here as well is only counted once
+            exited = read_snapshot(os.path.join(self.directory, EXITED_SNAPSHOT))
+            if exited is not None:
+                snapshots.append(exited)
+                merged_ids = exited.get('merged', {})
+                workers = {worker_id: snapshot for worker_id, snapshot in workers.items() if worker_id not in merged_ids}
+            snapshots.extend(workers.values())
+
+        counters, histograms = merge_snapshots(snapshots)
+        live_workers = len(snapshots) - sum(1 for snapshot in snapshots if 'merged' in snapshot)
+        return counters, histograms, live_workers
+
+    def render(self):
+        counters, histograms, workers = self.collect()
+        lines = []
+        for name, (kind, help_text, buckets) in self.definitions.items():
+            lines.append(f'# HELP {name} {help_text}')
+            lines.append(f'# TYPE {name} {kind}')
+            if kind == 'counter':
+                for (metric, labels), value in sorted(counters.items()):
+                    if metric == name:
+                        lines.append(f'{name}{format_labels(labels)} {format_value(value)}')
+                continue
+
+            for (metric, labels), (counts, total, count) in sorted(histograms.items()):
+                if metric != name:
+                    continue
+                cumulative = 0
+                for bound, bucket_count in zip(buckets + (float('inf'),), counts):
+                    cumulative += bucket_count
+                    le = '+Inf' if bound == float('inf') else repr(bound)
+                    lines.append(f'{name}_bucket{format_labels(labels + (("le", le),))} {cumulative}')
+                lines.append(f'{name}_sum{format_labels(labels)} {format_value(total)}')
+                lines.append(f'{name}_count{format_labels(labels)} {count}')
+
+        lines.append('# HELP afira_metrics_workers Live worker processes included in these totals (exited ones are in them too)')
+        lines.append('# TYPE afira_metrics_workers gauge')
+        lines.append(f'afira_metrics_workers {workers}')
+        return '\n'.join(lines) + '\n'
+
+
+def read_snapshot(path):
+    try:
+        with open(path, 'r', encoding='utf-8') as f:
+            return json.load(f)
+    except (OSError, ValueError):
+        return None
+
+
+def merge_snapshots(snapshots):
+    counters = {}
+    histograms = {}
+    for snapshot in snapshots:
+        for name, labels, value in snapshot['counters']:
+            key = (name, tuple(tuple(label) for label in labels))
+            counters[key] = counters.get(key, 0) + value
+        for name, labels, counts, total, count in snapshot['histograms']:
+            key = (name, tuple(tuple(label) for label in labels))
+            merged = histograms.get(key)
+            if merged is None:
+                histograms[key] = [list(counts), total, count]
+            else:
+                merged[0] = [a + b for a, b in zip(merged[0], counts)]
+                merged[1] += total
+                merged[2] += count
+    return counters, histograms
+
+
+def retire_worker(directory, pid):
+    # called by the master once a worker has exited: its snapshot files are
+    # added into exited.json, which is replaced before they are removed
+    if not directory or not os.path.isdir(directory):
+        return 0
+    prefix = f'{pid}-'
+    filenames = [name for name in os.listdir(directory)
+                 if name.startswith(prefix) and name.endswith('.json')]
+    if not filenames:
+        return 0
+
+    exited_path = os.path.join(directory, EXITED_SNAPSHOT)
+    exited = read_snapshot(exited_path) or {'counters': [], 'histograms': [], 'merged': {}}
+    snapshots = [exited]
+    for filename in filenames:
+        snapshot = read_snapshot(os.path.join(directory, filename))
+        if snapshot is not None:
+            snapshots.append(snapshot)
+    counters, histograms = merge_snapshots(snapshots)
+
+    now = time.time()
+    merged_ids = {worker_id: merged_at for worker_id, merged_at in exited.get('merged', {}).items()
+                  if now - merged_at < MERGED_ID_TTL}
+    for filename in filenames:
+        merged_ids[filename[:-len('.json')]] = now
+
+    tmp_path = exited_path + '.tmp'
+    with open(tmp_path, 'w', encoding='utf-8') as f:
+        json.dump({
+            'counters': [[name, labels, value] for (name, labels), value in counters.items()],
+            'histograms': [
+                [name, labels, counts, total, count]
+                for (name, labels), (counts, total, count) in histograms.items()
+            ],
+            'merged': merged_ids
+        }, f)
+    os.replace(tmp_path, exited_path)
+
+    for filename in filenames:
+        try:
+            os.remove(os.path.join(directory, filename))
+        except FileNotFoundError:
+            pass
+    return len(filenames)
+
+
+def clear_snapshots(directory):
+    if not directory or not os.path.isdir(directory):
+        return
+    for filename in os.listdir(directory):
+        if filename.endswith('.json') or filename.endswith('.tmp'):
+            os.remove(os.path.join(directory, filename))
+
+
+def format_labels(labels):
+    if not labels:
+        return ''
+    pairs = []
+    for key, value in labels:
+        value = str(value).replace('\\', '\\\\').replace('\n', '\\n').replace('"', '\\"')
+        pairs.append(f'{key}="{value}"')
+    return '{' + ','.join(pairs) + '}'
+
+
+def format_value(value):
+    if isinstance(value, float):
+        return repr(value)
+    return str(value)
@@ -0,0 +1,290 @@
+import argparse
+import hashlib
+import json
+import os
+import pickle
+import shutil
+import tempfile
+from datetime import datetime, timezone
+
+import numpy as np
+
+BUNDLE_FORMAT = 'afira-intent-bundle'
+BUNDLE_FORMAT_VERSION = 1
+MANIFEST_NAME = 'manifest.json'
+DEFAULT_BUNDLE_DIR = 'intent_model'
+# trained and exported bundles go to <BUNDLES_DIR>/<model_version>; a
+# published version is never written again, so a pointer or rollback to it
+# always gets the same model
+BUNDLES_DIR = 'intent_models'
+
+# serving precisions of the intent weights; float64 is the trained model
+VARIANTS = ('float64', 'float32', 'int8')
+
+
+class BundleError(Exception):
+    pass
+
+
+class ModelBundle:
+    def __init__(self, path, manifest, arrays):
+        self.path = path
+        self.manifest = manifest
+        self.arrays = arrays
+        self.vocab = manifest['vocab']
+        self.class_names = manifest['class_names']
+        self.word2idx = {word: i for i, word in enumerate(self.vocab)}
+
+    @property
+    def version(self):
+        return self.manifest['model_version']
+
+    def __getitem__(self, name):
+        return self.arrays[name]
+
+
+def file_sha256(path, chunk_size=1 << 20):
+    digest = hashlib.sha256()
+    with open(path, 'rb') as f:
+        for chunk in iter(lambda: f.read(chunk_size), b''):
+            digest.update(chunk)
+    return digest.hexdigest()
+
+
+def bundle_checksum(vocab, class_names, array_entries):
+    digest = hashlib.sha256()
+    digest.update(json.dumps(vocab, ensure_ascii=False).encode('utf-8'))
+    digest.update(json.dumps(class_names, ensure_ascii=False).encode('utf-8'))
+    for name in sorted(array_entries):
+        digest.update(name.encode('utf-8'))
+        digest.update(array_entries[name]['sha256'].encode('ascii'))
+    return digest.hexdigest()
+
+
+def write_bundle(out_dir, vocab, class_names, arrays, metadata=None):
+    os.makedirs(out_dir, exist_ok=True)
+
+    array_entries = {}
+    for name, array in arrays.items():
+        file_name = f"{name}.npy"
+        file_path = os.path.join(out_dir, file_name)
+        # C-contiguous, no pickled objects: np.load can memory-map it.
+        # Replaced, not overwritten: a running server may have the old file mapped
+        with open(file_path + '.tmp', 'wb') as f:
+            np.save(f, np.ascontiguousarray(array), allow_pickle=False)
+        os.replace(file_path + '.tmp', file_path)
+        array_entries[name] = {
+            'file': file_name,
+            'dtype': str(array.dtype),
+            'shape': list(array.shape),
+            'sha256': file_sha256(file_path)
+        }
+
+    checksum = bundle_checksum(vocab, class_names, array_entries)
+    manifest = {
+        'format': BUNDLE_FORMAT,
+        'format_version': BUNDLE_FORMAT_VERSION,
+        'model_version': checksum[:12],
+        'checksum': checksum,
+        'created_at': datetime.now(timezone.utc).isoformat(timespec='seconds'),
+        'vocab_size': len(vocab),
+        'n_classes': len(class_names),
+        'vocab': list(vocab),
+        'class_names': list(class_names),
+        'arrays': array_entries,
+        'metadata': metadata or {}
+    }
+
+    manifest_path = os.path.join(out_dir, MANIFEST_NAME)
+    tmp_path = manifest_path + '.tmp'
+    with open(tmp_path, 'w', encoding='utf-8') as f:
+        json.dump(manifest, f, ensure_ascii=False, indent=2)
+    os.replace(tmp_path, manifest_path)
+    return manifest
+
+
+def publish_bundle(root, vocab, class_names, arrays, metadata=None):
+    # written to a staging directory and renamed into place once complete;
+    # returns (bundle_dir, manifest)
+    os.makedirs(root, exist_ok=True)
+    staging = tempfile.mkdtemp(prefix='.staging-', dir=root)
+    try:
+        manifest = write_bundle(staging, vocab, class_names, arrays, metadata)
+        bundle_dir = os.path.join(root, manifest['model_version'])
+        if os.path.exists(os.path.join(bundle_dir, MANIFEST_NAME)):
+            # the same model was published before; keep that copy as it is
+            shutil.rmtree(staging)
+            with open(os.path.join(bundle_dir, MANIFEST_NAME), 'r', encoding='utf-8') as f:
+                return bundle_dir, json.load(f)
+        os.rename(staging, bundle_dir)
+    except BaseException:
+        shutil.rmtree(staging, ignore_errors=True)
+        raise
+    return bundle_dir, manifest
+
+
+def latest_bundle(root):
+    # the most recently published bundle under root, or None
+    if not os.path.isdir(root):
+        return None
+    latest = None
+    for name in os.listdir(root):
+        manifest_path = os.path.join(root, name, MANIFEST_NAME)
+        if name.startswith('.') or not os.path.exists(manifest_path):
+            continue
+        with open(manifest_path, 'r', encoding='utf-8') as f:
+            created_at = json.load(f).get('created_at', '')
+        if latest is None or created_at > latest[0]:
+            latest = (created_at, os.path.join(root, name))
+    return latest[1] if latest else None
+
+
+def load_bundle(bundle_dir, verify=True, mmap=True):
+    manifest_path = os.path.join(bundle_dir, MANIFEST_NAME)
+    if not os.path.exists(manifest_path):
+        raise FileNotFoundError(manifest_path)
+
+    with open(manifest_path, 'r', encoding='utf-8') as f:
+        manifest = json.load(f)
+
+    if manifest.get('format') != BUNDLE_FORMAT:
+        raise BundleError(f"{manifest_path} is not an {BUNDLE_FORMAT} manifest")
+    if manifest.get('format_version', 0) > BUNDLE_FORMAT_VERSION:
+        raise BundleError(f"Unsupported bundle format version {manifest['format_version']}")
+
+    arrays = {}
+    for name, entry in manifest['arrays'].items():
+        file_path = os.path.join(bundle_dir, entry['file'])
+        if verify and file_sha256(file_path) != entry['sha256']:
+            raise BundleError(f"Checksum mismatch for {file_path}")
+
+        array = np.load(file_path, mmap_mode='r' if mmap else None, allow_pickle=False)
+        if list(array.shape) != entry['shape'] or str(array.dtype) != entry['dtype']:
+            raise BundleError(f"{file_path} does not match its manifest entry")
+        arrays[name] = array
+
+    if verify:
+        checksum = bundle_checksum(manifest['vocab'], manifest['class_names'], manifest['arrays'])
+        if checksum != manifest['checksum']:
+            raise BundleError(f"Bundle checksum mismatch for {bundle_dir}")
+
+    return ModelBundle(bundle_dir, manifest, arrays)
+
+
+def intent_model_arrays(coef, intercept, idf):
+    coef = np.asarray(coef, dtype=np.float64)
+    intercept = np.asarray(intercept, dtype=np.float64)
+    idf = np.asarray(idf, dtype=np.float64)
+
+    # binary LogisticRegression keeps a single row; softmax([0, z]) == sigmoid(z)
+    if coef.shape[0] == 1:
+        coef = np.vstack([np.zeros_like(coef), coef])
+        intercept = np.concatenate([[0.0], intercept])
+
+    weights = (coef * idf).T
+    arrays = {
+        'idf': idf,
+        'coef': coef,
+        'intercept': intercept,
+        # (vocab, classes) with idf folded in, the layout IntentEngine gathers from
+        'weights': weights
+    }
+    arrays.update(quantized_arrays(weights))
+    return arrays
+
+
+def quantize_int8(weights):
+    # symmetric, one scale per class (column): each class keeps its own range
+    max_abs = np.abs(weights).max(axis=0)
+    scales = np.where(max_abs > 0, max_abs / 127.0, 1.0)
+    quantized = np.clip(np.rint(weights / scales), -127, 127).astype(np.int8)
+    return quantized, scales.astype(np.float32)
+
+
+def quantized_arrays(weights):
+    weights_int8, scales = quantize_int8(np.asarray(weights, dtype=np.float64))
+    return {
+        'weights_float32': np.asarray(weights, dtype=np.float32),
+        'weights_int8': weights_int8,
+        'weight_scales': scales
+    }
+
+
+def variant_arrays(arrays, variant):
+    # (weights, intercept, scales) for IntentEngine; bundles written before
+    # the variants existed are quantized on the fly
+    if variant not in VARIANTS:
+        raise BundleError(f"Unknown intent model variant '{variant}' (expected one of {', '.join(VARIANTS)})")
+    intercept = np.asarray(arrays['intercept'], dtype=np.float64)
+    if variant == 'float64':
+        return arrays['weights'], intercept, None
+
+    if 'weights_float32' not in arrays:
+        arrays = dict(arrays, **quantized_arrays(arrays['weights']))
+    if variant == 'float32':
+        return arrays['weights_float32'], intercept.astype(np.float32), None
+    return arrays['weights_int8'], intercept.astype(np.float32), arrays['weight_scales']
+
+
+def add_variants(bundle_dir, root):
+    # publishes a copy of the bundle with the float32/int8 arrays added
+    bundle = load_bundle(bundle_dir, mmap=False)
+    arrays = {name: np.asarray(array) for name, array in bundle.arrays.items()}
+    arrays.update(quantized_arrays(arrays['weights']))
+    return publish_bundle(root, bundle.vocab, bundle.class_names, arrays, bundle.manifest.get('metadata'))
+
+
+def export_from_pickles(source_dir, root):
+    def load(name):
+        with open(os.path.join(source_dir, name), 'rb') as f:
+            return pickle.load(f)
+
+    model = load('nlp_model_lr.pkl')
+    label_encoder = load('label_encoder.pkl')
+    vocab = load('vocab.pkl')
+    idf = load('idf.pkl')
+
+    class_names = [str(name) for name in label_encoder.inverse_transform(model.classes_)]
+    arrays = intent_model_arrays(model.coef_, model.intercept_, idf)
+    metadata = {
+        'source': 'pickles',
+        'model': type(model).__name__,
+        'params': {key: value for key, value in model.get_params().items()
+                   if isinstance(value, (int, float, str, bool, type(None)))}
+    }
+    return publish_bundle(root, vocab, class_names, arrays, metadata)
+
+
+def main():
+    parser = argparse.ArgumentParser(description='Afira intent model bundle tools')
+    subparsers = parser.add_subparsers(dest='command', required=True)
+
+    export_parser = subparsers.add_parser('export', help='Convert the notebook pickles into a bundle')
+    export_parser.add_argument('--source', default='.', help='Directory holding the .pkl files')
+    export_parser.add_argument('--out', default=BUNDLES_DIR, help='Directory the versioned bundle is written under')
+
+    verify_parser = subparsers.add_parser('verify', help='Check a bundle against its manifest')
+    verify_parser.add_argument('bundle', nargs='?', default=DEFAULT_BUNDLE_DIR)
+
+    quantize_parser = subparsers.add_parser('quantize', help='Publish a copy of a bundle with float32 and int8 weights')
+    quantize_parser.add_argument('bundle', nargs='?', default=DEFAULT_BUNDLE_DIR)
+    quantize_parser.add_argument('--out', default=BUNDLES_DIR, help='Directory the versioned bundle is written under')
+
+    args = parser.parse_args()
+
+    if args.command == 'export':
+        bundle_dir, manifest = export_from_pickles(args.source, args.out)
+        print(f"Bundle {manifest['model_version']} written to {bundle_dir}")
+        print(f"Vocabulary: {manifest['vocab_size']} words, classes: {manifest['n_classes']}")
+        print(f"Serve it with POST /admin/reload {{\"bundle_dir\": \"{os.path.abspath(bundle_dir)}\"}}")
+    elif args.command == 'verify':
+        bundle = load_bundle(args.bundle, verify=True)
+        print(f"Bundle {bundle.version} OK ({len(bundle.vocab)} words, {len(bundle.class_names)} classes)")
+    elif args.command == 'quantize':
+        bundle_dir, manifest = add_variants(args.bundle, args.out)
+        print(f"Bundle {manifest['model_version']} written to {bundle_dir} with variants {', '.join(VARIANTS)}")
+        print("Run 'python intent_training.py --parity' to compare them with float64")
+
+
+if __name__ == '__main__':
+    main()
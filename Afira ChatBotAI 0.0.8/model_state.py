@@ -0,0 +1,216 @@
+import json
+import os
+import threading
+import time
+
+
+class ModelState:
+    # one loaded version of the intent model and everything derived from it.
+    # It is never changed after it is built; a reload builds a new one and
+    # swaps it in, so a request that already holds a state finishes on it.
+    __slots__ = ('engine', 'intents_data', 'registry', 'cache', 'version', 'bundle_dir', 'loaded_at')
+
+    def __init__(self, engine, intents_data, registry, cache, version, bundle_dir):
+        self.engine = engine
+        self.intents_data = intents_data
+        self.registry = registry
+        self.cache = cache
+        self.version = version
+        self.bundle_dir = bundle_dir
+        self.loaded_at = time.time()
+
+    def describe(self):
+        return {
+            'version': self.version,
+            'variant': self.engine.variant,
+            'bundle_dir': self.bundle_dir,
+            'loaded_at': self.loaded_at,
+            'vocab_size': self.engine.vocab_size,
+            'n_classes': self.engine.n_classes,
+            'intents': len(self.registry)
+        }
+
+
+def smoke_test(state, cases=(), required_intents=(), min_accuracy=0.9):
+    # returns a list of problems; an empty list means the state can serve
+    problems = []
+    class_names = set(state.engine.class_names)
+
+    missing = [name for name in required_intents if name not in class_names]
+    if missing:
+        problems.append(f"model has no class for {', '.join(missing)}")
+
+    without_responses = [name for name in state.engine.class_names if state.registry.get(name) is None]
+    if without_responses:
+        problems.append(f"no responses for {', '.join(without_responses)}")
+
+    if cases:
+        results = state.engine.classify_batch([case['message'] for case in cases])
+        for case, (intent_name, confidence, _) in zip(cases, results):
+            if intent_name != case['intent']:
+                problems.append(f"'{case['message']}' -> {intent_name} ({confidence:.2f}), expected {case['intent']}")
+
+    # the model should still recognise the patterns it was trained on
+    pairs = [(pattern, intent['name']) for intent in state.intents_data['intents']
+             for pattern in intent['patterns'] if pattern.strip()]
+    if pairs:
+        results = state.engine.classify_batch([pattern for pattern, _ in pairs])
+        accuracy = sum(result[0] == name for result, (_, name) in zip(results, pairs)) / len(pairs)
+        if accuracy < min_accuracy:
+            problems.append(f"accuracy on chatbotdata.json patterns is {accuracy:.3f} (min {min_accuracy})")
+
+    return problems
+
+
+def load_smoke_cases(path):
+    if not os.path.exists(path):
+        return []
+    with open(path, 'r', encoding='utf-8') as f:
+        return json.load(f)['cases']
+
+
+class ModelManager:
+    # Holds the live ModelState and swaps it on reload or rollback.
+    #
+    # Under gunicorn an admin request only reaches one worker, so a
+    # successful reload is published by writing the bundle directory and
+    # version to a pointer file; every worker's watcher follows the pointer.
+    # The same file is read at startup, so a restart comes up on the
+    # deployed version.
+
+    def __init__(self, build_state, validate, pointer_path, history_size=3):
+        self.build_state = build_state
+        self.validate = validate
+        self.pointer_path = pointer_path
+        self.history_size = history_size
+        self.current = None
+        self.history = []
+        self._reset()
+        if hasattr(os, 'register_at_fork'):
+            os.register_at_fork(after_in_child=self._reset)
+
+    def _reset(self):
+        self._lock = threading.Lock()
+        self._watcher = None
+        self._synced_target = None
+        self.last_error = None
+
+    def activate(self, state):
+        with self._lock:
+            self._swap(state)
+
+    def _swap(self, state):
+        previous = self.current
+        # the swap itself is one reference assignment
+        self.current = state
+        if previous is not None:
+            self.history.append(previous)
+            del self.history[:-self.history_size]
+
+    def read_pointer(self):
+        if not self.pointer_path or not os.path.exists(self.pointer_path):
+            return None
+        with open(self.pointer_path, 'r', encoding='utf-8') as f:
+            pointer = json.load(f)
+        # a hand-written pointer may use a path relative to itself
+        bundle_dir = os.path.join(os.path.dirname(os.path.abspath(self.pointer_path)), pointer['bundle_dir'])
+        return {'bundle_dir': os.path.abspath(bundle_dir), 'version': pointer.get('version')}
+
+    def write_pointer(self, state):
+        if not self.pointer_path:
+            return
+        tmp_path = self.pointer_path + '.tmp'
+        with open(tmp_path, 'w', encoding='utf-8') as f:
+            json.dump({'bundle_dir': state.bundle_dir, 'version': state.version}, f, indent=2)
+        os.replace(tmp_path, self.pointer_path)
+
+    def reload(self, bundle_dir, publish=True, expected_version=None):
+        # returns (state, error); on any error the current state keeps serving.
+        # expected_version is the version a pointer names: a directory that
+        # now holds something else is refused rather than served under it.
+        bundle_dir = os.path.abspath(bundle_dir)
+        with self._lock:
+            started = time.perf_counter()
+            try:
+                state = self.build_state(bundle_dir)
+            except Exception as e:
+                return None, self._fail(f"could not load {bundle_dir}: {e}")
+
+            if expected_version and state.version != expected_version:
+                return None, self._fail(f"{bundle_dir} holds model {state.version}, expected {expected_version}")
+
+            problems = self.validate(state)
+            if problems:
+                return None, self._fail(f"smoke test failed for {state.version}: " + '; '.join(problems))
+
+            self._swap(state)
+            self.last_error = None
+            if publish:
+                self.write_pointer(state)
+            print(f"Model {state.version} from {bundle_dir} is live ({time.perf_counter() - started:.2f}s)")
+            return state, None
+
+    def rollback(self, publish=True):
+        with self._lock:
+            if not self.history:
+                return None, 'no previous model version in this process'
+            state = self.history.pop()
+            # the version rolled back from is dropped, so repeated rollbacks walk further back
+            self.current = state
+            self.last_error = None
+            if publish:
+                self.write_pointer(state)
+            print(f"Rolled back to model {state.version} from {state.bundle_dir}")
+            return state, None
+
+    def _fail(self, error):
+        self.last_error = error
+        print(f"Model reload rejected: {error}")
+        return error
+
+    def sync_with_pointer(self):
+        target = self.read_pointer()
+        # each pointer value is acted on once; a rejected version is not
+        # retried until the pointer changes
+        if target is None or target == self._synced_target:
+            return None
+        self._synced_target = target
+        current = self.current
+        if current is not None and (current.bundle_dir, current.version) == (target['bundle_dir'], target['version']):
+            return None
+
+        # a rollback published by another worker points at a version this
+        # process may still hold
+        for state in reversed(self.history):
+            if (state.bundle_dir, state.version) == (target['bundle_dir'], target['version']):
+                with self._lock:
+                    self.history.remove(state)
+                    self._swap(state)
+                print(f"Switched to model {state.version} from {state.bundle_dir}")
+                return state
+
+        state, _ = self.reload(target['bundle_dir'], publish=False, expected_version=target['version'])
+        return state
+
+    def start_watcher(self, interval=5.0):
+        if not self.pointer_path or self._watcher is not None:
+            return
+
+        def run():
+            while True:
+                time.sleep(interval)
+                try:
+                    self.sync_with_pointer()
+                except (OSError, ValueError, KeyError) as e:
+                    print(f"Warning: could not read model pointer: {e}")
+
+        self._watcher = threading.Thread(target=run, name='model-watcher', daemon=True)
+        self._watcher.start()
+
+    def status(self):
+        return {
+            'current': self.current.describe() if self.current is not None else None,
+            'history': [state.describe() for state in reversed(self.history)],
+            'pointer': self.read_pointer(),
+            'last_error': self.last_error
+        }
@@ -0,0 +1,84 @@
+import math
+
+# Strict parsing for the structured /assess endpoints. The chat dialogs keep
+# the predictors' own parse_input, which picks a number or a yes/no out of
+# free text; a JSON record has to say exactly what it means.
+
+BINARY_VALUES = {
+    'yes': 1, 'true': 1, '1': 1,
+    'no': 0, 'false': 0, '0': 0
+}
+
+
+def parse_binary(value):
+    if isinstance(value, bool):
+        return int(value)
+    if isinstance(value, str):
+        return BINARY_VALUES.get(value.strip().lower())
+    if isinstance(value, (int, float)) and value in (0, 1):
+        return int(value)
+    return None
+
+
+def parse_numeric(value):
+    if isinstance(value, bool):
+        return None
+    if isinstance(value, str):
+        try:
+            # the whole string has to be the number
+            value = float(value.strip())
+        except ValueError:
+            return None
+    if isinstance(value, (int, float)) and math.isfinite(value):
+        return float(value)
+    return None
+
+
+def parse_categorical(value, options):
+    if not isinstance(value, str):
+        return None
+    return {option.lower(): option for option in options}.get(value.strip().lower())
+
+
+def parse_field(value, field):
+    # returns (parsed, error); error is None when the value is usable
+    field_type = field['type']
+    if field_type == 'binary':
+        parsed = parse_binary(value)
+        if parsed is None:
+            return None, 'invalid binary value (expected yes/no, true/false or 0/1)'
+        return parsed, None
+
+    if field_type == 'categorical':
+        parsed = parse_categorical(value, field['options'])
+        if parsed is None:
+            return None, f"invalid categorical value (expected one of: {', '.join(field['options'])})"
+        return parsed, None
+
+    parsed = parse_numeric(value)
+    if parsed is None:
+        return None, 'invalid numeric value'
+    if field.get('integer') and not parsed.is_integer():
+        return None, 'must be a whole number'
+    if 'min' in field and parsed < field['min'] or 'max' in field and parsed > field['max']:
+        return None, f"out of range (expected {field['min']} to {field['max']})"
+    return parsed, None
+
+
+def validate_record(fields, record):
+    user_data = {}
+    errors = {}
+
+    for field in fields:
+        name = field['name']
+        value = record.get(name)
+        if value is None or (isinstance(value, str) and not value.strip()):
+            errors[name] = 'missing'
+            continue
+        parsed, error = parse_field(value, field)
+        if error:
+            errors[name] = error
+        else:
+            user_data[name] = parsed
+
+    return user_data, errors
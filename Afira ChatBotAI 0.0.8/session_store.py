@@ -0,0 +1,333 @@
+import json
+import os
+import sqlite3
+import threading
+import time
+import zlib
+from collections import OrderedDict
+
+
+class SessionState:
+    # the dialog state the heart/asthma predictors keep per user; dict-style
+    # access is kept so the predictors can use it like their old session dicts
+    __slots__ = ('context', 'collecting_data', 'current_field', 'user_data', 'expires_at')
+
+    KEYS = ('context', 'collecting_data', 'current_field', 'user_data')
+
+    def __init__(self, context=None, collecting_data=False, current_field=0, user_data=None):
+        self.context = context
+        self.collecting_data = collecting_data
+        self.current_field = current_field
+        self.user_data = user_data if user_data is not None else {}
+        self.expires_at = 0.0
+
+    @classmethod
+    def from_dict(cls, data):
+        if isinstance(data, cls):
+            return data
+        return cls(
+            context=data.get('context'),
+            collecting_data=data.get('collecting_data', False),
+            current_field=data.get('current_field', 0),
+            user_data=data.get('user_data')
+        )
+
+    def to_dict(self):
+        return {
+            'context': self.context,
+            'collecting_data': self.collecting_data,
+            'current_field': self.current_field,
+            'user_data': dict(self.user_data)
+        }
+
+    def __getitem__(self, key):
+        if key not in self.KEYS:
+            raise KeyError(key)
+        return getattr(self, key)
+
+    def __setitem__(self, key, value):
+        if key not in self.KEYS:
+            raise KeyError(key)
+        setattr(self, key, value)
+
+    def __contains__(self, key):
+        return key in self.KEYS
+
+    def get(self, key, default=None):
+        if key not in self.KEYS:
+            return default
+        return getattr(self, key)
+
+
+class SessionShard:
+    __slots__ = ('entries', 'lock')
+
+    def __init__(self):
+        self.entries = OrderedDict()
+        self.lock = threading.Lock()
+
+
+class SessionStore:
+    def __init__(self, ttl=1800.0, max_sessions=10000, shards=16):
+        self.ttl = ttl
+        self.max_sessions = max_sessions
+        self.max_per_shard = max(1, -(-max_sessions // shards))
+        self._shards = [SessionShard() for _ in range(shards)]
+        self._stats_lock = threading.Lock()
+        self._purger = None
+        self.evictions = 0
+        self.expirations = 0
+        if hasattr(os, 'register_at_fork'):
+            # the purger thread does not survive a fork; each worker starts its own
+            os.register_at_fork(after_in_child=self._reset_purger)
+
+    def _reset_purger(self):
+        self._purger = None
+
+    def _shard(self, user_id):
+        return self._shards[zlib.crc32(user_id.encode('utf-8')) % len(self._shards)]
+
+    def _count(self, evictions=0, expirations=0):
+        with self._stats_lock:
+            self.evictions += evictions
+            self.expirations += expirations
+
+    def get(self, user_id):
+        shard = self._shard(user_id)
+        now = time.monotonic()
+        with shard.lock:
+            state = shard.entries.get(user_id)
+            if state is None:
+                return None
+            if state.expires_at > now:
+                # sliding expiry: every turn of a dialog keeps it alive
+                state.expires_at = now + self.ttl
+                shard.entries.move_to_end(user_id)
+                return state
+            del shard.entries[user_id]
+        self._count(expirations=1)
+        return None
+
+    def __contains__(self, user_id):
+        return self.get(user_id) is not None
+
+    def __getitem__(self, user_id):
+        state = self.get(user_id)
+        if state is None:
+            raise KeyError(user_id)
+        return state
+
+    def __setitem__(self, user_id, data):
+        self.set(user_id, data)
+
+    def set(self, user_id, data):
+        state = SessionState.from_dict(data)
+        shard = self._shard(user_id)
+        now = time.monotonic()
+        state.expires_at = now + self.ttl
+
+        expired = 0
+        evicted = 0
+        with shard.lock:
+            shard.entries[user_id] = state
+            shard.entries.move_to_end(user_id)
+
+            # oldest entries sit at the front, so expired ones are cheap to drop
+            while shard.entries:
+                oldest_id, oldest = next(iter(shard.entries.items()))
+                if oldest.expires_at > now:
+                    break
+                del shard.entries[oldest_id]
+                expired += 1
+
+            while len(shard.entries) > self.max_per_shard:
+                shard.entries.popitem(last=False)
+                evicted += 1
+
+        if expired or evicted:
+            self._count(evictions=evicted, expirations=expired)
+        return state
+
+    def delete(self, user_id):
+        shard = self._shard(user_id)
+        with shard.lock:
+            return shard.entries.pop(user_id, None) is not None
+
+    def purge_expired(self):
+        # set() only expires sessions in the shard it writes to; this covers
+        # the quiet shards. Entries are in expiry order, so each shard stops
+        # at its first live session.
+        now = time.monotonic()
+        purged = 0
+        for shard in self._shards:
+            with shard.lock:
+                while shard.entries:
+                    oldest_id, oldest = next(iter(shard.entries.items()))
+                    if oldest.expires_at > now:
+                        break
+                    del shard.entries[oldest_id]
+                    purged += 1
+        if purged:
+            self._count(expirations=purged)
+        return purged
+
+    def start_purger(self, interval=60.0):
+        if self._purger is not None:
+            return
+
+        def run():
+            while True:
+                time.sleep(interval)
+                self.purge_expired()
+
+        self._purger = threading.Thread(target=run, name='session-purge', daemon=True)
+        self._purger.start()
+
+    def __len__(self):
+        return sum(len(shard.entries) for shard in self._shards)
+
+    def stats(self):
+        with self._stats_lock:
+            return {
+                'active': len(self),
+                'max_sessions': self.max_sessions,
+                'ttl_seconds': self.ttl,
+                'evictions': self.evictions,
+                'expirations': self.expirations
+            }
+
+
+class SharedSessionStore:
+    # The same interface as SessionStore, kept in an SQLite file so every
+    # gunicorn worker sees every dialog: workers share one listening socket
+    # and the next turn of a dialog can land on any of them. Each thread
+    # opens its own connection; WAL lets readers and the writer overlap.
+    # The eviction and expiry counts in stats() are this process's.
+
+    def __init__(self, path, ttl=1800.0, max_sessions=10000):
+        self.path = path
+        self.ttl = ttl
+        self.max_sessions = max_sessions
+        self._stats_lock = threading.Lock()
+        self.evictions = 0
+        self.expirations = 0
+        self._reset()
+        if hasattr(os, 'register_at_fork'):
+            # connections and the purger thread are not carried across a fork
+            os.register_at_fork(after_in_child=self._reset)
+
+    def _reset(self):
+        self._local = threading.local()
+        self._purger = None
+
+    def _connection(self):
+        connection = getattr(self._local, 'connection', None)
+        if connection is None:
+            # the dialogs hold health answers; only this user may read them
+            fd = os.open(self.path, os.O_RDWR | os.O_CREAT, 0o600)
+            os.close(fd)
+            connection = sqlite3.connect(self.path, timeout=5.0, isolation_level=None)
+            connection.execute('PRAGMA journal_mode=WAL')
+            connection.execute('PRAGMA synchronous=NORMAL')
+            # every connection makes sure of the table, so a file removed
+            # between import and fork (gunicorn's on_starting) is recreated
+            connection.execute("""
+                CREATE TABLE IF NOT EXISTS sessions (
+                    user_id TEXT PRIMARY KEY,
+                    data TEXT NOT NULL,
+                    expires_at REAL NOT NULL
+                )
+            """)
+            connection.execute('CREATE INDEX IF NOT EXISTS sessions_expires_at ON sessions (expires_at)')
+            self._local.connection = connection
+        return connection
+
+    def _execute(self, sql, params=()):
+        return self._connection().execute(sql, params)
+
+    def _count(self, evictions=0, expirations=0):
+        with self._stats_lock:
+            self.evictions += evictions
+            self.expirations += expirations
+
+    def get(self, user_id):
+        now = time.time()
+        row = self._execute('SELECT data, expires_at FROM sessions WHERE user_id = ?', (user_id,)).fetchone()
+        if row is None:
+            return None
+        if row[1] <= now:
+            if self._execute('DELETE FROM sessions WHERE user_id = ? AND expires_at <= ?', (user_id, now)).rowcount:
+                self._count(expirations=1)
+            return None
+        # sliding expiry: every turn of a dialog keeps it alive
+        self._execute('UPDATE sessions SET expires_at = ? WHERE user_id = ?', (now + self.ttl, user_id))
+        state = SessionState.from_dict(json.loads(row[0]))
+        state.expires_at = now + self.ttl
+        return state
+
+    def __contains__(self, user_id):
+        return self.get(user_id) is not None
+
+    def __getitem__(self, user_id):
+        state = self.get(user_id)
+        if state is None:
+            raise KeyError(user_id)
+        return state
+
+    def __setitem__(self, user_id, data):
+        self.set(user_id, data)
+
+    def set(self, user_id, data):
+        # the predictors change the state they were given in place, so a
+        # dialog step is only kept once it is set again
+        state = SessionState.from_dict(data)
+        state.expires_at = time.time() + self.ttl
+        self._execute(
+            'INSERT OR REPLACE INTO sessions (user_id, data, expires_at) VALUES (?, ?, ?)',
+            (user_id, json.dumps(state.to_dict(), separators=(',', ':')), state.expires_at)
+        )
+        return state
+
+    def delete(self, user_id):
+        return self._execute('DELETE FROM sessions WHERE user_id = ?', (user_id,)).rowcount > 0
+
+    def purge_expired(self):
+        purged = self._execute('DELETE FROM sessions WHERE expires_at <= ?', (time.time(),)).rowcount
+        # over the limit, the sessions closest to expiring go first
+        evicted = self._execute(
+            'DELETE FROM sessions WHERE user_id IN '
+            '(SELECT user_id FROM sessions ORDER BY expires_at LIMIT max(0, (SELECT count(*) FROM sessions) - ?))',
+            (self.max_sessions,)
+        ).rowcount
+        if purged or evicted:
+            self._count(evictions=evicted, expirations=purged)
+        return purged
+
+    def start_purger(self, interval=60.0):
+        if self._purger is not None:
+            return
+
+        def run():
+            while True:
+                time.sleep(interval)
+                try:
+                    self.purge_expired()
+                except sqlite3.Error as e:
+                    print(f"Warning: could not purge sessions: {e}")
+
+        self._purger = threading.Thread(target=run, name='session-purge', daemon=True)
+        self._purger.start()
+
+    def __len__(self):
+        return self._execute('SELECT count(*) FROM sessions WHERE expires_at > ?', (time.time(),)).fetchone()[0]
+
+    def stats(self):
+        with self._stats_lock:
+            return {
+                'active': len(self),
+                'max_sessions': self.max_sessions,
+                'ttl_seconds': self.ttl,
+                'evictions': self.evictions,
+                'expirations': self.expirations,
+                'shared': self.path
+            }
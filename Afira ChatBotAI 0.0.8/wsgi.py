@@ -0,0 +1,10 @@
+import os
+
+from app import create_app
+
+# with gunicorn's preload_app this runs once in the master; workers are forked
+# afterwards and share the loaded model state copy-on-write. The health
+# predictors are left out by default so the master boots fast; each worker
+# loads them in the background (gunicorn.conf.py). AFIRA_PRELOAD_PREDICTORS=1
+# loads them here instead, trading startup time for copy-on-write sharing.
+app = create_app(preload_predictors=os.environ.get('AFIRA_PRELOAD_PREDICTORS', '0') == '1')